@@ -10,44 +10,43 @@
 # abuse could result in your IP being banned
 
 # Import modules
+# pandas, plotly.express and the requests stack behind netris.fetch are slow to import,
+# so they are imported where first used to keep startup and debug reloads fast
 import re
-import requests
-import statistics
-import json
+import contextlib
+import importlib
+import socket
+import threading
+import time
+import uuid
 import os
 import dash
 from dash import dcc
 from dash import html
+from dash import dash_table
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output, State
-import plotly.express as px
-import pandas as pd
+from dash.dependencies import ALL, Input, Output, State
 import numpy as np
-import yfinance as yf
 from datetime import datetime
 from datetime import timedelta
+from netris import api
+from netris import downsample
 from netris import fsops
+from netris import indicators
+from netris import live
+from netris import memcache
+from netris import memo
+from netris import metrics
+from netris import panel
+from netris import providers
+from netris import resample
+from netris import scheduler
+from netris import screener
+from netris import store
 
-def main():
-    # initialize
-    app = dash.Dash(external_stylesheets=[dbc.themes.BOOTSTRAP])
-    pd.options.plotting.backend = "plotly"
+def cleanup(data_dir):
+    # Remove dated files in <data_dir> older than a day; run once per deployment, not per worker
     now = datetime.now()
-    timestamp = now.strftime('%Y%m%d')
-    ten_year = now - timedelta(days=3650)
-    five_year = now - timedelta(days=1825)
-    two_year = now - timedelta(days=730)
-    one_year = now - timedelta(days=365)
-    six_month = now - timedelta(days=180)
-    three_month = now - timedelta(days=90)
-    one_month = now - timedelta(days=30)
-    two_week = now - timedelta(days=14)
-    one_week = now - timedelta(days=7)
-    five_day = now - timedelta(days=5)
-    data_dir = f"{os.getcwd()}/data"
-    fsops.create_dir(data_dir)
-
-    # Perform cleanup
     files = fsops.list_dir(data_dir)
     if files and len(files) > 1:
         for file in files:
@@ -59,6 +58,91 @@ def main():
             ):
                 os.remove(f"{data_dir}/{file}")
 
+def format_data(data, compact=False):
+    # Format the graphing data of one ticker and return a Pandas DataFrame object for each timeframe
+    # Frames are ordered newest first, unless <compact> is True: compact frames keep the stored
+    # chronological order, so no reversed copy is made, and hold float32 indicators and integer
+    # volume, taking about a third less memory
+    import pandas as pd
+    if not compact:
+        return {
+            f: pd.DataFrame({k: j[k][::-1] for k in api.COLUMNS})
+            for f,j in data.items()
+        }
+    wide = ("date", "high", "low")
+    return {
+        f: pd.DataFrame({
+            k: j[k] if k in wide else np.nan_to_num(j[k]).astype(np.int64) if k == "volume" else np.asarray(j[k], dtype=np.float32)
+            for k in api.COLUMNS
+        })
+        for f,j in data.items()
+    }
+
+def create_app(**kwargs):
+    # Builds the Dash application; every worker process serving it calls this once
+    # Accepts optional str keyword arguments <data_dir> (default "data" in the working directory)
+    # and <key_file>, the path of a Fernet key file (see fsops.get_key) to encrypt stored data with,
+    # and optional keyword arguments <provider>, a netris.providers.Provider, <feed>,
+    # a netris.live.Feed of intraday ticks for live charts, bool <compact_frames>, and int <max_points>
+    # State shared between workers lives in <data_dir>; in-process caches are validated against it
+    # initialize
+    app = dash.Dash(external_stylesheets=[dbc.themes.BOOTSTRAP])
+    # Maximum points plotted per trace; set NETRIS_MAX_POINTS to change it
+    max_points = int(kwargs.get('max_points') if kwargs.get('max_points') else os.environ.get("NETRIS_MAX_POINTS", 300))
+    data_dir = kwargs.get('data_dir') if kwargs.get('data_dir') else f"{os.getcwd()}/data"
+    fsops.create_dir(data_dir)
+    fsops.create_dir(f"{data_dir}/locks")
+    # Stored data is encrypted at rest when a key file is given or NETRIS_KEY_FILE is set
+    key_file = kwargs.get('key_file') if kwargs.get('key_file') else os.environ.get("NETRIS_KEY_FILE")
+    cache_key = fsops.get_key(key_file) if key_file else None
+    # Bars and indicators per timeframe; daily bars are the base series the others are built from
+    bars = {tf: store.Store(f"{data_dir}/{tf}", key=cache_key) for tf in resample.TIMEFRAMES}
+    # Computed frames keyed by ticker, shared by every session of this worker and tagged
+    # with the version of the stored data they were formatted from
+    frames = memcache.LRUCache(256 * 1024 ** 2)
+    # Set NETRIS_COMPACT_FRAMES to cache frames in the compact layout (see format_data), which
+    # keeps more tickers resident in the same memory
+    compact_frames = bool(kwargs.get('compact_frames') if kwargs.get('compact_frames') is not None else os.environ.get("NETRIS_COMPACT_FRAMES"))
+    # Indicators calculated with non-default parameters, kept until the bars they came from change;
+    # they are only kept in memory when stored data is encrypted
+    memoized = memo.Memo(64 * 1024 ** 2, directory=None if cache_key else f"{data_dir}/memo")
+    # Market data provider; set NETRIS_PROVIDER to "yfinance", "fixtures:<directory>", or
+    # "alphavantage-premium:<apikey>" for daily bars from AlphaVantage (see providers.from_name)
+    provider = kwargs.get('provider') if kwargs.get('provider') else providers.from_name(os.environ.get("NETRIS_PROVIDER"))
+    # Tickers listed in the watchlist file are refreshed in the background on market days
+    watchlist = f"{os.getcwd()}/watchlist.txt"
+    prefetch_batch = 25
+    # Live intraday bars are built from the ticks of a feed; set NETRIS_FEED to "replay:<file>"
+    # to replay saved ticks. Every serving process reads the feed and builds its own bars, keyed
+    # by the feed's times so charts polling any worker get the same rows; the engine is started
+    # in serving processes as the prefetcher is, since each poll may be answered by any of them
+    feed = kwargs.get('feed') if kwargs.get('feed') else live.from_name(os.environ.get("NETRIS_FEED"))
+    engine = live.Engine(feed, interval=int(os.environ.get("NETRIS_LIVE_INTERVAL", 60)), history=max_points) if feed else None
+    app.engine = engine
+    # Screens of every stored ticker run on a process pool started with the first large screen;
+    # the CPUs are shared among the NETRIS_WORKERS server workers, each with a pool of its own
+    screen_workers = max(1, (os.cpu_count() or 1) // int(os.environ.get("NETRIS_WORKERS", 1)))
+    screens = screener.Screener(workers=screen_workers, key=cache_key, locks=f"{data_dir}/locks")
+    # Tickers of JSON API responses encoded at once by this worker; set NETRIS_API_SLOTS to change it
+    api_slots = threading.BoundedSemaphore(int(os.environ.get("NETRIS_API_SLOTS", 2)))
+    # Runtime metrics are served at /metrics; set NETRIS_PROFILE to allow profiling requests
+    metrics.serve(app.server, profiler=metrics.Profiler(f"{data_dir}/profiles") if os.environ.get("NETRIS_PROFILE") else None)
+    metrics.REGISTRY.counter("netris_cache_requests_total", "Frame cache lookups", ("cache", "result"),
+        lambda: {("frames", "hit"): frames.hits, ("frames", "miss"): frames.misses})
+    metrics.REGISTRY.gauge("netris_cache_bytes", "Approximate bytes held in caches", ("cache",), lambda: {("frames",): frames.bytes})
+    metrics.REGISTRY.gauge("netris_cache_items", "Entries held in caches", ("cache",), lambda: {("frames",): len(frames)})
+    tickers_total = metrics.REGISTRY.counter("netris_tickers_total", "Tickers requested by how they were served", ("result",))
+    ticker_seconds = metrics.REGISTRY.histogram("netris_ticker_compute_seconds", "Bar and indicator calculation time per ticker", ("mode",))
+    # Columns and line colors plotted for each graph view
+    views = {
+        1: ['value buy_signal', 'rgba(0,0,0,0.5) rgba(32,208,112,0.9)'],
+        2: ['macd signal', 'rgba(208,128,208,0.9) rgba(128,208,248,0.9)'],
+        3: ['trend_wma trend_signal', 'rgba(0,64,224,0.9) rgba(32,208,112,0.9)'],
+        4: ['rsi', 'rgba(0,0,0,0.5)'],
+        5: ['obv', 'rgba(0,0,0,0.5)'],
+        6: ['obv_trend obv_signal', 'rgba(0,64,224,0.9) rgba(32,208,112,0.9)'],
+    }
+
     # Dash code to build sidebar of WebUI
     sidebar = dbc.Col([
         dbc.InputGroup([
@@ -85,6 +169,18 @@ def main():
                 className="text-dark",
                 clearable=False
             ),
+            html.Label("Bar Interval"),
+            dcc.Dropdown(
+                id="timeframe-selector",
+                options=[
+                    {"label": "Daily", "value": "daily"},
+                    {"label": "Weekly", "value": "weekly"},
+                    {"label": "Monthly", "value": "monthly"},
+                ],
+                value="weekly",
+                className="text-dark",
+                clearable=False
+            ),
             html.Label("Graph View"),
             dcc.Dropdown(
                 id="graph-selector",
@@ -100,11 +196,21 @@ def main():
                 className="text-dark",
                 clearable=False,
             ),
+            dbc.Checklist(
+                id="live-switch",
+                options=[{"label": "Live", "value": "live"}],
+                value=[],
+                switch=True
+            ),
             html.Div([
                 dbc.Button("Analyze", id="lookup-btn", n_clicks=0, color="primary"),
                 dbc.Button("Save", id="save-btn", n_clicks=0, color="secondary")
             ], id="btn-div")         
-        ])
+        ]),
+        dbc.Nav([
+            dbc.NavLink("Charts", href="/", active="exact"),
+            dbc.NavLink("Screener", href="/screener", active="exact"),
+        ], vertical=True, pills=True),
     ], md=2, id="sidebar", className="bg-dark text-white")
 
     # Dash code to build content area of WebUI
@@ -122,14 +228,52 @@ def main():
             n_intervals=0
         ),        
         html.H3(id="time", className="text-center"),
-        dcc.Loading([
-            html.Div(id="test"), # REMOVE
-            html.Div(id="content"),
-        ]),
+        html.Div([
+            # Live charts are drawn once and then extended with the points added since the last poll
+            dcc.Interval(id="live-interval", interval=1000, disabled=True),
+            dcc.Store(id="live-cursor"),
+            html.Div(id="live-content"),
+            dcc.Loading([
+                html.Div(id="test"), # REMOVE
+                html.Div(id="content"),
+            ]),
+        ], id="charts-page"),
+        html.Div([
+            dbc.Row([
+                dbc.Col(dcc.Dropdown(
+                    id="screen-timeframe",
+                    options=[
+                        {"label": "Daily", "value": "daily"},
+                        {"label": "Weekly", "value": "weekly"},
+                        {"label": "Monthly", "value": "monthly"},
+                    ],
+                    value="weekly",
+                    clearable=False
+                ), md=3),
+                dbc.Col(dbc.Checklist(
+                    id="screen-filter",
+                    options=[{"label": "Buy signals only", "value": "buy"}],
+                    value=[],
+                    switch=True
+                ), md=3),
+                dbc.Col(dbc.Input(id="screen-limit", type="number", min=1, value=100), md=2),
+                dbc.Col(dbc.Button("Screen", id="screen-btn", n_clicks=0, color="primary"), md=2),
+            ], className="mb-2"),
+            dcc.Loading([
+                dash_table.DataTable(
+                    id="screen-table",
+                    columns=[{"name": x.replace("_", " ").title(), "id": x} for x in screener.SORT_KEYS],
+                    data=[],
+                    sort_action="native",
+                    page_size=50,
+                ),
+            ]),
+        ], id="screener-page", style={"display": "none"}),
     ], md=10)
     
     # Put UI Elements together
     app.layout = dbc.Container([
+        dcc.Location(id="url"),
         dbc.Row([sidebar, content],
         className="text-dark"),
         #dcc.Store(id="data", storage_type="session")
@@ -146,6 +290,120 @@ def main():
     def update_time(n):
         return datetime.now().strftime('%m/%d/%Y %H:%M')            
 
+    # Show the page for the current path
+    @app.callback(
+        Output("charts-page", "style"),
+        Output("screener-page", "style"),
+        Input("url", "pathname"),
+    )
+    def show_page(pathname):
+        if pathname == "/screener":
+            return {"display": "none"}, {}
+        return {}, {"display": "none"}
+
+    # Screen every stored ticker and list the results
+    @app.callback(
+        Output("screen-table", "data"),
+        Input("screen-btn", "n_clicks"),
+        State("screen-timeframe", "value"),
+        State("screen-filter", "value"),
+        State("screen-limit", "value"),
+        prevent_initial_call=True,
+    )
+    @metrics.timed("screen")
+    def run_screen(n_clicks, timeframe, selected, limit):
+        rows = screens.screen(bars[timeframe].root, buy_only="buy" in (selected or []), limit=limit)
+        # Round for display; the JSON endpoint returns full precision
+        return [{k: round(v, 4) if type(v) is float else v for k,v in x.items()} for x in rows]
+
+    # Screen every stored ticker as JSON: /api/screen?timeframe=weekly&signal=buy&sort=-rsi&limit=50
+    @app.server.route("/api/screen")
+    def screen_api():
+        from flask import jsonify, request
+        timeframe = request.args.get("timeframe", "weekly")
+        if timeframe not in bars:
+            return jsonify({"error": f"Unknown timeframe: {timeframe}"}), 400
+        sort = request.args.get("sort")
+        if sort and sort.lstrip("-") not in screener.SORT_KEYS:
+            return jsonify({"error": f"Unknown sort key: {sort}"}), 400
+        rows = screens.screen(
+            bars[timeframe].root,
+            buy_only=request.args.get("signal") == "buy",
+            sort=sort,
+            limit=request.args.get("limit", type=int),
+        )
+        return jsonify({
+            "timeframe": timeframe,
+            "as_of": max((x['date'] for x in rows), default=None),
+            "count": len(rows),
+            "results": rows,
+        })
+
+    # Analyzed series of a batch of tickers as JSON:
+    # /api/analysis?symbols=AAPL,MSFT&timeframe=weekly&indicators=value,rsi&latest=1&rsi.dur=10
+    # Options may also be POSTed as a JSON object; see api.parse. Series are chronological
+    # and streamed a ticker at a time, gzipped when the client accepts it, and tagged with the
+    # versions and last bar dates of the stored data so unchanged batches are answered with 304
+    @app.server.route("/api/analysis", methods=["GET", "POST"])
+    def analysis_api():
+        from flask import Response, jsonify, request, stream_with_context
+        from werkzeug.http import is_resource_modified
+        params = request.get_json(silent=True) if request.method == "POST" else None
+        try:
+            options = api.parse(params if type(params) is dict else request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        tf = options['timeframe']
+        errors = {}
+        # Reads never wait for downloads unless a refresh is asked for
+        if options['refresh']:
+            errors.update({k: str(v) for k,v in refresh_data(options['symbols']).items()})
+        stamps = []
+        for ticker in options['symbols']:
+            with fsops.locked(lock_path(ticker), shared=True):
+                meta = bars[tf].meta(ticker)
+                last = bars[tf].tail(ticker, ["date"])['date'][-1] if meta and meta.get('rows') > 0 else None
+            if last is not None:
+                stamps.append((ticker, meta.get('version'), str(last), meta.get('written')))
+            elif ticker not in errors:
+                errors.update({ticker: f"No stored data for {ticker}; request it with refresh=1 to download it"})
+        def results():
+            for ticker, version, last, written in stamps:
+                start = options['start']
+                if options['weeks']:
+                    # The week of the last bar counts as the first, so weekly bars come back as
+                    # <weeks> rows even when the last week is not over
+                    week = resample.periods([last], "weekly")[0]
+                    start = np.datetime64(int(week - options['weeks'] + 1) * 7 - 3, 'D')
+                # A shared lock keeps writers out until the rows are copied
+                with fsops.locked(lock_path(ticker), shared=True):
+                    cols = bars[tf].query(ticker, options['columns'], start=start, end=options['end'])
+                    if cols is not None:
+                        cols = tuned(ticker, tf, {k: np.array(v) for k,v in cols.items()}, options['params'])
+                if cols is None:
+                    errors.update({ticker: f"No stored data for {ticker}"})
+                    continue
+                # Encoding is bounded so large batches leave time for the UI callbacks
+                with api_slots:
+                    encoded = api.encode(cols, options['latest'])
+                yield ticker, encoded
+        tag, modified = api.etag(options, stamps), api.last_modified([x[3] for x in stamps])
+        gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+        # Checked before the body is built, as Response.make_conditional() would read the whole
+        # stream to measure it
+        if not is_resource_modified(request.environ, etag=tag, last_modified=modified):
+            response = Response(status=304)
+        else:
+            chunks = api.buffered(api.body(options, results(), errors))
+            response = Response(stream_with_context(api.compressed(chunks) if gzip else chunks), mimetype="application/json")
+            if gzip:
+                response.headers.update({"Content-Encoding": "gzip"})
+        # The tag is weak since the body differs between encodings
+        response.set_etag(tag, weak=True)
+        response.last_modified = modified
+        response.headers.update({"Cache-Control": "no-cache", "Vary": "Accept-Encoding"})
+        return response
+
     # Get time-series data from API and update Dash Bootstrap components
     @app.callback(
         Output("data", "data"),
@@ -153,48 +411,29 @@ def main():
         State("watch-tickers", "value"),
         prevent_initial_call=True,
     )   
+    @metrics.timed("get_data")
     def get_data(n_clicks, tickers):
         # Set time series data to get from API
         if len(tickers) > 1:
-            data = {}
-            # daily_func = "TIME_SERIES_DAILY"
-            # daily_key = "Time Series (Daily)"
-            weekly_func = "TIME_SERIES_WEEKLY_ADJUSTED"
-            weekly_key = "Weekly Adjusted Time Series"
-            file_data = fsops.read_file(f"{data_dir}/data-{timestamp}.json", type="json")
-            if type(file_data) is not dict:
-                file_data = {}
-            changed = False
-            for ticker in tickers.replace(',', ' ').split():
-                ticker = ticker.upper()
-                # Check if data is already present
-                if file_data.get(ticker):
-                    data.update({ ticker: file_data.get(ticker) })
-                    continue
-                # Validate ticker symbol characters and length
-                elif not re.search(r'^[A-Z^]{1}[A-Z-=]{0,7}(?<=[A-Z])$', ticker):
-                    return json.dumps({"error": f"Invalid characters or length in ticker: {ticker}"})
-                else:
-                    #dresp = requests.get(f"https://www.alphavantage.co/query?function={daily_func}&symbol={ticker}&outputsize=full&apikey=9LVE9OGAKH31RPWM&datatype=json")
-                    wresp = requests.get(f"https://www.alphavantage.co/query?function={weekly_func}&symbol={ticker}&outputsize=full&apikey=9LVE9OGAKH31RPWM&datatype=json")
-                    if (
-                        #"Error Message" in json.loads(dresp.content) or
-                        "Error Message" in json.loads(wresp.content)
-                    ):
-                        return json.dumps({"error": f"Invalid ticker in input: {ticker}"})
-                    else:
-                        data.update({
-                            ticker: {
-                                #"daily": format_data(json.loads(dresp.content).get(daily_key)),
-                                "daily": {},
-                                "weekly": json.loads(wresp.content).get(weekly_key),
-                            }
-                        })
-                        changed = True
-            if changed:
-                file_data.update(data)
-                fsops.write_file(file_data, f"{data_dir}/data-{timestamp}.json", type="json")
-            return json.dumps(format_data(data))
+            order = [x.upper() for x in tickers.replace(',', ' ').split()]
+            # Validate ticker symbol characters and length
+            for ticker in order:
+                if not re.search(r'^[A-Z^]{1}[A-Z-=]{0,7}(?<=[A-Z])$', ticker):
+                    return {"error": f"Invalid characters or length in ticker: {ticker}"}
+            errors = refresh_data(order)
+            # Keep computed frames on the server; the browser only receives a token
+            data = {"token": uuid.uuid4().hex, "tickers": [x for x in dict.fromkeys(order) if x not in errors]}
+            if errors:
+                invalid = [k for k,v in errors.items() if isinstance(v, providers.UnknownSymbol)]
+                failed = [k for k in errors if k not in invalid]
+                messages = []
+                if invalid:
+                    messages.append(f"Invalid ticker in input: {', '.join(invalid)}")
+                if failed:
+                    messages.append(f"Unable to retrieve data for ticker: {', '.join(failed)}")
+                # Tickers that were retrieved are still charted alongside the alert
+                data.update({"error": ". ".join(messages)})
+            return data if data['tickers'] else {"error": data.get('error')}
     
     # Check for errors in data store and display bootstrap alert with error message
     @app.callback(
@@ -204,8 +443,8 @@ def main():
         prevent_initial_call=True,
     )
     def check_data(data):
-        if "error" in json.loads(data).keys():
-            return json.dumps(json.loads(data).get('error')).strip('"'), True
+        if data and "error" in data.keys():
+            return data.get('error'), True
         else:
             return dash.no_update, False
     
@@ -215,45 +454,118 @@ def main():
         Input("data", "data"),
         Input("term-selector", "value"),
         Input("graph-selector", "value"),
+        Input("timeframe-selector", "value"),
         prevent_initial_call=True,
     )
-    def draw_graphs(data, scale, view):
-        if data is not None and len(data) > 0:
-            data = json.loads(data)
+    @metrics.timed("draw_graphs")
+    def draw_graphs(data, scale, view, timeframe):
+        if data is not None and data.get('token'):
             graphs = []
+            now = datetime.now()
+            ten_year = now - timedelta(days=3650)
+            five_year = now - timedelta(days=1825)
+            two_year = now - timedelta(days=730)
+            one_year = now - timedelta(days=365)
             term_switch = {
-                1: [one_year, 52],
-                2: [two_year, 104],
-                3: [five_year, 261],
-                4: [ten_year, 521],
+                1: one_year,
+                2: two_year,
+                3: five_year,
+                4: ten_year,
             }
-            view_switch = {
-                1: ['value buy_signal', 'rgba(0,0,0,0.5) rgba(32,208,112,0.9)'],
-                2: ['macd signal', 'rgba(208,128,208,0.9) rgba(128,208,248,0.9)'],
-                3: ['trend_wma trend_signal', 'rgba(0,64,224,0.9) rgba(32,208,112,0.9)'],
-                4: ['rsi', 'rgba(0,0,0,0.5)'],
-                5: ['obv', 'rgba(0,0,0,0.5)'],
-                6: ['obv_trend obv_signal', 'rgba(0,64,224,0.9) rgba(32,208,112,0.9)'],
-            } 
-            for i in data:
-                df = pd.read_json(data.get(i).get('weekly'), orient="split")
-                params = view_switch.get(view)
-                minval = min(df[params[0].split()[0]][:term_switch.get(scale)[1]]) - abs((min(df[params[0].split()[0]][:term_switch.get(scale)[1]]))*.01)
-                maxval = max(df[params[0].split()[0]][:term_switch.get(scale)[1]]) + abs((max(df[params[0].split()[0]][:term_switch.get(scale)[1]]))*.01)
-                fig = px.line(df, x='date', y=params[0].split()[0])
-                fig.update_layout(title=i, title_x=0.5)
-                fig.update_traces(line_color=params[1].split()[0])
-                if len(params[0].split()) > 1:
-                    for j in range(len(params[0].split())-1):
-                        fig.add_scatter(x=df['date'], y=df[params[0].split()[j+1]], mode='lines', line_color=params[1].split()[j+1], line_shape='spline', name=params[0].split()[j-1])
-                fig.update_xaxes(range=[term_switch.get(scale)[0], now])
-                fig.update_yaxes(range=[minval, maxval])
+            for i in data.get('tickers'):
+                params = views.get(view)
+                cols, colors = params[0].split(), params[1].split()
+                # Only the bars in the selected term are read
+                with metrics.stage("frames"):
+                    df = query(i, timeframe, ["date"] + cols, start=term_switch.get(scale))
+                if df is None or len(df) < 1:
+                    continue
+                minval = min(df[cols[0]]) - abs(min(df[cols[0]])*.01)
+                maxval = max(df[cols[0]]) + abs(max(df[cols[0]])*.01)
+                with metrics.stage("figure"):
+                    import plotly.express as px
+                    fig = px.line(df.iloc[sample(df, cols[0])], x='date', y=cols[0])
+                    fig.update_layout(title=i, title_x=0.5)
+                    fig.update_traces(line_color=colors[0])
+                    if len(cols) > 1:
+                        for j in range(len(cols)-1):
+                            idx = sample(df, cols[j+1])
+                            fig.add_scatter(x=df['date'].iloc[idx], y=df[cols[j+1]].iloc[idx], mode='lines', line_color=colors[j+1], line_shape='spline', name=cols[j-1])
+                    fig.update_xaxes(range=[term_switch.get(scale), now])
+                    fig.update_yaxes(range=[minval, maxval])
                 graphs.append(dbc.Row([
                     dcc.Graph(figure=fig, config={'displayModeBar': False}),
                     #dbc.Table.from_dataframe(df, striped=True, bordered=True, color="dark")
                 ]))
             return [i for i in graphs]
 
+    # Draw live charts of the watched tickers while live mode is switched on
+    @app.callback(
+        Output("live-content", "children"),
+        Output("live-interval", "disabled"),
+        Output("live-cursor", "data"),
+        Input("live-switch", "value"),
+        Input("data", "data"),
+        Input("graph-selector", "value"),
+    )
+    def start_live(selected, data, view):
+        if "live" not in (selected or []):
+            return [], True, None
+        if engine is None:
+            return dbc.Alert("No live feed is configured; set NETRIS_FEED to \"replay:<file>\" to replay saved ticks.", color="warning"), True, None
+        import plotly.graph_objects as go
+        cols, colors = views.get(view)[0].split(), views.get(view)[1].split()
+        graphs, cursor = [], {}
+        for ticker in watched(data):
+            changes = engine.changes(ticker) or {"rows": [], "buys": [], "forming": None, "time": 0}
+            cursor.update({ticker: changes['time']})
+            points = live_points(changes, cols)
+            fig = go.Figure()
+            for col, color, (x, y) in zip(cols, colors, points):
+                fig.add_scatter(x=x, y=y, mode='markers' if col == "buy_signal" else 'lines', line_color=color, name=col)
+            # The bar in progress is plotted as its own single point trace
+            fig.add_scatter(x=points[-1][0], y=points[-1][1], mode='markers', marker_color=colors[0], name="forming")
+            # uirevision keeps zoom and pan while points are added
+            fig.update_layout(title=f"{ticker} (live)", title_x=0.5, uirevision=ticker)
+            graphs.append(dbc.Row([
+                dcc.Graph(id={"type": "live-graph", "ticker": ticker}, figure=fig, config={'displayModeBar': False}),
+            ]))
+        return graphs, False, cursor
+
+    # Send live charts only the points added since their last poll
+    @app.callback(
+        Output({"type": "live-graph", "ticker": ALL}, "extendData"),
+        Output("live-cursor", "data", allow_duplicate=True),
+        Input("live-interval", "n_intervals"),
+        State("live-cursor", "data"),
+        State({"type": "live-graph", "ticker": ALL}, "id"),
+        State("graph-selector", "value"),
+        prevent_initial_call=True,
+    )
+    def stream_live(n, cursor, ids, view):
+        cursor = dict(cursor if cursor else {})
+        cols = views.get(view)[0].split()
+        # Column traces keep the latest <max_points> points; the bar in progress keeps one
+        limits = [max_points] * len(cols) + [1]
+        updates = []
+        for graph in ids:
+            ticker = graph['ticker']
+            changes = engine.changes(ticker, cursor.get(ticker, 0)) if engine else None
+            points = live_points(changes, cols) if changes else []
+            traces = [j for j,p in enumerate(points) if p[0]]
+            if not traces:
+                updates.append(dash.no_update)
+                continue
+            # A worker behind the one answering the last poll has no rows after the cursor yet,
+            # so the cursor never moves back
+            cursor.update({ticker: max(changes['time'], cursor.get(ticker, 0))})
+            updates.append([
+                {"x": [points[j][0] for j in traces], "y": [points[j][1] for j in traces]},
+                traces,
+                {"x": [limits[j] for j in traces], "y": [limits[j] for j in traces]},
+            ])
+        return updates, cursor
+
     # Debugging output - REMOVE LATER!
     # @app.callback(
     #     Output("test", "children"),
@@ -263,95 +575,310 @@ def main():
     # def print_data(data):
     #     return data
 
-    def format_data(data):
-        # Calculate graphing data, format, and return as Pandas DataFram object
-        h_key, l_key, close_key, adj_close_key, vol_key = "2. high", "3. low", "4. close", "5. adjusted close", "6. volume"
-        for i in data.values():
-            for f,j in i.items():
-                dates, high, low, vol = ([] for i in range(4))
-                for d,v in j.items():
-                    dates.append(d)
-                    adj = 1
-                    if v.get(adj_close_key) and v.get(adj_close_key) != v.get(close_key):
-                        adj = float(v.get(adj_close_key)) / float(v.get(close_key))
-                    high.append(float(v.get(h_key)) * adj)
-                    low.append(float(v.get(l_key)) * adj)
-                    vol.append(int(v.get(vol_key)) / adj)
-                df = pd.DataFrame({
-                    "date": dates,
-                    "high": high,
-                    "low": low,
-                    "volume": vol,
-                })
-                val = (df['high'] + df['low']) / 2
-                df['value'] = df.index.map(val)
-                lt_trend = df['value'][::-1].rolling(180).mean()
-                df['lt_trend'] = df.index.map(lt_trend)
-                trend_wma = df['value'][::-1].rolling(28).apply(get_wma)
-                df['trend_wma'] = df.index.map(trend_wma)
-                trend_signal = df['value'][::-1].ewm(span=14, min_periods=14).mean()
-                df['trend_signal'] = df.index.map(trend_signal)
-                get_macd(df)
-                get_rsi(df)
-                get_obv(df)
-                obv_trend = df['obv'][::-1].rolling(28).apply(get_wma)
-                df['obv_trend'] = df.index.map(obv_trend)
-                obv_signal = df['obv'][::-1].ewm(span=14, min_periods=14).mean()
-                df['obv_signal'] = df.index.map(obv_signal)
-                get_buy_sig(df)
-                i.update({f: df.to_json(date_format="iso", orient="split")})
-        return data
-
-    def get_wma(vals):
-        # Calculate and return weighted moving average values for <vals>
-        weights = [i+1 for i in range(len(vals))]
-        return sum(weights * vals) / sum(weights)
-    
-    def get_rsi(df, dur=14):
-        # Calculate and return RSI values from Pandas DataFrame
-        delta = df['value'][::-1].diff()
-        up = delta.clip(lower=0).round(2)
-        down = delta.clip(upper=0).abs().round(2)
-        ma_up = up.rolling(dur).mean()
-        ma_down = down.rolling(dur).mean()
-        rs = ma_up / ma_down
-        rsi = 100 - (100 / (1 + rs ))
-        df['rsi'] = df.index.map(rsi)
-        #mean_rsi = df['rsi'][::-1].rolling(dur * 6).mean()
-        #df['mean_rsi'] = df.index.map(mean_rsi)
-
-    def get_obv(df):
-        # Calculate and return On-balance Volume from Pandas DataFrame
-        delta = df['value'][::-1].diff()
-        adj = delta.clip(lower=0.01, upper=-0.01).round(2) * 100
-        obv = df['volume'][::-1].astype(int) * adj
-        df['obv'] = df.index.map(obv.cumsum())
-
-    def get_macd(df, fast=12, slow=26, sig=9):
-        fast_ema = df['value'][::-1].ewm(span=fast, min_periods=fast).mean()
-        slow_ema = df['value'][::-1].ewm(span=slow, min_periods=slow).mean()
-        macd = fast_ema - slow_ema
-        signal = macd.ewm(span=sig, min_periods=sig).mean()
-        df['macd'] = df.index.map(macd)
-        df['signal'] = df.index.map(signal)
-        #mean_macd = macd.rolling(slow * 5).mean()
-        #df['mean_macd'] = df.index.map(mean_macd)
-
-    def get_buy_sig(df):
-        buy_sig = []
-        for i, row in df.iterrows():
-            if (
-                #row['macd'] < row['mean_macd'] and
-                sum(df['macd'][i-7:i]) / 7 < row['signal'] and
-                #round(abs(row['macd'] / row['signal']),2) in [float(x/100) for x in range(75, 125)] and
-                abs(row['macd'] - row['signal']) < 1 and
-                row['rsi'] < 50
-            ):
-                buy_sig.append(row['value'])
+    def refresh_data(order, force=False):
+        # Bring the stored data and cached frames of the tickers in <order> up to date,
+        # downloading only tickers not already refreshed today unless <force> is True
+        # Returns a dict of errors keyed by ticker; unrecognised tickers are providers.UnknownSymbol
+        today = datetime.now().strftime('%Y%m%d')
+        # Every write of this refresh carries the same version so other workers can tell
+        # their cached frames are stale, and the time it was written for Last-Modified headers
+        fields = {"updated": today, "version": uuid.uuid4().hex, "written": int(time.time())}
+        data, recent, stale, seen, errors = {}, [], [], {}, {}
+        for ticker in order:
+            # Check if data is already present and current
+            meta = bars['daily'].meta(ticker)
+            if meta and meta.get('updated') == today and not force:
+                tickers_total.inc(result="current")
+                cached_frames(ticker, meta)
+            elif not re.search(r'^[A-Z^]{1}[A-Z-=]{0,7}(?<=[A-Z])$', ticker):
+                errors.update({ticker: ValueError(f"Invalid characters or length in ticker: {ticker}")})
             else:
-                buy_sig.append(-1)
-        df['buy_signal'] = buy_sig  
+                # The latest bars are enough to extend recently stored data
+                if meta and last_date(ticker) >= np.datetime64(datetime.now() - timedelta(days=120)):
+                    recent.append(ticker)
+                else:
+                    stale.append(ticker)
+                seen.update({ ticker: meta.get('version') if meta else None })
+        results, failed = download(recent, recent=True)
+        errors.update(failed)
+        more, failed = download(stale)
+        results.update(more)
+        errors.update(failed)
+        # Hold each downloaded ticker's lock while it is written so workers refreshing the same
+        # ticker take turns; locks are taken in sorted order to avoid deadlocks
+        with contextlib.ExitStack() as stack:
+            for ticker in sorted(results):
+                stack.enter_context(fsops.locked(lock_path(ticker)))
+            full, retry = {}, []
+            for ticker, series in results.items():
+                meta = bars['daily'].meta(ticker)
+                if meta and meta.get('version') != seen.get(ticker):
+                    # Another worker stored this ticker while it was downloading
+                    data.update({ ticker: load_data(ticker) })
+                    continue
+                # Keep successful downloads even if another ticker failed
+                start = time.perf_counter()
+                updated = update_data(ticker, series, fields)
+                if updated is not None:
+                    ticker_seconds.observe(time.perf_counter() - start, mode="update")
+                    tickers_total.inc(result="updated")
+                    data.update({ ticker: updated })
+                elif ticker in recent:
+                    # Recent bars cannot rebuild the adjusted history
+                    retry.append(ticker)
+                else:
+                    full.update({ ticker: series })
+            more, failed = download(retry)
+            full.update(more)
+            errors.update(failed)
+            # Tickers without usable stored data are calculated together in one batch
+            with metrics.stage("analyze") as timer:
+                data.update(analyze_data(full, fields))
+            for ticker in full:
+                tickers_total.inc(result="rebuilt")
+                ticker_seconds.observe(timer.seconds / len(full), mode="rebuild")
+            tickers_total.inc(len(errors), result="failed")
+            # Replace cached frames so every session sees the refreshed data
+            with metrics.stage("format"):
+                for ticker, cols in data.items():
+                    frames.set(ticker, (bars['daily'].meta(ticker).get('version'), format_data(cols, compact_frames)))
+        return errors
+
+    def download(symbols, **kwargs):
+        # Return a tuple of dicts (results, errors) of daily bars for <symbols> from the provider;
+        # every symbol fails if the provider itself raises
+        # Accepts optional bool keyword argument <recent> to only download the latest bars
+        if not symbols:
+            return {}, {}
+        try:
+            with metrics.stage("fetch"):
+                return provider.daily(symbols, recent=kwargs.get('recent'))
+        except Exception as e:
+            return {}, {x: e for x in symbols}
+
+    def prefetch():
+        # Refresh every ticker listed in the watchlist file, a batch at a time so
+        # interactive lookups are not starved of provider requests for long
+        # Failed tickers are counted by refresh_data and raised once every batch has run,
+        # so the scheduler records them as the run's error
+        content = fsops.read_file(watchlist, silent=True)
+        if type(content) is not str:
+            return
+        order = list(dict.fromkeys(x.upper() for x in content.replace(',', ' ').split()))
+        errors = {}
+        for i in range(0, len(order), prefetch_batch):
+            errors.update(refresh_data(order[i:i+prefetch_batch], force=True))
+        if errors:
+            raise RuntimeError(f"Prefetch unable to retrieve data for ticker: {', '.join(errors)}")
+
+    def load_data(ticker):
+        # Return the stored bar and indicator arrays of <ticker> for every timeframe
+        return {tf: bars[tf].read(ticker) for tf in resample.TIMEFRAMES}
+
+    def update_data(ticker, series, fields):
+        # Merge the downloaded daily bars in <series> into the stored data for <ticker>;
+        # bars and indicators are only calculated for the periods the new days fall in
+        # <fields> are saved to the meta of every timeframe written
+        # Returns a dict of chronological bar and indicator arrays for each timeframe, or None
+        # when the adjusted history changed or nothing is stored, which requires a full recalculation
+        meta = bars['daily'].meta(ticker)
+        if meta is None or meta.get('rows') < 2:
+            return None
+        stored = bars['daily'].read(ticker, ["date", "open", "high", "low", "close", "volume"])
+        # The last stored bar may be from an unfinished day, so it is replaced along with any new bars
+        start = meta.get('rows') - 1
+        first = np.searchsorted(series['date'], stored['date'][start-1])
+        new = {k: v[first:] for k,v in series.items()}
+        if not (
+            len(new['date']) > 1 and
+            new['date'][0] == stored['date'][start-1] and
+            np.allclose(
+                [new['high'][0], new['low'][0]],
+                [stored['high'][start-1], stored['low'][start-1]],
+                rtol=1e-9
+            )
+        ):
+            return None
+        new = {k: v[1:] for k,v in new.items()}
+        # Daily bars are updated last since they mark the ticker as current
+        return {tf: advance_data(tf, ticker, stored, start, new, fields) for tf in resample.TIMEFRAMES[::-1]}
 
+    def advance_data(tf, ticker, stored, start, new, fields):
+        # Replace the stored <tf> bars of <ticker> from the period containing daily row <start> onward,
+        # using the <stored> daily bars before <start> and the <new> daily bars;
+        # indicators are advanced from the saved state, or recalculated when too few bars are stored
+        # Returns a dict of chronological bar and indicator arrays
+        meta = bars[tf].meta(ticker)
+        keys = resample.periods(stored['date'][:start+1], tf)
+        first = np.searchsorted(keys, keys[start])
+        recent = resample.resample({k: np.concatenate((v[first:start], new[k])) for k,v in stored.items()}, tf)
+        prev = bars[tf].read(ticker)
+        if (
+            meta and meta.get('rows') > indicators.TAIL and
+            resample.periods(prev['date'][-1:], tf)[0] == keys[start]
+        ):
+            end = meta.get('rows') - 1
+            cols, state = indicators.advance(
+                {k: v[end-indicators.TAIL:end] for k,v in prev.items()},
+                meta.get('state'), recent['high'], recent['low'], recent['volume']
+            )
+            tail = end - indicators.LOOKBACK
+            cols = dict({k: np.concatenate((prev[k][tail:end], v)) for k,v in recent.items()}, **cols)
+            bars[tf].append(ticker, cols, start=tail, state=state, **fields)
+        else:
+            series = resample.resample({k: np.concatenate((v[:start], new[k])) for k,v in stored.items()}, tf)
+            cols = dict(series, **indicators.analyze(series['high'], series['low'], series['volume']))
+            state = indicators.save_state(cols, len(series['date']) - 1)
+            bars[tf].write(ticker, cols, state=state, **fields)
+        return bars[tf].read(ticker)
+
+    def analyze_data(daily, fields):
+        # Build bars for every timeframe from the <daily> bars of each ticker, calculate
+        # indicators for all tickers as one panel per timeframe and store the results
+        # Returns a dict of chronological bar and indicator arrays for each ticker and timeframe
+        results = {t: {} for t in daily}
+        if not daily:
+            return results
+        # Daily bars are stored last since they mark the ticker as current
+        for tf in resample.TIMEFRAMES[::-1]:
+            series = {t: resample.resample(v, tf) for t,v in daily.items()}
+            # Tickers are stacked by bar position, so calendars that differ between them,
+            # such as crypto beside stocks, do not leave gaps in each other's indicators
+            data = panel.stack(series)
+            for ticker, cols in panel.split(data, panel.analyze(data)).items():
+                cols = dict(series[ticker], **cols)
+                state = indicators.save_state(cols, len(cols['date']) - 1)
+                bars[tf].write(ticker, cols, state=state, **fields)
+                results[ticker].update({tf: cols})
+        return results
+
+    def sample(df, col):
+        # Return the row positions of <df> to plot for column <col>, downsampled to <max_points>
+        return downsample.lttb(np.arange(len(df)), df[col].to_numpy(), max_points)
+
+    def watched(data):
+        # Return the tickers in the <data> store, or those listed in the watchlist file when none were entered
+        if data and data.get('tickers'):
+            return data.get('tickers')
+        content = fsops.read_file(watchlist, silent=True)
+        return list(dict.fromkeys(x.upper() for x in content.replace(',', ' ').split())) if type(content) is str else []
+
+    def live_points(changes, cols):
+        # Return a list of (x, y) lists of the new points of each column in <cols> found in <changes>,
+        # a netris.live.Engine.changes() result, followed by the bar in progress;
+        # buy signals are only plotted once the rows after them decide them
+        points = []
+        for col in cols:
+            rows = changes['buys'] if col == "buy_signal" else changes['rows']
+            points.append(([x['date'] for x in rows], [None if x[col] != x[col] else x[col] for x in rows]))
+        forming = changes['forming']
+        value = forming[cols[0]] if forming else None
+        points.append(([forming['date']], [None if value != value else value]) if forming else ([], []))
+        return points
+
+    def query(ticker, tf, columns, start=None, end=None):
+        # Return a Pandas DataFrame of <columns> of the <tf> bars of <ticker> dated from <start>
+        # to <end>, ordered as the cached frames are, or None if <ticker> is not stored; rows come
+        # from the cached frames when they are current, otherwise only the requested rows are
+        # read from the data store without loading the whole history
+        meta = bars['daily'].meta(ticker)
+        if meta is None:
+            return None
+        cached = frames.get(ticker)
+        if cached is not None and cached[0] == meta.get('version'):
+            df = cached[1][tf]
+            if compact_frames:
+                first, stop = store.locate(df['date'].to_numpy(), start, end)
+                return df.iloc[first:stop][columns]
+            # Frames are newest first, so the range is searched for in the reversed dates
+            dates = df['date'].to_numpy()[::-1]
+            first, stop = store.locate(dates, start, end)
+            return df.iloc[len(dates)-stop:len(dates)-first][columns]
+        import pandas as pd
+        # A shared lock keeps writers out until the rows are copied into the frame
+        with fsops.locked(lock_path(ticker), shared=True):
+            data = bars[tf].query(ticker, columns, start=start, end=end)
+            return pd.DataFrame({k: data[k] if compact_frames else data[k][::-1] for k in columns}) if data else None
+
+    def cached_frames(ticker, meta):
+        # Return the formatted frames of <ticker>, reloading them from the data stores when
+        # they were evicted from the cache or the stored data changed since they were cached,
+        # such as after another worker refreshed the ticker
+        cached = frames.get(ticker)
+        if cached is None or cached[0] != meta.get('version'):
+            # A shared lock keeps writers out until the rows are copied into the frames
+            with fsops.locked(lock_path(ticker), shared=True):
+                cached = (bars['daily'].meta(ticker).get('version'), format_data(load_data(ticker), compact_frames))
+            frames.set(ticker, cached)
+        return cached[1]
+
+    def tuned(ticker, tf, cols, params):
+        # Return <cols>, stored <tf> rows of <ticker> including their "date", with each indicator
+        # in <params>, a dict of indicator name to parameters, recalculated with those parameters
+        # The stored columns hold the default parameters; other settings are calculated over the
+        # whole history once per version of the bars and memoized
+        names = [k for k,v in params.items() if k in cols and any(v.get(x, d) != d for x,d in indicators.PARAMS[k].items())]
+        if not names or len(cols['date']) < 1:
+            return cols
+        data = bars[tf].read(ticker, ["date", "high", "low", "volume"])
+        version = bars[tf].meta(ticker).get('version')
+        first = np.searchsorted(data['date'], cols['date'][0])
+        for name in names:
+            line = memoized.indicator(ticker, tf, data, name, version, **params[name])
+            cols.update({name: np.array(line[first:first+len(cols['date'])])})
+        return cols
+
+    def last_date(ticker):
+        # Return the date of the last stored daily bar of <ticker>; a shared lock keeps writers
+        # replacing the last rows out while it is read
+        with fsops.locked(lock_path(ticker), shared=True):
+            return bars['daily'].tail(ticker, ["date"])['date'][-1]
+
+    def lock_path(ticker):
+        # Return the path of the lock file guarding writes to the stored data of <ticker>
+        return f"{data_dir}/locks/{ticker}.lock"
+
+    # Refresh the watchlist before the market opens and after it closes; the lock file
+    # elects one process to run the refreshes when several workers serve the app
+    # Only processes that serve requests should start it (see main and wsgi.py), so the
+    # process holding the lock is one whose cached frames the refreshes warm
+    app.prefetcher = scheduler.Scheduler(prefetch, ["09:00", "16:30"], tz="America/New_York", lock=f"{data_dir}/locks/prefetch.lock")
+    return app
+
+def when_listening(port, func, *args):
+    # Runs <func> on a background thread once a local server accepts connections on <port>
+    def wait():
+        for i in range(600):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        func(*args)
+    thread = threading.Thread(target=wait, daemon=True)
+    thread.start()
+    return thread
+
+def warm_imports():
+    # Import the modules deferred at startup so the first lookup does not wait for them
+    for name in ("pandas", "plotly.express", "netris.fetch"):
+        importlib.import_module(name)
+
+def main():
+    # Run the development server; see wsgi.py for serving with multiple worker processes
+    data_dir = f"{os.getcwd()}/data"
+    fsops.create_dir(data_dir)
+    # Once the port is open, the reloader's watcher process cleans up once for the whole
+    # session and each serving process it starts warms the deferred imports
+    app = create_app(data_dir=data_dir)
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        when_listening(8080, warm_imports)
+        # The watcher never serves requests, so only the serving process prefetches and reads the live feed
+        app.prefetcher.start(run_now=True)
+        if app.engine:
+            app.engine.start()
+    else:
+        when_listening(8080, cleanup, data_dir)
     app.run_server(host='0.0.0.0', port='8080', debug=True)
 
 if __name__ == "__main__":
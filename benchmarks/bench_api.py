@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+#
+# Description: Times batch requests to the JSON analysis API from concurrent clients against
+# synthetic symbols stored the way the analyzer stores them, measures how long chart callbacks
+# take while the clients run, and prints the results as JSON
+# Usage: python benchmarks/bench_api.py [--symbols N] [--bars N] [--clients N] [--requests N] [--batch N] [--timeframe TF]
+
+# Import modules
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import analyzer
+from netris import indicators
+from netris import providers
+from netris import resample
+from netris import store
+from benchmarks import synthetic
+
+def build(data_dir, symbols, bars):
+    # Stores bars and indicators of <symbols> synthetic symbols for every timeframe under <data_dir>
+    for tf in resample.TIMEFRAMES:
+        db = store.Store(f"{data_dir}/{tf}")
+        for symbol, cols in synthetic.ohlcv(symbols, bars).items():
+            series = resample.resample(cols, tf)
+            series.update(indicators.analyze(series['high'], series['low'], series['volume']))
+            db.write(symbol, series, version=uuid.uuid4().hex, updated="bench")
+
+def percentile(times, q):
+    return round(float(np.percentile(times, q)) * 1000, 2) if times else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the JSON analysis API")
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--bars", type=int, default=2600)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=10, help="requests per client")
+    parser.add_argument("--batch", type=int, default=50, help="symbols per request")
+    parser.add_argument("--timeframe", default="weekly", choices=resample.TIMEFRAMES)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        build(f"{directory}/data", args.symbols, args.bars)
+        # Nothing is downloaded; the fixtures provider only answers refreshes
+        app = analyzer.create_app(data_dir=f"{directory}/data", provider=providers.Fixtures(directory))
+        names = synthetic.symbols(args.symbols)
+        batches = [names[i:i+args.batch] for i in range(0, len(names), args.batch)]
+        latencies, sizes, revalidated = [], [], []
+        def client(n):
+            http = app.server.test_client()
+            for i in range(args.requests):
+                batch = batches[(n + i) % len(batches)]
+                start = time.perf_counter()
+                res = http.get(f"/api/analysis?symbols={','.join(batch)}&timeframe={args.timeframe}", headers={"Accept-Encoding": "gzip"})
+                latencies.append(time.perf_counter() - start)
+                sizes.append(len(res.data))
+                start = time.perf_counter()
+                http.get(f"/api/analysis?symbols={','.join(batch)}&timeframe={args.timeframe}", headers={"If-None-Match": res.headers['ETag']})
+                revalidated.append(time.perf_counter() - start)
+        # Chart callbacks run beside the clients as a browser session would
+        draw = app.callback_map["content.children"]["callback"]
+        token = {"token": "bench", "tickers": names[:5]}
+        charts = []
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(args.clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        while any(x.is_alive() for x in threads):
+            began = time.perf_counter()
+            draw(token, 3, 1, "weekly", outputs_list={"id": "content", "property": "children"})
+            charts.append(time.perf_counter() - began)
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    result = {
+        "symbols": args.symbols,
+        "bars": args.bars,
+        "clients": args.clients,
+        "batch": args.batch,
+        "timeframe": args.timeframe,
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "symbols_per_second": round(len(latencies) * args.batch / elapsed),
+        "request_ms": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95)},
+        "gzip_kb_per_request": round(np.mean(sizes) / 1024, 1),
+        "revalidate_ms": {"p50": percentile(revalidated, 50), "p95": percentile(revalidated, 95)},
+        "chart_callback_ms": {"p50": percentile(charts, 50), "p95": percentile(charts, 95), "count": len(charts)},
+    }
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+#
+# Description: Times a backtest sweep of the buy signal thresholds and exits over a panel
+# of synthetic symbols, serially and on a process pool, and prints the timings as JSON
+# Usage: python benchmarks/bench_backtest.py [--symbols N] [--bars N] [--workers N] [--top N]
+
+# Import modules
+import argparse
+import json
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from netris import backtest
+from netris import panel
+from benchmarks import synthetic
+
+# Settings swept by default: the MACD and RSI thresholds of the rule and the exits
+GRID = {
+    "fast": [8, 12],
+    "rsi_below": [30, 40, 50, 60],
+    "gap": [0.25, 0.5, 1, 2],
+    "hold": [5, 10, 20],
+    "stop": [None, 0.05],
+    "target": [None, 0.1],
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backtest parameter sweeps")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--bars", type=int, default=520)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--top", type=int, default=3, help="best settings to report")
+    args = parser.parse_args()
+    data = panel.stack(synthetic.ohlcv(args.symbols, args.bars))
+    combos = backtest.grid(**GRID)
+    start = time.perf_counter()
+    backtest.run(data)
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    serial = backtest.sweep(data, combos)
+    serial_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    pooled = backtest.sweep(data, combos, workers=args.workers)
+    pooled_seconds = time.perf_counter() - start
+    result = {
+        "symbols": args.symbols,
+        "bars": args.bars,
+        "settings": len(combos),
+        "workers": args.workers,
+        "cpus": os.cpu_count(),
+        "single_run_seconds": round(single, 3),
+        "serial_sweep_seconds": round(serial_seconds, 3),
+        "pooled_sweep_seconds": round(pooled_seconds, 3),
+        "results_match": [x[0] for x in serial] == [x[0] for x in pooled],
+        "best": [{"params": p, "summary": s} for p, s in serial[:args.top]],
+    }
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
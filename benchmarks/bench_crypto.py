@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#
+# Description: Compares the throughput of plain and encrypted caches: fsops reads and writes
+# of large files, and store writes, reads and meta lookups of synthetic symbols
+# Usage: python benchmarks/bench_crypto.py [--symbols N] [--bars N] [--file-mb N] [--repeat N]
+
+# Import modules
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from netris import fsops
+from netris import indicators
+from netris import store
+from benchmarks import synthetic
+
+def timed(func, repeat):
+    # Returns the best wall time in seconds of <repeat> calls to <func>
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def files(directory, size, key, repeat):
+    # Returns MB/s writing and reading a <size> byte file with fsops, encrypted when <key> is set
+    content = np.random.default_rng(0).bytes(size)
+    file = f"{directory}/file-{'encrypted' if key else 'plain'}"
+    write = timed(lambda: fsops.write_file(content, file, type="bytes", key=key), repeat)
+    read = timed(lambda: fsops.read_file(file, type="bytes", key=key), repeat)
+    return {"write_mb_s": round(size / 1024 ** 2 / write, 1), "read_mb_s": round(size / 1024 ** 2 / read, 1)}
+
+def stores(directory, data, key, repeat):
+    # Returns the throughput of writing, reading and looking up the symbols in <data>
+    # in a store, encrypted when <key> is set
+    db = store.Store(f"{directory}/store-{'encrypted' if key else 'plain'}", key)
+    nbytes = sum(v.nbytes for cols in data.values() for v in cols.values())
+    symbols = list(data)
+    def write():
+        for symbol, cols in data.items():
+            db.write(symbol, cols, version="bench")
+    def read():
+        # Every column is copied so memory-mapped reads touch all their rows too
+        for symbol in symbols:
+            for v in db.read(symbol).values():
+                np.array(v)
+    def lookup():
+        for symbol in symbols:
+            db.tail(symbol, ["date", "value", "buy_signal"], 20)
+    write_seconds = timed(write, repeat)
+    read_seconds = timed(read, repeat)
+    lookup_seconds = timed(lookup, repeat)
+    return {
+        "write_mb_s": round(nbytes / 1024 ** 2 / write_seconds, 1),
+        "read_mb_s": round(nbytes / 1024 ** 2 / read_seconds, 1),
+        "lookup_ms_per_symbol": round(lookup_seconds / len(symbols) * 1000, 3),
+        "disk_bytes": sum(e.stat().st_size for s in os.scandir(db.root) for e in os.scandir(s.path)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark encrypted against plain cache throughput")
+    parser.add_argument("--symbols", type=int, default=100)
+    parser.add_argument("--bars", type=int, default=5000)
+    parser.add_argument("--file-mb", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    data = synthetic.ohlcv(args.symbols, args.bars)
+    for cols in data.values():
+        cols.update(indicators.analyze(cols['high'], cols['low'], cols['volume']))
+    with tempfile.TemporaryDirectory() as directory:
+        key = fsops.get_key(f"{directory}/cache.key")
+        result = {
+            "file_mb": args.file_mb,
+            "symbols": args.symbols,
+            "bars": args.bars,
+            "chunk_bytes": fsops.CHUNK_SIZE,
+        }
+        for name, k in (("plain", None), ("encrypted", key)):
+            result.update({name: {
+                "files": files(directory, args.file_mb * 1024 ** 2, k, args.repeat),
+                "store": stores(directory, data, k, args.repeat),
+            }})
+        # Key lookups after the first are served from memory
+        result.update(get_key_us=round(timed(lambda: fsops.get_key(f"{directory}/cache.key"), 1000) * 1e6, 2))
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
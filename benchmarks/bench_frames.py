@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+#
+# Description: Compares the memory and formatting time of the default and compact frame layouts
+# the analyzer caches for each ticker, over synthetic symbols, and prints the results as JSON
+# Usage: python benchmarks/bench_frames.py [--symbols N] [--bars N] [--repeat N]
+
+# Import modules
+import argparse
+import json
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import analyzer
+from netris import indicators
+from netris import memcache
+from netris import resample
+from benchmarks import synthetic
+
+def timed(func, repeat):
+    # Returns the best wall time in seconds of <repeat> calls to <func>, and the last result
+    best, result = None, None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark frame layouts")
+    parser.add_argument("--symbols", type=int, default=100)
+    parser.add_argument("--bars", type=int, default=5000, help="daily bars per symbol")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    data = {}
+    for symbol, daily in synthetic.ohlcv(args.symbols, args.bars).items():
+        data[symbol] = {}
+        for tf in resample.TIMEFRAMES:
+            series = resample.resample(daily, tf)
+            data[symbol][tf] = dict(series, **indicators.analyze(series['high'], series['low'], series['volume']))
+    result = {"symbols": args.symbols, "bars": args.bars}
+    for name, compact in (("default", False), ("compact", True)):
+        seconds, frames = timed(lambda: {k: analyzer.format_data(v, compact) for k,v in data.items()}, args.repeat)
+        nbytes = sum(memcache.sizeof(x) for x in frames.values())
+        result.update({name: {
+            "bytes_per_symbol": round(nbytes / args.symbols),
+            "format_ms_per_symbol": round(seconds / args.symbols * 1000, 3),
+            "symbols_per_gb": int(1024 ** 3 / (nbytes / args.symbols)),
+        }})
+    result.update(saved=round(1 - result['compact']['bytes_per_symbol'] / result['default']['bytes_per_symbol'], 3))
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
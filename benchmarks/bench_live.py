@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+#
+# Description: Measures how many ticks per second the live engine turns into bars and
+# indicators for a watchlist of synthetic symbols, replayed from a file as fast as it is read,
+# and how long reading the new points of every symbol takes, and prints the results as JSON
+# Usage: python benchmarks/bench_live.py [--symbols N] [--ticks N] [--interval SECONDS]
+
+# Import modules
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from netris import live
+from benchmarks import synthetic
+
+def ticks(count, total, seed=0, start=1735799400):
+    # Returns a dict of "symbol", "time", "price" and "volume" arrays of <total> ticks spread
+    # over <count> symbols, one tick a second per symbol on average, in time order
+    rng = np.random.default_rng(seed)
+    names = np.array(synthetic.symbols(count))
+    which = rng.integers(0, count, total)
+    times = start + np.sort(rng.uniform(0, total / count, total))
+    prices = np.empty(total)
+    for j in range(count):
+        rows = np.flatnonzero(which == j)
+        prices[rows] = np.round(rng.uniform(10, 500) * np.exp(np.cumsum(rng.normal(0, .0005, len(rows)))), 2)
+    return {"symbol": names[which], "time": times, "price": prices, "volume": rng.integers(1, 500, total).astype(float)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark live tick processing")
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--ticks", type=int, default=200000)
+    parser.add_argument("--interval", type=int, default=60, help="bar length in seconds")
+    args = parser.parse_args()
+    data = ticks(args.symbols, args.ticks)
+    with tempfile.TemporaryDirectory() as directory:
+        file = f"{directory}/ticks.csv"
+        live.write_replay(data, file)
+        start = time.perf_counter()
+        # The clock jumps past the last tick after the first read, releasing every tick
+        feed = live.Replay(file, clock=iter([0., float("inf")]).__next__)
+        load_seconds = time.perf_counter() - start
+        received = feed.ticks() + feed.ticks()
+    engine = live.Engine(feed, interval=args.interval)
+    start = time.perf_counter()
+    # Feeds deliver ticks in small batches, as a poll of the feed would
+    for i in range(0, len(received), 500):
+        engine.process(received[i:i+500])
+    process_seconds = time.perf_counter() - start
+    names = sorted(engine.series)
+    start = time.perf_counter()
+    points = sum(len(engine.changes(x, engine.series[x].time - 1)['rows']) for x in names)
+    changes_seconds = time.perf_counter() - start
+    result = {
+        "symbols": args.symbols,
+        "ticks": len(received),
+        "interval": args.interval,
+        "bars": sum(len(x.rows) for x in engine.series.values()),
+        "replay_load_seconds": round(load_seconds, 3),
+        "process_seconds": round(process_seconds, 3),
+        "ticks_per_second": round(len(received) / process_seconds),
+        "us_per_tick": round(process_seconds / len(received) * 1e6, 2),
+        "changes_ms_per_poll": round(changes_seconds * 1000, 3),
+        "points_per_poll": points,
+    }
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+#
+# Description: Micro-benchmark of AlphaVantage daily series parsing, comparing the
+# per-field parser the analyzer used before netris.ingest with netris.ingest.daily
+# Usage: python benchmarks/bench_parse.py [bars ...]
+
+# Import modules
+import os
+import sys
+import timeit
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from netris import ingest
+from benchmarks import synthetic
+
+def legacy_parse(series):
+    # The per-field parser previously nested in analyzer.main()
+    o_key, h_key, l_key, close_key, adj_close_key, vol_key = "1. open", "2. high", "3. low", "4. close", "5. adjusted close", "6. volume"
+    dates, opn, high, low, close, vol = ([] for i in range(6))
+    for d,v in series.items():
+        dates.append(d)
+        adj = 1
+        if v.get(adj_close_key) and v.get(adj_close_key) != v.get(close_key):
+            adj = float(v.get(adj_close_key)) / float(v.get(close_key))
+        opn.append(float(v.get(o_key)) * adj)
+        high.append(float(v.get(h_key)) * adj)
+        low.append(float(v.get(l_key)) * adj)
+        close.append(float(v.get(close_key)) * adj)
+        vol.append(int(v.get(vol_key)) / adj)
+    return {
+        "date": np.array(dates[::-1], dtype="datetime64[D]"),
+        "open": np.array(opn[::-1]),
+        "high": np.array(high[::-1]),
+        "low": np.array(low[::-1]),
+        "close": np.array(close[::-1]),
+        "volume": np.array(vol[::-1]),
+    }
+
+def per_thousand(func, series, repeat=7):
+    # Return the best time in milliseconds to parse 1,000 bars of <series> with <func>
+    number = max(1, 20000 // len(series))
+    best = min(timeit.repeat(lambda: func(series), number=number, repeat=repeat)) / number
+    return best * 1000 * 1000 / len(series)
+
+def main():
+    sizes = [int(x) for x in sys.argv[1:]] if len(sys.argv) > 1 else [100, 1000, 5000]
+    print(f"{'bars':>6} {'legacy ms/1k':>13} {'ingest ms/1k':>13} {'speedup':>8}")
+    for bars in sizes:
+        series = synthetic.alphavantage(next(iter(synthetic.ohlcv(1, bars).values())))
+        old, new = legacy_parse(series), ingest.daily(series)
+        for k in old:
+            if not np.array_equal(old[k], new[k]):
+                raise SystemExit(f"Parsers disagree on {k} for {bars} bars")
+        t_old, t_new = per_thousand(legacy_parse, series), per_thousand(ingest.daily, series)
+        print(f"{bars:>6} {t_old:>13.3f} {t_new:>13.3f} {t_old / t_new:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
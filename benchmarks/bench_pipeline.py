@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+#
+# Description: Offline benchmark of each stage of the analysis pipeline on deterministic
+# synthetic market data; results are written as JSON so runs can be compared across commits
+# Usage: python benchmarks/bench_pipeline.py [--symbols N] [--bars N] [--output FILE] [--compare FILE]
+
+# Import modules
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.express as px
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from netris import downsample
+from netris import indicators
+from netris import ingest
+from netris import panel
+from netris import resample
+from netris import store
+from benchmarks import synthetic
+
+# Columns of the frames built by analyzer.main().format_data
+FRAME_COLUMNS = [
+    "date", "high", "low", "volume", "value", "lt_trend", "trend_wma", "trend_signal",
+    "macd", "signal", "rsi", "obv", "obv_trend", "obv_signal", "buy_signal"
+]
+
+def timed(func, repeat):
+    # Returns the best wall time in seconds of <repeat> calls to <func>, and the last result
+    best, result = None, None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def build_figure(df, max_points=300):
+    # Builds the "Normal" view figure the way analyzer.main().draw_graphs does
+    idx = downsample.lttb(np.arange(len(df)), df['value'].to_numpy(), max_points)
+    fig = px.line(df.iloc[idx], x='date', y='value')
+    idx = downsample.lttb(np.arange(len(df)), df['buy_signal'].to_numpy(), max_points)
+    fig.add_scatter(x=df['date'].iloc[idx], y=df['buy_signal'].iloc[idx], mode='lines', line_shape='spline')
+    return fig
+
+def git_commit():
+    try:
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=cwd, capture_output=True, text=True).stdout.strip()
+    except Exception:
+        return None
+
+def run(symbols, bars, repeat, figures):
+    # Times every pipeline stage for <symbols> synthetic symbols of <bars> daily bars
+    # Returns a dict of stage name to best seconds
+    data = synthetic.ohlcv(symbols, bars)
+    stages = {}
+    def stage(name, func):
+        stages[name], result = timed(func, repeat)
+        return result
+
+    # Responses are built one symbol at a time so large runs do not hold them all in memory
+    daily, stages["parse"] = {}, 0
+    for k,v in data.items():
+        response = synthetic.alphavantage(v)
+        seconds, daily[k] = timed(lambda: ingest.daily(response), repeat)
+        stages["parse"] += seconds
+    for tf in resample.TIMEFRAMES[1:]:
+        stage(f"resample_{tf}", lambda: {k: resample.resample(v, tf) for k,v in daily.items()})
+    rows = stage("stack", lambda: panel.stack(daily))
+    high, low, volume = rows['high'], rows['low'], rows['volume']
+    value = stage("value", lambda: (high + low) / 2)
+    stage("lt_trend", lambda: indicators.sma(value, 180))
+    stage("trend_wma", lambda: indicators.wma(value, 28))
+    stage("trend_signal", lambda: indicators.ema(value, 14, 14))
+    macd_line, signal_line = stage("macd", lambda: indicators.macd(value))
+    rsi_line = stage("rsi", lambda: indicators.rsi(value))
+    obv_line = stage("obv", lambda: indicators.obv(value, volume))
+    stage("obv_trend", lambda: indicators.wma(obv_line, 28))
+    stage("obv_signal", lambda: indicators.ema(obv_line, 14, 14))
+    stage("buy_signal", lambda: indicators.buy_signal(value, macd_line, signal_line, rsi_line))
+    cols = stage("analyze", lambda: panel.analyze(rows))
+    split = stage("split", lambda: panel.split(rows, cols))
+    results = {k: dict(daily[k], **v) for k,v in split.items()}
+    stage("save_state", lambda: {k: indicators.save_state(v, bars - 1) for k,v in results.items()})
+    with tempfile.TemporaryDirectory() as root:
+        db = store.Store(root)
+        stage("store_write", lambda: [db.write(k, v) for k,v in results.items()])
+        stage("store_read", lambda: {k: {c: np.array(x) for c,x in db.read(k).items()} for k in results})
+    frames = stage("format", lambda: {
+        k: pd.DataFrame({c: v[c][::-1] for c in FRAME_COLUMNS}) for k,v in results.items()
+    })
+    # Only the first <figures> symbols are plotted to keep large runs practical
+    shown = list(frames)[:figures]
+    figs = stage("figure", lambda: [build_figure(frames[k]) for k in shown])
+    stage("figure_json", lambda: [x.to_json() for x in figs])
+    return stages, len(shown)
+
+def report(stages, symbols, bars, figures):
+    # Returns the JSON report for <stages>, with times normalised per symbol and per 1,000 bars
+    results = {}
+    for name, seconds in stages.items():
+        count = figures if name.startswith("figure") else symbols
+        results[name] = {
+            "seconds": round(seconds, 6),
+            "ms_per_symbol": round(seconds * 1000 / count, 6) if count else None,
+            "ms_per_1k_bars": round(seconds * 1000 * 1000 / (count * bars), 6) if count else None,
+        }
+    return {
+        "commit": git_commit(),
+        "config": {"symbols": symbols, "bars": bars, "figures": figures},
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "plotly": plotly.__version__,
+            "machine": platform.machine(),
+        },
+        "stages": results,
+    }
+
+def compare(current, baseline):
+    # Prints the change of every stage against a <baseline> report
+    print(f"{'stage':<18} {'baseline s':>11} {'current s':>11} {'ratio':>7}")
+    for name, result in current['stages'].items():
+        base = baseline.get('stages', {}).get(name)
+        if base is None or not base.get('seconds'):
+            print(f"{name:<18} {'-':>11} {result['seconds']:>11.4f} {'-':>7}")
+            continue
+        ratio = result['seconds'] / base['seconds']
+        print(f"{name:<18} {base['seconds']:>11.4f} {result['seconds']:>11.4f} {ratio:>6.2f}x")
+
+def bounded(low, high):
+    def check(value):
+        value = int(value)
+        if not low <= value <= high:
+            raise argparse.ArgumentTypeError(f"must be between {low} and {high}")
+        return value
+    return check
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic data")
+    parser.add_argument("--symbols", type=bounded(1, 1000), default=10)
+    parser.add_argument("--bars", type=bounded(500, 10000), default=2500)
+    parser.add_argument("--repeat", type=bounded(1, 100), default=3)
+    parser.add_argument("--figures", type=bounded(0, 1000), default=10, help="symbols to build figures for")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    args = parser.parse_args()
+    stages, figures = run(args.symbols, args.bars, args.repeat, args.figures)
+    result = report(stages, args.symbols, args.bars, figures)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(result, file, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+    if args.compare:
+        with open(args.compare) as file:
+            compare(result, json.load(file))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+#
+# Description: Times screening a universe of synthetic symbols stored the way the analyzer
+# stores them, serially and on a process pool, and prints the timings as JSON
+# Usage: python benchmarks/bench_screen.py [--symbols N] [--bars N] [--workers N] [--repeat N] [--dir DIR]
+# Stores are built in a temporary directory unless --dir is given; an existing --dir is reused
+
+# Import modules
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from netris import indicators
+from netris import screener
+from netris import store
+from benchmarks import synthetic
+
+def build(root, symbols, bars):
+    # Stores weekly style bars and indicators for <symbols> synthetic symbols under <root>
+    db = store.Store(root)
+    # Generated in batches to bound memory
+    for start in range(0, symbols, 500):
+        data = synthetic.ohlcv(min(start + 500, symbols), bars, first=start)
+        for symbol, cols in data.items():
+            db.write(symbol, dict(cols, **indicators.analyze(cols['high'], cols['low'], cols['volume'])))
+
+def timed(func, repeat):
+    # Returns the best wall time in seconds of <repeat> calls to <func>, and the last result
+    best, result = None, None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark screening a stored universe")
+    parser.add_argument("--symbols", type=int, default=5000)
+    parser.add_argument("--bars", type=int, default=520)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dir", help="store directory to build or reuse")
+    args = parser.parse_args()
+    tmp = None if args.dir else tempfile.TemporaryDirectory()
+    root = args.dir if args.dir else tmp.name
+    start = time.perf_counter()
+    built = not os.path.isdir(root) or len(os.listdir(root)) < args.symbols
+    if built:
+        build(root, args.symbols, args.bars)
+    build_seconds = time.perf_counter() - start
+    serial = screener.Screener(workers=1)
+    pooled = screener.Screener(workers=args.workers, serial_below=0)
+    # The first pooled screen starts the workers, which the server only pays once
+    start = time.perf_counter()
+    pooled.screen(root, limit=1)
+    startup = time.perf_counter() - start
+    serial_seconds, rows = timed(lambda: serial.screen(root), args.repeat)
+    pooled_seconds, pooled_rows = timed(lambda: pooled.screen(root), args.repeat)
+    pooled.close()
+    result = {
+        "symbols": len(rows),
+        "bars": args.bars,
+        "workers": args.workers,
+        "cpus": os.cpu_count(),
+        "build_seconds": round(build_seconds, 2) if built else None,
+        "pool_startup_seconds": round(startup, 3),
+        "serial_seconds": round(serial_seconds, 3),
+        "pooled_seconds": round(pooled_seconds, 3),
+        "buy_signals": sum(x['buy'] for x in rows),
+        "results_match": rows == pooled_rows,
+    }
+    print(json.dumps(result, indent=2))
+    if tmp:
+        tmp.cleanup()
+
+if __name__ == "__main__":
+    main()
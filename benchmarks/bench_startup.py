@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+#
+# Description: Checks the cold start of analyzer.py against an import time budget using
+# python -X importtime, and that the modules it defers are not imported at startup
+# Usage: python benchmarks/bench_startup.py [--budget-ms N] [--runs N] [--top N]
+# Exits with status 1 when the budget is exceeded or a deferred module is imported eagerly
+
+# Import modules
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Median cumulative import time of analyzer allowed, in milliseconds; 0.6-0.8s was
+# measured when imports were deferred, most of it Dash itself, against 1.2s before
+BUDGET_MS = 1000
+
+# Modules analyzer.py imports where first used rather than at startup
+DEFERRED = ["pandas", "plotly.express", "yfinance", "requests", "netris.fetch"]
+
+def importtime():
+    # Returns a list of (depth, self us, cumulative us, module) for a fresh import of analyzer
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import analyzer"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append(((len(name) - len(name.lstrip())) // 2, int(own), int(cumulative), name.strip()))
+    return rows
+
+def eager(modules):
+    # Returns the modules in <modules> that importing analyzer loads
+    code = f"import sys, analyzer; print([m for m in {modules!r} if m in sys.modules])"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return eval(result.stdout.strip())
+
+def main():
+    parser = argparse.ArgumentParser(description="Check analyzer.py import time against a budget")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="heaviest direct imports to report")
+    args = parser.parse_args()
+    runs = [importtime() for i in range(args.runs)]
+    totals = [next(x[2] for x in rows if x[3] == "analyzer") / 1000 for rows in runs]
+    # Direct imports of analyzer are one level deeper than analyzer itself
+    direct = sorted(
+        ((x[2] / 1000, x[3]) for x in runs[-1] if x[0] == 1),
+        reverse=True
+    )[:args.top]
+    loaded = eager(DEFERRED)
+    result = {
+        "median_ms": round(statistics.median(totals), 1),
+        "runs_ms": [round(x, 1) for x in totals],
+        "budget_ms": args.budget_ms,
+        "heaviest_imports_ms": {name: round(ms, 1) for ms, name in direct},
+        "deferred_imported_eagerly": loaded,
+    }
+    print(json.dumps(result, indent=2))
+    if result['median_ms'] > args.budget_ms or loaded:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
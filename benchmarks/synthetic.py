@@ -0,0 +1,48 @@
+# module for generating deterministic synthetic market data for the benchmarks
+# import third-party modules
+import numpy as np
+
+def symbols(count):
+    # Returns <count> distinct placeholder ticker symbols made of letters, as real tickers are
+    return ["X" + "".join(chr(65 + i // 26 ** p % 26) for p in (2, 1, 0)) for i in range(count)]
+
+def ohlcv(count, bars, seed=0, end="2024-12-31", first=0):
+    # Returns a dict mapping each of <count> symbols to chronological "date", "open", "high",
+    # "low", "close" and "volume" arrays of <bars> business days ending on <end>
+    # The same <count>, <bars> and <seed> always produce the same data; <first> skips
+    # that many leading symbols so large universes can be generated in batches
+    days = np.busday_offset(np.datetime64(end), -np.arange(bars)[::-1], roll="backward")
+    data = {}
+    for i, symbol in list(enumerate(symbols(count)))[first:]:
+        rng = np.random.default_rng([seed, i])
+        close = rng.uniform(10, 500) * np.exp(np.cumsum(rng.normal(0, .015, bars)))
+        opn = close * np.exp(rng.normal(0, .005, bars))
+        spread = np.abs(rng.normal(0, .01, bars))
+        data[symbol] = {
+            "date": days.astype("datetime64[D]"),
+            "open": opn,
+            "high": np.maximum(opn, close) * (1 + spread),
+            "low": np.minimum(opn, close) * (1 - spread),
+            "close": close,
+            "volume": rng.integers(100000, 10000000, bars).astype(float),
+        }
+    return data
+
+def alphavantage(data, split=0.5):
+    # Returns an AlphaVantage style daily series dict, newest first, for the chronological arrays
+    # in <data>; bars in the older half carry an adjusted close scaled by <split>
+    bars = len(data['date'])
+    series = {}
+    for i in range(bars - 1, -1, -1):
+        adj = split if i < bars // 2 else 1
+        series[str(data['date'][i])] = {
+            "1. open": f"{data['open'][i]:.4f}",
+            "2. high": f"{data['high'][i]:.4f}",
+            "3. low": f"{data['low'][i]:.4f}",
+            "4. close": f"{data['close'][i]:.4f}",
+            "5. adjusted close": f"{data['close'][i] * adj:.4f}",
+            "6. volume": str(int(data['volume'][i])),
+            "7. dividend amount": "0.0000",
+            "8. split coefficient": "1.0",
+        }
+    return series
@@ -0,0 +1,24 @@
+# Gunicorn settings for serving wsgi:server in production
+# import third-party modules
+import multiprocessing
+import os
+
+bind = os.environ.get("NETRIS_BIND", "0.0.0.0:8080")
+workers = int(os.environ.get("NETRIS_WORKERS", multiprocessing.cpu_count()))
+# Threads let a worker serve other callbacks while one waits on the data provider
+worker_class = "gthread"
+threads = int(os.environ.get("NETRIS_THREADS", 4))
+# Full history downloads can take a while under the provider's rate limit
+timeout = 120
+# Each worker builds the app after forking so no threads or sessions are shared across a fork
+preload_app = False
+
+def on_starting(server):
+    # Runs once in the master process before any worker starts
+    # Workers size their process pools by the number of workers, including one set on the command line
+    os.environ["NETRIS_WORKERS"] = str(server.cfg.workers)
+    from analyzer import cleanup
+    from netris import fsops
+    data_dir = f"{os.getcwd()}/data"
+    fsops.create_dir(data_dir)
+    cleanup(data_dir)
@@ -0,0 +1,170 @@
+# module for the JSON batch analysis API served alongside the Dash UI
+# Requests are parsed and responses encoded here; the analyzer reads the stored bars
+# import third-party modules
+import hashlib
+import json
+import re
+import zlib
+from datetime import datetime
+from datetime import timezone
+import numpy as np
+
+# Import internal modules
+from netris import indicators
+from netris import resample
+
+# Columns a request may ask for, as the analyzer formats them
+COLUMNS = [
+    "date", "high", "low", "volume", "value", "lt_trend", "trend_wma", "trend_signal",
+    "macd", "signal", "rsi", "obv", "obv_trend", "obv_signal", "buy_signal",
+]
+# Largest batch of symbols one request may ask for
+MAX_SYMBOLS = 500
+# Indicator parameters counted in bars, and the longest window a request may ask for
+WINDOWS = ("n", "span", "fast", "slow", "sig", "dur", "lookback")
+MAX_WINDOW = 1000
+# Streamed responses are sent to the client about this often, in bytes of JSON
+FLUSH_BYTES = 64 * 1024
+
+def parse(params):
+    # Returns a dict of request options from <params>, the JSON body or query arguments of a request:
+    # "symbols" and "indicators" as lists or comma separated strings, "timeframe" (default weekly),
+    # "latest" to only return the newest row, "refresh" to download tickers not current today,
+    # "start", "end" or "weeks" to limit the dates returned, where "weeks" counts the week of the
+    # last bar as the first and takes the place of "start", and indicator parameters (see settings)
+    # Raises ValueError with a message for the client when an option is not valid
+    def listed(name):
+        value = params.get(name)
+        if value is None:
+            return []
+        items = value if type(value) is list else str(value).replace(',', ' ').split()
+        return [str(x).strip() for x in items if str(x).strip()]
+    symbols = list(dict.fromkeys(x.upper() for x in listed("symbols")))
+    if not symbols:
+        raise ValueError("No symbols requested")
+    if len(symbols) > MAX_SYMBOLS:
+        raise ValueError(f"At most {MAX_SYMBOLS} symbols may be requested at once")
+    for symbol in symbols:
+        if not re.search(r'^[A-Z^]{1}[A-Z-=]{0,7}(?<=[A-Z])$', symbol):
+            raise ValueError(f"Invalid characters or length in ticker: {symbol}")
+    timeframe = params.get("timeframe") if params.get("timeframe") else "weekly"
+    if timeframe not in resample.TIMEFRAMES:
+        raise ValueError(f"Unknown timeframe: {timeframe}")
+    columns = listed("indicators")
+    unknown = [x for x in columns if x not in COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown indicator: {', '.join(unknown)}")
+    options = {
+        "symbols": symbols,
+        "timeframe": timeframe,
+        # Dates are always returned first
+        "columns": ["date"] + [x for x in dict.fromkeys(columns) if x != "date"] if columns else COLUMNS,
+        "latest": flag(params.get("latest")),
+        "refresh": flag(params.get("refresh")),
+        "start": None,
+        "end": None,
+        "weeks": None,
+        "params": settings(params),
+    }
+    try:
+        for name in ("start", "end"):
+            if params.get(name):
+                options.update({name: str(np.datetime64(str(params.get(name)), 'D'))})
+        if params.get("weeks"):
+            options.update(weeks=int(params.get("weeks")))
+    except ValueError:
+        raise ValueError("Dates should be YYYY-MM-DD and weeks a whole number")
+    return options
+
+def settings(params):
+    # Returns a dict mapping indicator names to dicts of the parameters <params> sets for them,
+    # given as a "params" object such as {"rsi": {"dur": 10}} or as options named like "rsi.dur"
+    # Parameters are those of indicators.PARAMS and apply to the column they are named for
+    # Raises ValueError with a message for the client when a parameter is not valid
+    given = params.get("params") if type(params.get("params")) is dict else {}
+    given = {k: dict(v) for k,v in given.items() if type(v) is dict}
+    for key in params:
+        if "." in key:
+            name, param = key.split(".", 1)
+            given.setdefault(name, {}).update({param: params.get(key)})
+    out = {}
+    for name, values in given.items():
+        if name not in indicators.PARAMS:
+            raise ValueError(f"Unknown indicator: {name}")
+        for param, value in values.items():
+            if param not in indicators.PARAMS[name]:
+                raise ValueError(f"Unknown parameter of {name}: {param}")
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Parameter {name}.{param} should be a number")
+            if param in WINDOWS and not (value.is_integer() and 1 <= value <= MAX_WINDOW):
+                raise ValueError(f"Parameter {name}.{param} should be a whole number from 1 to {MAX_WINDOW}")
+            out.setdefault(name, {}).update({param: int(value) if param in WINDOWS else value})
+    return out
+
+def flag(value):
+    # Returns whether request option <value> is set, as true, 1, yes or on
+    return value is True or str(value).lower() in ("1", "true", "yes", "on")
+
+def encode(cols, latest=False):
+    # Returns the arrays in <cols> as a JSON object of lists, or of the last value of each
+    # when <latest>; dates become YYYY-MM-DD strings and NaN values become null
+    parts = []
+    for k, v in cols.items():
+        v = v[-1:] if latest else v
+        items = np.datetime_as_string(v, unit='D').tolist() if v.dtype.kind == 'M' else v.tolist()
+        if latest:
+            items = items[0] if items else None
+        # Numeric lists hold no strings, so NaN can be replaced in the encoded text,
+        # which is much faster than replacing it value by value
+        text = json.dumps(items, separators=(",", ":"))
+        parts.append(json.dumps(k) + ":" + (text if v.dtype.kind == 'M' else text.replace("NaN", "null")))
+    return "{" + ",".join(parts) + "}"
+
+def etag(options, stamps):
+    # Returns an entity tag for the response to <options> given <stamps>, a list of
+    # (symbol, version, last bar date, written) tuples of the stored data it is built from
+    key = [options[k] for k in ("timeframe", "columns", "latest", "start", "end", "weeks", "params")] + stamps
+    return hashlib.sha1(json.dumps(key, default=str).encode('utf-8')).hexdigest()
+
+def last_modified(times):
+    # Returns the newest of <times>, the Unix times the stored data was written, as an aware
+    # datetime, or None when there are none or any is unknown, leaving the entity tag to validate
+    # Bar dates cannot stand in for them, since bars of the same date are replaced during the day
+    if not times or None in times:
+        return None
+    return datetime.fromtimestamp(int(max(times)), timezone.utc)
+
+def body(options, results, errors):
+    # Yields the JSON response to <options> a piece at a time: a header, then one member of
+    # "results" for each (symbol, object) pair <results> yields, where object is encode() output,
+    # then the "errors" dict <errors>, which is filled while <results> is consumed
+    yield json.dumps({k: options[k] for k in ("timeframe", "columns", "latest", "params")})[:-1] + ',"results":{'
+    first = True
+    for symbol, encoded in results:
+        yield ("" if first else ",") + json.dumps(symbol) + ":" + encoded
+        first = False
+    yield '},"errors":' + json.dumps(errors) + "}"
+
+def buffered(pieces, size=FLUSH_BYTES):
+    # Yields the str <pieces> joined into bytes chunks of at least <size> bytes, except the last,
+    # so a streamed response is not sent as many tiny chunks
+    parts, pending = [], 0
+    for piece in pieces:
+        parts.append(piece.encode('utf-8'))
+        pending += len(parts[-1])
+        if pending >= size:
+            yield b"".join(parts)
+            parts, pending = [], 0
+    if parts:
+        yield b"".join(parts)
+
+def compressed(chunks, level=1):
+    # Yields the gzip encoding of the bytes <chunks>, flushing after each one
+    # so clients can start decoding a long response before it ends
+    # Encoded floats compress nearly as well at the fastest level as at the default
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
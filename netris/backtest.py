@@ -0,0 +1,322 @@
+# module for backtesting the buy signal rule over many symbols and parameter settings
+# Symbols are tested together as panels (see netris.panel) so every step is an array operation
+# over all bars and symbols; parameter grids reuse the indicators settings have in common
+# import third-party modules
+import itertools
+import os
+import numpy as np
+
+# Import internal modules
+from netris import batch
+from netris import indicators
+from netris import memcache
+from netris import panel
+from netris import store
+
+# Exit rules and their defaults: <hold> bars at most, and optional <stop> loss and <target>
+# gain as fractions of the entry price
+EXITS = {"hold": 10, "stop": None, "target": None}
+
+# Optional filters on the buy signal, off by default: <trend_n> and <trend_span> only take
+# signals while the WMA of that many bars is above the EMA of that span, as the trend view
+# plots them, and <lt_n> while the value is above its SMA of that many bars, the long-term trend
+FILTERS = {"trend_n": None, "trend_span": None, "lt_n": None}
+
+# Summary fields results can be ranked by
+METRICS = ["trades", "hit_rate", "mean_return", "total_return", "max_drawdown", "hold_return"]
+
+def load(root, symbols=None, key=None):
+    # Returns a panel of the bars stored under <root>, a store.Store directory, for <symbols>
+    # (default every stored symbol), or None when none are stored
+    # <key> is the Fernet key of an encrypted store
+    # Symbols are stacked by bar position (see panel.stack), so rows count each symbol's own bars
+    # and a symbol missing a date another has is not left with a gap in its indicators
+    db = store.Store(root, key)
+    series = {}
+    for symbol in symbols if symbols else db.symbols():
+        data = db.read(symbol, ["date", "open", "high", "low", "close", "volume"])
+        if data is not None and len(data['date']) > 0:
+            # Copied so the memory maps, each holding a file open, are closed as it goes
+            series.update({symbol: {k: np.array(v) for k,v in data.items()}})
+    return panel.stack(series) if series else None
+
+class Lines:
+    # Indicator lines of a panel shared by backtests of different settings, each calculated once
+    # Windowed sums come from cumulative sums of their input taken once, so another window
+    # length costs one subtraction instead of a pass over every row of the window
+    def __init__(self, data, max_bytes=512 * 1024 ** 2):
+        # Keeps up to <max_bytes> of the least recently used lines of panel <data>
+        self.data = data
+        self.lines = memcache.LRUCache(max_bytes)
+
+    def get(self, key, func):
+        # Returns the line saved under <key>, calculating it with <func> when it is not kept
+        line = self.lines.get(key)
+        if line is None:
+            line = func()
+            self.lines.set(key, line)
+        return line
+
+    def value(self):
+        return self.get(("value",), lambda: (self.data['high'] + self.data['low']) / 2)
+
+    def sums(self, name, x):
+        # Returns cumulative sums of <x> with NaN as 0, of its NaN count and of <x> times the row
+        # number, each led by a row of zeros so a window's sum is the difference of two rows
+        def calculate():
+            mask = np.isnan(x)
+            vals = np.where(mask, 0., x)
+            zero = np.zeros((1,) + x.shape[1:])
+            rows = np.arange(len(x)).reshape((-1,) + (1,) * (x.ndim - 1))
+            return (
+                np.concatenate((zero, np.cumsum(vals, axis=0))),
+                np.concatenate((zero, np.cumsum(mask, axis=0))),
+                np.concatenate((zero, np.cumsum(vals * rows, axis=0))),
+            )
+        return self.get(("sums", name), calculate)
+
+    def window(self, name, x, n, weighted=False):
+        # Returns the sum of each <n> row window of <x>, weighted 1 to <n> from oldest to newest
+        # when <weighted>; windows that are incomplete or contain NaN values are NaN,
+        # like indicators.rolling_sum()
+        out = np.full(x.shape, np.nan)
+        if n < 1 or len(x) < n:
+            return out
+        cs, cn, ct = self.sums(name, x)
+        sums = cs[n:] - cs[:-n]
+        if weighted:
+            # Row j of the window ending at row i has weight j - (i - n)
+            rows = np.arange(n - 1, len(x)).reshape((-1,) + (1,) * (x.ndim - 1))
+            sums = (ct[n:] - ct[:-n]) - (rows - n) * sums
+        sums[(cn[n:] - cn[:-n]) > 0] = np.nan
+        out[n-1:] = sums
+        return out
+
+    def sma(self, n):
+        return self.get(("sma", n), lambda: self.window("value", self.value(), n) / n)
+
+    def wma(self, n):
+        return self.get(("wma", n), lambda: self.window("value", self.value(), n, True) / (n * (n + 1) / 2))
+
+    def ema(self, span):
+        return self.get(("ema", span), lambda: indicators.ema(self.value(), span, span))
+
+    def macd(self, fast, slow, sig):
+        # Returns the MACD and signal lines, built from the EMAs shared with other settings
+        def calculate():
+            line = self.ema(fast) - self.ema(slow)
+            return line, indicators.ema(line, sig, sig)
+        return self.get(("macd", fast, slow, sig), calculate)
+
+    def rsi(self, dur):
+        # Returns the RSI as indicators.rsi() does, from the rounded gains and losses shared by every duration
+        def changes():
+            delta = np.diff(self.value(), axis=0, prepend=np.nan)
+            return (
+                np.rint(np.round(np.clip(delta, 0, None), 2) * 100),
+                np.rint(np.round(np.abs(np.clip(delta, None, 0)), 2) * 100),
+            )
+        def calculate():
+            up, down = self.get(("changes",), changes)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                rs = self.window("up", up, dur) / self.window("down", down, dur)
+                return 100 - (100 / (1 + rs))
+        return self.get(("rsi", dur), calculate)
+
+def signals(data, lines=None, **params):
+    # Returns a 2-D bool array marking where the buy rule is met for the bars in panel <data>,
+    # with any indicators.PARAMS["buy_signal"] and FILTERS <params> overriding the defaults
+    # <lines> is an optional Lines of <data> to share indicator lines with other calls
+    params = signal_params(params)
+    lines = lines if lines is not None else Lines(data)
+    macd_line, signal_line = lines.macd(params['fast'], params['slow'], params['sig'])
+    buy = indicators.buy_signal(
+        lines.value(), macd_line, signal_line, lines.rsi(params['dur']),
+        params['lookback'], params['rsi_below'], params['gap']
+    ) > 0
+    with np.errstate(invalid='ignore'):
+        if params['trend_n'] and params['trend_span']:
+            buy &= lines.wma(params['trend_n']) > lines.ema(params['trend_span'])
+        if params['lt_n']:
+            buy &= lines.value() > lines.sma(params['lt_n'])
+    return buy
+
+def signal_params(params):
+    # Returns the buy signal and filter parameters in <params> merged over the defaults
+    defaults = dict(indicators.PARAMS['buy_signal'], **FILTERS)
+    return dict(defaults, **{k: v for k,v in params.items() if k in defaults})
+
+def entries(data, buy, delay=indicators.LOOKBACK):
+    # Returns a tuple of arrays (rows, cols) locating an entry for each run of consecutive <buy>
+    # rows of panel <data>; the rule looks <delay> rows ahead of the row it marks, so entries
+    # are taken <delay> rows after the first row of each run, when the signal is confirmed
+    first = buy & ~np.concatenate((np.zeros((1,) + buy.shape[1:], dtype=bool), buy[:-1]))
+    rows, cols = np.nonzero(first)
+    rows = rows + delay
+    keep = rows < len(buy)
+    rows, cols = rows[keep], cols[keep]
+    keep = ~np.isnan(data['close'][rows, cols])
+    return rows[keep], cols[keep]
+
+def trades(data, rows, cols, **kwargs):
+    # Simulates a trade entered at the close of each of the <rows> and <cols> of panel <data>
+    # Trades exit by the first of the EXITS rules in <kwargs>; a bar reaching both the stop and
+    # the target counts as a stop, and trades still open at a symbol's last bar are left out
+    # Returns a dict of 1-D arrays, one value per trade: "symbol" (column of <data>),
+    # "entry" and "exit" rows, and "return" as a fraction of the entry price
+    exits = dict(EXITS, **{k: v for k,v in kwargs.items() if k in EXITS})
+    hold, stop, target = exits['hold'], exits['stop'], exits['target']
+    close, high, low = data['close'], data['high'], data['low']
+    n = len(close)
+    entry = close[rows, cols]
+    # One row per trade holding the <hold> bars following the entry
+    steps = rows[:, None] + np.arange(1, hold + 1)
+    inside = steps < n
+    steps = np.minimum(steps, n - 1)
+    path = close[steps, cols[:, None]]
+    valid = inside & ~np.isnan(path)
+    never = hold + 1
+    stop_at = np.full(len(rows), never)
+    target_at = np.full(len(rows), never)
+    if stop:
+        hit = valid & (low[steps, cols[:, None]] <= entry[:, None] * (1 - stop))
+        stop_at = np.where(hit.any(axis=1), hit.argmax(axis=1), never)
+    if target:
+        hit = valid & (high[steps, cols[:, None]] >= entry[:, None] * (1 + target))
+        target_at = np.where(hit.any(axis=1), hit.argmax(axis=1), never)
+    # Without a stop or target the trade is closed at its last bar, once it has been held that long
+    last = np.where(valid[:, ::-1].any(axis=1), hold - 1 - valid[:, ::-1].argmax(axis=1), -1)
+    final = n - 1 - data['present'][::-1].argmax(axis=0)
+    closed = (stop_at < never) | (target_at < never) | (rows + hold <= final[cols])
+    end = np.minimum(np.minimum(stop_at, target_at), last)
+    ret = np.where(
+        stop_at <= np.minimum(target_at, last), -(stop or 0),
+        np.where(target_at <= last, target or 0, path[np.arange(len(rows)), np.maximum(end, 0)] / entry - 1)
+    )
+    keep = closed & (last >= 0)
+    return {
+        "symbol": cols[keep],
+        "entry": rows[keep],
+        "exit": steps[np.arange(len(rows)), np.maximum(end, 0)][keep],
+        "return": ret[keep],
+    }
+
+def statistics(data, result):
+    # Returns a dict of arrays holding the METRICS of each symbol of panel <data> for the trades
+    # in <result>, and the "returns" of every trade; rates and returns are NaN for symbols without trades
+    # Drawdown is measured on the equity of compounding each symbol's trades in entry order
+    count = len(data['symbols'])
+    order = np.lexsort((result['entry'], result['symbol']))
+    sym, ret = result['symbol'][order], result['return'][order]
+    trades_per = np.bincount(sym, minlength=count)
+    logs = np.log1p(ret)
+    # Running peaks of every symbol's equity in one pass: symbols are contiguous after sorting,
+    # and each is offset above the previous ones so peaks do not carry across symbols
+    running = np.concatenate(([0.], np.cumsum(logs)))
+    starts = np.concatenate(([0], np.cumsum(trades_per)[:-1]))
+    equity = running[1:] - np.repeat(running[starts], trades_per)
+    offset = np.repeat(np.arange(count) * (2 * np.abs(equity).max(initial=0) + 1), trades_per)
+    peaks = np.maximum(np.maximum.accumulate(equity + offset) - offset, 0)
+    drawdowns = np.zeros(count)
+    np.maximum.at(drawdowns, sym, -np.expm1(equity - peaks))
+    # Buy and hold over each symbol's bars for comparison
+    close, present = data['close'], data['present']
+    first = close[present.argmax(axis=0), np.arange(count)]
+    last = close[len(close) - 1 - present[::-1].argmax(axis=0), np.arange(count)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            "trades": trades_per,
+            "hit_rate": np.bincount(sym, weights=ret > 0, minlength=count) / trades_per,
+            "mean_return": np.bincount(sym, weights=ret, minlength=count) / trades_per,
+            "total_return": np.where(trades_per > 0, np.expm1(np.bincount(sym, weights=logs, minlength=count)), np.nan),
+            "max_drawdown": np.where(trades_per > 0, drawdowns, np.nan),
+            "hold_return": last / first - 1,
+            "returns": ret,
+        }
+
+def summarize(data, result, detail=True):
+    # Returns a tuple of (summary, per symbol) statistics of the trades in <result> on panel <data>
+    # Per symbol statistics are None unless <detail> is True
+    stats = statistics(data, result)
+    per_symbol = None if not detail else {
+        symbol: {k: batch.number(stats[k][j]) for k in METRICS}
+        for j, symbol in enumerate(data['symbols'])
+    }
+    return overall(stats), per_symbol
+
+def overall(stats):
+    # Returns the summary over all symbols of statistics() output <stats>
+    ret = stats['returns']
+    tested = stats['trades'] > 0
+    holds = stats['hold_return']
+    return {
+        "symbols": len(stats['trades']),
+        "trades": int(len(ret)),
+        "hit_rate": float((ret > 0).mean()) if len(ret) else None,
+        "mean_return": float(ret.mean()) if len(ret) else None,
+        "total_return": float(stats['total_return'][tested].mean()) if tested.any() else None,
+        "max_drawdown": float(stats['max_drawdown'][tested].mean()) if tested.any() else None,
+        "hold_return": float(np.nanmean(holds)) if (~np.isnan(holds)).any() else None,
+    }
+
+def run(data, lines=None, detail=True, **params):
+    # Backtests the buy rule on panel <data> with any buy signal, FILTERS and EXITS <params>
+    # <lines> is an optional Lines of <data> keeping intermediate results between runs
+    # Returns a dict of "params", the "summary" over all symbols and "symbols" statistics,
+    # which are None unless <detail> is True
+    summary, per_symbol = summarize(data, simulate(data, lines, **params), detail)
+    return {"params": params, "summary": summary, "symbols": per_symbol}
+
+def simulate(data, lines=None, **params):
+    # Returns the trades() of the buy rule on panel <data> with <params>, as run() does
+    lines = lines if lines is not None else Lines(data)
+    settings = signal_params(params)
+    located = lines.get(("entries",) + tuple(sorted(settings.items())), lambda: entries(
+        data, signals(data, lines, **settings), settings['lookback']
+    ))
+    return trades(data, *located, **params)
+
+def grid(**ranges):
+    # Returns a list of parameter dicts for every combination of the values listed in <ranges>,
+    # such as grid(rsi_below=[40, 50], hold=[5, 10])
+    keys = list(ranges)
+    return [dict(zip(keys, x)) for x in itertools.product(*(ranges[k] for k in keys))]
+
+def evaluate(data, combos):
+    # Backtests each parameter dict in <combos> on panel <data>, calculating the indicators
+    # shared by several combinations once; returns a list of (params, summary) tuples
+    lines = Lines(data)
+    results = []
+    for params in combos:
+        result = run(data, lines, False, **params)
+        results.append((params, result['summary']))
+    return results
+
+def sweep(data, combos, **kwargs):
+    # Backtests every parameter dict in <combos> on panel <data>
+    # Accepts optional keyword arguments <workers> (default 1) to spread the combinations over
+    # a process pool of that many processes, or <executor>, an existing concurrent.futures executor
+    # to use instead with the combinations split for <workers> (default the number of CPUs),
+    # and <sort>, a METRICS field to rank by, descending when prefixed with "-" (default "-mean_return")
+    # Returns a list of (params, summary) tuples, best first
+    sort = kwargs.get('sort') if kwargs.get('sort') else "-mean_return"
+    key = sort.lstrip("-")
+    if key not in METRICS:
+        raise ValueError(f"Unknown metric: {key}")
+    # Combinations sharing signal settings go to the same worker so they share the signals and lines
+    combos = sorted(combos, key=lambda x: tuple(str(v) for v in signal_params(x).values()))
+    executor = kwargs.get('executor')
+    workers = kwargs.get('workers') if kwargs.get('workers') else (os.cpu_count() or 1) if executor else 1
+    if executor is None and (workers < 2 or len(combos) < 2):
+        results = evaluate(data, combos)
+    else:
+        pool = executor if executor else batch.process_pool(workers)
+        try:
+            # Some settings trade more often than others, so each worker takes a few chunks
+            chunks = batch.chunks(combos, workers)
+            results = [x for part in pool.map(evaluate, [data] * len(chunks), chunks) for x in part]
+        finally:
+            if executor is None:
+                pool.shutdown()
+    # Settings without trades go last in either direction
+    return batch.ordered(results, lambda x: x[1][key], sort.startswith("-"))
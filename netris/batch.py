@@ -0,0 +1,33 @@
+# module for spreading batches of work over process pools and ordering their results
+# import third-party modules
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+def process_pool(workers):
+    # Returns a process pool of <workers> processes; forkserver avoids forking
+    # a process that is running server threads
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+def chunks(items, workers):
+    # Returns list <items> split into consecutive chunks, a few per worker of <workers>, which
+    # keeps them all busy when some items take longer than others
+    size = max(1, math.ceil(len(items) / (workers * 4)))
+    return [items[i:i+size] for i in range(0, len(items), size)]
+
+def ordered(rows, value, descending=False):
+    # Returns <rows> sorted by callable <value>, which returns the value of a row or None;
+    # rows without a value go last in either direction
+    present = [x for x in rows if value(x) is not None]
+    absent = [x for x in rows if value(x) is None]
+    return sorted(present, key=value, reverse=descending) + absent
+
+def number(x):
+    # Returns NumPy scalar <x> as an int or float for serializing, or None when it is NaN,
+    # such as before an indicator's first value
+    if isinstance(x, np.integer):
+        return int(x)
+    return None if np.isnan(x) else float(x)
@@ -0,0 +1,28 @@
+# module for reducing the number of points in a series for plotting
+# import third-party modules
+import numpy as np
+
+def lttb(x, y, n):
+    # Selects <n> points of the series (<x>, <y>) using Largest-Triangle-Three-Buckets;
+    # the first and last points are always kept and each bucket in between contributes
+    # the point forming the largest triangle with its neighbours
+    # Returns an array of the selected indices in ascending order
+    length = len(x)
+    if n >= length or n < 3:
+        return np.arange(length)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, length - 1, n - 1).astype(int)
+    edges = np.append(edges, length)
+    idx = np.empty(n, dtype=int)
+    idx[0], idx[-1] = 0, length - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi, nhi = edges[i], edges[i+1], edges[i+2]
+        avg_x = x[hi:nhi].mean()
+        avg_y = y[hi:nhi][~np.isnan(y[hi:nhi])].mean() if (~np.isnan(y[hi:nhi])).any() else y[a]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        # Points without a value are only picked when the whole bucket is empty
+        a = lo + int(np.argmax(np.where(np.isnan(area), -1., area)))
+        idx[i+1] = a
+    return idx
@@ -0,0 +1,95 @@
+# module for concurrent HTTP requests
+# import third-party modules
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+# Import internal modules
+from netris import metrics
+
+FETCH_SECONDS = metrics.REGISTRY.histogram("netris_fetch_seconds", "Latency of HTTP requests to data providers", ("outcome",))
+FETCH_RETRIES = metrics.REGISTRY.counter("netris_fetch_retries_total", "HTTP requests to data providers that were retried")
+
+class RateLimiter:
+    def __init__(self, rate, per=1.0):
+        # Token bucket allowing up to <rate> calls every <per> seconds, shared by all threads
+        self.rate = rate
+        self.per = per
+        self.allowance = rate
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        # Blocks the calling thread until a call is allowed
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate / self.per)
+                self.last = now
+                if self.allowance >= 1:
+                    self.allowance -= 1
+                    return
+                delay = (1 - self.allowance) * self.per / self.rate
+            time.sleep(delay)
+
+class Fetcher:
+    def __init__(self, **kwargs):
+        # Accepts optional keyword arguments:
+        # <workers> maximum concurrent requests, <timeout> seconds per request,
+        # <retries> and <backoff> for retrying failed requests, <rate> and <per> for rate limiting
+        self.workers = kwargs.get('workers') if kwargs.get('workers') else 8
+        self.timeout = kwargs.get('timeout') if kwargs.get('timeout') else 10
+        self.retries = kwargs.get('retries') if kwargs.get('retries') is not None else 3
+        self.backoff = kwargs.get('backoff') if kwargs.get('backoff') is not None else 0.5
+        self.limiter = RateLimiter(kwargs.get('rate'), kwargs.get('per') if kwargs.get('per') else 1.0) if kwargs.get('rate') else None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url, params=None):
+        # Sends a GET request to <url>, retrying connection errors, timeouts,
+        # HTTP 429 and 5xx responses with exponential backoff
+        # Returns the decoded JSON response body; raises the last error when retries are exhausted
+        for attempt in range(self.retries + 1):
+            if self.limiter:
+                self.limiter.wait()
+            start = time.perf_counter()
+            try:
+                resp = self.session.get(url, params=params, timeout=self.timeout)
+                FETCH_SECONDS.observe(time.perf_counter() - start, outcome=resp.status_code)
+                resp.raise_for_status()
+                return resp.json()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                FETCH_SECONDS.observe(time.perf_counter() - start, outcome=type(e).__name__)
+                error = e
+            except requests.HTTPError as e:
+                if e.response.status_code != 429 and e.response.status_code < 500:
+                    raise
+                error = e
+            if attempt < self.retries:
+                FETCH_RETRIES.inc()
+                time.sleep(self.backoff * 2 ** attempt)
+        raise error
+
+    def get_many(self, reqs):
+        # <reqs> should be a dict mapping a name to a tuple of (url, params)
+        # Requests are sent concurrently, up to <workers> at a time
+        # Returns a tuple of dicts (results, errors) keyed by name; a failed request
+        # does not prevent the others from returning results
+        results, errors = {}, {}
+        if not reqs:
+            return results, errors
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(reqs))) as pool:
+            futures = {k: pool.submit(self.get, *v) for k,v in reqs.items()}
+            for k,v in futures.items():
+                try:
+                    results.update({k: v.result()})
+                except Exception as e:
+                    errors.update({k: e})
+        return results, errors
+
+    def close(self):
+        self.session.close()
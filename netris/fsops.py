@@ -1,11 +1,32 @@
 # module for file operations
 # import third-party modules
 import os
+import io
 import json
 import csv
+import struct
+import threading
 import yaml
+from contextlib import contextmanager, nullcontext
+try:
+    import fcntl
+except ImportError:
+    # Advisory locks are not available on Windows; locking becomes a no-op
+    fcntl = None
 from cryptography.fernet import Fernet
 
+# Encrypted files are written as a header line followed by one Fernet token per line, each
+# holding a chunk of up to CHUNK_SIZE bytes, so a file is never encrypted or decrypted as one
+# token; each chunk starts with its index and a last chunk flag so truncated or reordered files
+# are detected. Files written as a single token before chunking are still read
+CHUNK_SIZE = 1024 ** 2
+CHUNKED = b"netris-fernet-chunks-1\n"
+CHUNK_HEADER = struct.Struct(">QB")
+
+# Fernet keys already loaded, keyed by key file path and validated against its modification time
+KEYS = {}
+KEYS_LOCK = threading.Lock()
+
 class NoAliasDumper(yaml.SafeDumper):
     def ignore_aliases(self, data):
         return True
@@ -31,108 +52,180 @@ def list_dir(dir):
 def get_key(key_file):
     # Attempts to load encryption key from <key_file>;
     # If <key_file> fails to load, a new key is generated and saved
+    # The key file is locked meanwhile so concurrent callers cannot each save a different key
+    # Keys are kept in process and only read again when <key_file> changes
     # Returns a Fernet encryption key object
-    key = read_file(key_file, type="key")
-    if key is None:
-        key = Fernet.generate_key()
-        write_file(key, key_file, type="key")
-    return Fernet(key)
+    path = os.path.abspath(key_file)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    with KEYS_LOCK:
+        cached = KEYS.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with locked(f"{key_file}.lock"):
+        key = read_file(key_file, type="key", silent=True)
+        if key is None:
+            key = Fernet.generate_key()
+            write_file(key, key_file, type="key")
+        fernet = Fernet(key)
+        with KEYS_LOCK:
+            KEYS[path] = (os.stat(path).st_mtime_ns if os.path.exists(path) else None, fernet)
+    return fernet
+
+def forget_keys():
+    # Clears the keys kept by get_key
+    with KEYS_LOCK:
+        KEYS.clear()
 
 def read_file(file, **kwargs):
     # Returns the contents of <file> as follows:
     # For CSV Files, the contents are returned as multi-dimensional list (list type with list type elements)
     # For JSON Files, the contents are deserialized and returned as the data type stored in the file
     # For YAML Files, the contents are deserialized and returned as a dict type
+    # For key and bytes files, the contents are returned as bytes type
     # For all other files, the contents are returned as str type
     # Accepts optional str keyword argument <type>, and optional encryption key keyword argument <key>
-    # Returns file contents as either str, list, or dict type when success
+    # Accepts optional bool keyword arguments <lock> to hold a shared lock on "<file>.lock" while
+    # reading (see write_file), and <silent> to return None instead of raising when reading fails
+    # Returns file contents as either str, bytes, list, or dict type when success
+    # Raises FileNotFoundError if <file> does not exist, ValueError if it is empty, or the
+    # error from reading or decoding it, unless <silent>
     try:
-        if os.path.exists(file):
-            read_mode = "rb" if kwargs.get('type') == "key" or kwargs.get('key') else "r"
-            if kwargs.get('type') == "csv":
-                with open(file, read_mode, newline="") as csv_file:
-                    if kwargs.get('key'):
-                        decrypted = kwargs.get('key').decrypt(csv_file.read())
-                        content = list(csv.reader(decrypted.decode('utf-8').splitlines(), delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL))
-                    else:
-                        content = list(csv.reader(csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL))
-            elif kwargs.get('type') == "json":
-                with open(file, read_mode) as json_file:
-                    if kwargs.get('key'):
-                        decrypted = kwargs.get('key').decrypt(json_file.read())
-                        content = json.loads(decrypted.decode('utf-8').replace("'", "\""))
-                    else:
-                        content = json.load(json_file)
-            elif kwargs.get('type') == "yaml":
-                with open(file, read_mode) as yaml_file:
-                    if kwargs.get('key'):
-                        decrypted = kwargs.get('key').decrypt(yaml_file.read())
-                        content = yaml.safe_load(decrypted.decode('utf-8'))
-                    else:
-                        content = yaml.safe_load(yaml_file)
-            else:
-                with open(file, read_mode) as other_file:
-                    if kwargs.get('key'):
-                        decrypted = kwargs.get('key').decrypt(other_file.read())
-                        content = decrypted.decode('utf-8')
-                    else:
-                        content = other_file.read()
-            if len(content) < 1: 
-                raise Exception(f"{file} is empty")
+        with locked(f"{file}.lock", shared=True) if kwargs.get('lock') else nullcontext():
+            binary = kwargs.get('type') in ("key", "bytes") or kwargs.get('key')
+            with open(file, "rb") if binary else open(file, "r", newline="" if kwargs.get('type') == "csv" else None) as in_file:
+                raw = decrypt_file(in_file, kwargs.get('key')) if kwargs.get('key') else in_file.read()
+        if len(raw) < 1:
+            raise ValueError(f"{file} is empty")
+        if kwargs.get('key') and kwargs.get('type') != "bytes":
+            raw = raw.decode('utf-8')
+        if kwargs.get('type') == "csv":
+            content = list(csv.reader(raw.splitlines(), delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL))
+        elif kwargs.get('type') == "json":
+            try:
+                content = json.loads(raw)
+            except json.JSONDecodeError:
+                if not kwargs.get('key'):
+                    raise
+                # Early encrypted JSON files were written as Python literals with single quotes
+                content = json.loads(raw.replace("'", "\""))
+        elif kwargs.get('type') == "yaml":
+            content = yaml.safe_load(raw)
         else:
-            raise Exception(f"{file} does not exist")
-    except Exception as e:      
-        return e
-    else:
-        return content
-    
+            content = raw
+        if len(content) < 1:
+            raise ValueError(f"{file} is empty")
+    except Exception:
+        if kwargs.get('silent'):
+            return None
+        raise
+    return content
+
 def write_file(data, file, **kwargs):
     # <data> should be str, list, or dict type, depending on file type as follows:
     # For CSV files, <data> should be multi-dimensional list type (list type with list type elements).
     # For JSON files, <data> can be dict or list type
     # For YAML files, <data> should be dict type
+    # For key and bytes files, <data> should be bytes type
     # For all other files, <data> can be any type, but typically list or str type.
     # Accepts optional str keyword argument <type>, and optional encryption key keyword argument <key>
+    # Accepts optional int keyword argument <indent> to indent JSON, which is written compactly
+    # by default, and optional bool keyword arguments <lock> to hold an exclusive lock on
+    # "<file>.lock" while writing, and <sync> to flush the contents to disk before they replace <file>
+    # The contents are written to a temporary file beside <file> and renamed over it, so readers
+    # see the old or the new contents but never a partial write, and concurrent writers do not
+    # interleave; <lock> is only needed to order writers or to pair reads and writes
     # Returns True when successful
     try:
-        write_mode = "wb" if kwargs.get('type') == "key" or kwargs.get('key') else "w"
-        if kwargs.get('type') == "csv":
-            with open(file, write_mode, newline="") as csv_file:
-                if kwargs.get('key'):
-                    encrypted = "\n".join([",".join(x) for x in data])
-                    csv_file.write(kwargs.get('key').encrypt(encrypted.encode('utf-8')))
-                else:
-                    writer = csv.writer(csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-                    writer.writerows(data)
-        elif kwargs.get('type') == "json":
-            with open(file, write_mode) as json_file:
-                if kwargs.get('key'):
-                    #json_file.write(kwargs.get('key').encrypt(str(data).encode('utf-8')))
-                    json_file.write(kwargs.get('key').encrypt(json.dumps(data).encode('utf-8')))
-                else:
-                    json.dump(data, json_file, indent=2)
-        elif kwargs.get('type') == "yaml":
-            with open(file, write_mode) as yaml_file:
-                if kwargs.get('key'):
-                    yaml_file.write(kwargs.get('key').encrypt(yaml.dump(data, Dumper=NoAliasDumper).encode('utf-8')))
-                else:
-                    yaml.dump(data, yaml_file, Dumper=NoAliasDumper)
-        else:
-            with open(file, write_mode) as other_file:
-                if type(data) is list:
-                    if kwargs.get('key'):
-                        other_file.write(kwargs.get('key').encrypt('\n'.join(data).encode('utf-8')))
-                    else:
-                        other_file.write('\n'.join(data))
-                else:
-                    if kwargs.get('key'):
-                        other_file.write(kwargs.get('key').encrypt(str(data).encode('utf-8')))
-                    else:
-                        other_file.write(data)
-    except:
+        content = serialize(data, **kwargs)
+        with locked(f"{file}.lock") if kwargs.get('lock') else nullcontext():
+            replace_file(content, file, key=kwargs.get('key'), sync=kwargs.get('sync'))
+    except Exception:
         return False
     else:
-        return True    
+        return True
+
+def serialize(data, **kwargs):
+    # Returns <data> as the str or bytes write_file saves for the <type> and <key> keyword arguments,
+    # before any encryption
+    key = kwargs.get('key')
+    if kwargs.get('type') in ("key", "bytes"):
+        return data
+    if kwargs.get('type') == "csv":
+        if key:
+            return "\n".join([",".join(x) for x in data])
+        content = io.StringIO()
+        csv.writer(content, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL).writerows(data)
+        return content.getvalue()
+    if kwargs.get('type') == "json":
+        indent = kwargs.get('indent')
+        return json.dumps(data, indent=indent, separators=None if indent else (",", ":"))
+    if kwargs.get('type') == "yaml":
+        return yaml.dump(data, Dumper=NoAliasDumper)
+    content = "\n".join(data) if type(data) is list else data
+    return str(content) if key else content
+
+def encrypt_chunks(content, key, chunk_size=CHUNK_SIZE):
+    # Yields the lines of the chunked encrypted form of <content>, a str or bytes, with Fernet <key>
+    content = memoryview(content.encode('utf-8') if type(content) is str else content)
+    yield CHUNKED
+    count = max(1, -(-len(content) // chunk_size))
+    for i in range(count):
+        chunk = content[i * chunk_size:(i + 1) * chunk_size]
+        yield key.encrypt(CHUNK_HEADER.pack(i, i == count - 1) + chunk) + b"\n"
+
+def decrypt_file(in_file, key):
+    # Returns the decrypted bytes of the encrypted file open for binary reading as <in_file>,
+    # one chunk at a time; raises ValueError for a truncated or reordered file and
+    # cryptography.fernet.InvalidToken for a chunk that was altered or encrypted with another key
+    first = in_file.readline()
+    if first != CHUNKED:
+        return key.decrypt(first + in_file.read())
+    parts = []
+    last = False
+    for i, line in enumerate(in_file):
+        if last:
+            raise ValueError("Encrypted file continues after its last chunk")
+        chunk = key.decrypt(line.rstrip(b"\n"))
+        index, last = CHUNK_HEADER.unpack_from(chunk)
+        if index != i:
+            raise ValueError("Encrypted file chunks are out of order")
+        parts.append(memoryview(chunk)[CHUNK_HEADER.size:])
+    if not last:
+        raise ValueError("Encrypted file is truncated")
+    return b"".join(parts)
+
+@contextmanager
+def replacing(file, mode="wb", **kwargs):
+    # Context manager yielding a temporary file beside <file>, unique to this process and thread
+    # and open with <mode>, that is renamed over <file> when the block completes, so readers see
+    # the old or the new contents but never a partial write; it is removed if the block raises
+    # Accepts optional bool keyword argument <sync> to flush the contents to disk before the rename
+    tmp = f"{file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, mode) if "b" in mode else open(tmp, mode, newline="") as out_file:
+            yield out_file
+            if kwargs.get('sync'):
+                out_file.flush()
+                os.fsync(out_file.fileno())
+        os.replace(tmp, file)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def replace_file(content, file, **kwargs):
+    # Atomically replaces <file> with <content>, a str or bytes, through a replacing() temporary file
+    # Accepts optional keyword arguments <key>, a Fernet key to encrypt <content> with a chunk
+    # at a time, and bool <sync> to flush the contents to disk before the rename
+    binary = kwargs.get('key') or type(content) is bytes
+    with replacing(file, "wb" if binary else "w", sync=kwargs.get('sync')) as out_file:
+        if kwargs.get('key'):
+            out_file.writelines(encrypt_chunks(content, kwargs.get('key')))
+        else:
+            out_file.write(content)
 
 def remove_file(file):
     # <file> should be the full path to a file as a str type
@@ -141,4 +234,36 @@ def remove_file(file):
     except:
         return False
     else:
-        return True
\ No newline at end of file
+        return True
+
+def lock_file(file, **kwargs):
+    # Takes an advisory lock on <file>, creating it if it does not exist
+    # Locks are held per open file, so they exclude other threads as well as other processes
+    # Accepts optional bool keyword arguments <shared> for a shared lock instead of an
+    # exclusive one, and <blocking> (default True) to wait for the lock
+    # Returns the open file holding the lock, or None when not blocking and the lock is held elsewhere
+    handle = open(file, "a+")
+    if fcntl:
+        flags = fcntl.LOCK_SH if kwargs.get('shared') else fcntl.LOCK_EX
+        try:
+            fcntl.flock(handle, flags if kwargs.get('blocking', True) else flags | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return None
+    return handle
+
+def unlock_file(handle):
+    # Releases a lock taken with lock_file
+    if fcntl:
+        fcntl.flock(handle, fcntl.LOCK_UN)
+    handle.close()
+
+@contextmanager
+def locked(file, **kwargs):
+    # Context manager holding a lock_file lock on <file> for the duration of the block,
+    # waiting for it if needed; accepts optional bool keyword argument <shared>
+    handle = lock_file(file, shared=kwargs.get('shared'))
+    try:
+        yield handle
+    finally:
+        unlock_file(handle)
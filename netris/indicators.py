@@ -0,0 +1,222 @@
+# module for calculating technical indicators
+# All functions accept and return NumPy arrays in chronological order (oldest first);
+# 2-D arrays are calculated column by column, with one column per symbol
+# import third-party modules
+import numpy as np
+
+# Number of rows before the resume point that advance() needs to continue a calculation
+TAIL = 180
+# Number of rows averaged by the buy signal rule
+LOOKBACK = 7
+# Parameters of each analyzer column and the defaults analyze() uses
+PARAMS = {
+    "lt_trend": {"n": 180},
+    "trend_wma": {"n": 28},
+    "trend_signal": {"span": 14},
+    "macd": {"fast": 12, "slow": 26, "sig": 9},
+    "signal": {"fast": 12, "slow": 26, "sig": 9},
+    "rsi": {"dur": 14},
+    "obv": {},
+    "obv_trend": {"n": 28},
+    "obv_signal": {"span": 14},
+    "buy_signal": {"fast": 12, "slow": 26, "sig": 9, "dur": 14, "lookback": LOOKBACK, "rsi_below": 50, "gap": 1},
+}
+
+def rolling_sum(x, n):
+    # Returns the sum of each <n> length window of <x>, calculated from cumulative sums
+    # Windows that are incomplete or contain NaN values are returned as NaN
+    x = np.asarray(x, dtype=float)
+    out = np.full(x.shape, np.nan)
+    if n < 1 or len(x) < n:
+        return out
+    mask = np.isnan(x)
+    zero = np.zeros((1,) + x.shape[1:])
+    cs = np.concatenate((zero, np.cumsum(np.where(mask, 0., x), axis=0)))
+    cn = np.concatenate((zero, np.cumsum(mask, axis=0)))
+    sums = cs[n:] - cs[:-n]
+    sums[(cn[n:] - cn[:-n]) > 0] = np.nan
+    out[n-1:] = sums
+    return out
+
+def sma(x, n):
+    # Returns the simple moving average of <x> over <n> periods
+    return rolling_sum(x, n) / n
+
+def wma(x, n):
+    # Returns the linearly weighted moving average of <x> over <n> periods;
+    # the most recent value in each window has weight <n>, the oldest has weight 1
+    x = np.asarray(x, dtype=float)
+    out = np.full(x.shape, np.nan)
+    if n < 1 or len(x) < n:
+        return out
+    total = np.zeros(x[n-1:].shape)
+    for k in range(n):
+        total += (k + 1) * x[k:len(x)-n+1+k]
+    out[n-1:] = total / (n * (n + 1) / 2)
+    return out
+
+def ewm_sums(x, span, state=None):
+    # Returns the running weighted sums and observation counts of an exponentially weighted
+    # mean of <x> as a tuple of arrays (num, den, nobs), continuing from <state> when given
+    # The recurrence is solved in blocks with cumulative sums of rescaled values; blocks are
+    # kept short enough that the rescaling factors stay below 1e8
+    x = np.asarray(x, dtype=float)
+    mask = ~np.isnan(x)
+    vals = np.where(mask, x, 0.)
+    obs = mask.astype(float)
+    nobs = np.cumsum(mask, axis=0) + (state[2] if state else 0)
+    beta = 1 - 2 / (span + 1)
+    if beta <= 0:
+        return vals, obs, nobs
+    num, den = np.empty(x.shape), np.empty(x.shape)
+    prev_num, prev_den = (state[0], state[1]) if state else (0., 0.)
+    block = max(1, int(8 / -np.log10(beta)))
+    for start in range(0, len(x), block):
+        end = min(start + block, len(x))
+        k = np.arange(end - start).reshape((-1,) + (1,) * (x.ndim - 1))
+        grow, decay = beta ** -k, beta ** k
+        num[start:end] = decay * (beta * prev_num + np.cumsum(vals[start:end] * grow, axis=0))
+        den[start:end] = decay * (beta * prev_den + np.cumsum(obs[start:end] * grow, axis=0))
+        prev_num, prev_den = num[end-1], den[end-1]
+    return num, den, nobs
+
+def ema(x, span, min_periods=0, state=None):
+    # Returns the exponentially weighted mean of <x>, equivalent to
+    # Pandas ewm(span=<span>, min_periods=<min_periods>).mean()
+    # <state> is an optional list returned by ema_state() to continue a previous calculation
+    x = np.asarray(x, dtype=float)
+    if len(x) < 1:
+        return np.full(x.shape, np.nan)
+    num, den, nobs = ewm_sums(x, span, state)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = num / den
+    out[nobs < max(min_periods, 1)] = np.nan
+    return out
+
+def ema_state(x, span, state=None):
+    # Returns the weighted sums and observation count of an exponentially weighted mean
+    # after the last value of <x>, as a list to continue the calculation with ema()
+    if len(x) < 1:
+        return state if state else [0., 0., 0]
+    num, den, nobs = ewm_sums(x, span, state)
+    return [float(num[-1]), float(den[-1]), int(nobs[-1])]
+
+def macd(x, fast=12, slow=26, sig=9):
+    # Returns MACD line and signal line as a tuple of arrays
+    line = ema(x, fast, fast) - ema(x, slow, slow)
+    return line, ema(line, sig, sig)
+
+def rsi(x, dur=14):
+    # Returns Relative Strength Index of <x> using simple moving averages over <dur> periods
+    # Gains and losses are rounded to cents and summed as whole numbers so equal averages stay exact
+    delta = np.diff(np.asarray(x, dtype=float), axis=0, prepend=np.nan)
+    up = np.rint(np.round(np.clip(delta, 0, None), 2) * 100)
+    down = np.rint(np.round(np.abs(np.clip(delta, None, 0)), 2) * 100)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rs = rolling_sum(up, dur) / rolling_sum(down, dur)
+        return 100 - (100 / (1 + rs))
+
+def obv(x, volume, prev=None):
+    # Returns On-balance Volume, accumulating <volume> in the direction of each change in <x>
+    # <prev> is an optional (value, obv) tuple for the row preceding <x> to continue a previous calculation
+    x = np.asarray(x, dtype=float)
+    delta = np.diff(x, axis=0, prepend=prev[0] if prev else np.nan)
+    adj = np.round(np.clip(delta, -0.01, 0.01), 2) * 100
+    flow = np.trunc(np.asarray(volume, dtype=float)) * adj
+    out = np.cumsum(np.where(np.isnan(flow), 0., flow), axis=0)
+    if prev and not np.isnan(prev[1]):
+        out += prev[1]
+    out[np.isnan(flow)] = np.nan
+    return out
+
+def buy_signal(value, macd, signal, rsi, lookback=LOOKBACK, rsi_below=50, gap=1):
+    # Returns <value> where the buy rule is met, otherwise -1
+    # The rule requires RSI under <rsi_below> and MACD within <gap> of its signal line
+    # The rule compares the MACD average of the <lookback> rows preceding each row
+    # in newest-first order, so the arrays are reversed to match that ordering;
+    # the newest <lookback> rows of each column have no preceding rows and use an average of 0
+    value, macd, signal, rsi = (np.asarray(a, dtype=float)[::-1] for a in (value, macd, signal, rsi))
+    n = len(macd)
+    sums = np.zeros(macd.shape)
+    if n >= lookback:
+        for k in range(lookback):
+            sums[lookback:] += macd[k:n-lookback+k]
+        # Columns of a panel may end before its newest row
+        newest = np.argmax(~np.isnan(value), axis=0)
+        rows = np.arange(n).reshape((-1,) + (1,) * (macd.ndim - 1))
+        sums[rows - newest < lookback] = 0
+    else:
+        # Short histories wrap around like a negative slice start
+        for i in range(n):
+            sums[i] = macd[max(0, n + i - lookback):i].sum(axis=0)
+    buy = (sums / lookback < signal) & (np.abs(macd - signal) < gap) & (rsi < rsi_below)
+    return np.where(buy, value, np.where(np.isnan(value), np.nan, -1.))[::-1]
+
+def analyze(high, low, volume):
+    # Calculates every analyzer column from <high>, <low> and <volume> arrays
+    # Returns a dict of arrays keyed by column name
+    value = (np.asarray(high, dtype=float) + np.asarray(low, dtype=float)) / 2
+    macd_line, signal_line = macd(value)
+    rsi_line = rsi(value)
+    obv_line = obv(value, volume)
+    return {
+        "value": value,
+        "lt_trend": sma(value, 180),
+        "trend_wma": wma(value, 28),
+        "trend_signal": ema(value, 14, 14),
+        "macd": macd_line,
+        "signal": signal_line,
+        "rsi": rsi_line,
+        "obv": obv_line,
+        "obv_trend": wma(obv_line, 28),
+        "obv_signal": ema(obv_line, 14, 14),
+        "buy_signal": buy_signal(value, macd_line, signal_line, rsi_line),
+    }
+
+def save_state(cols, end):
+    # Returns the state needed by advance() to continue the analyze() output <cols> at row <end>
+    value, macd_line, obv_line = (cols[k][:end] for k in ("value", "macd", "obv"))
+    return {
+        "fast": ema_state(value, 12),
+        "slow": ema_state(value, 26),
+        "signal": ema_state(macd_line, 9),
+        "trend_signal": ema_state(value, 14),
+        "obv_signal": ema_state(obv_line, 14),
+    }
+
+def advance(prev, state, high, low, volume):
+    # Continues an analyze() calculation with new <high>, <low> and <volume> arrays
+    # <prev> should be a dict holding at least the last TAIL rows of analyze() output before
+    # the new rows, and <state> the matching save_state() result
+    # Returns a tuple of (cols, state): cols holds the last LOOKBACK rows of <prev>, whose buy signal
+    # depends on the rows after them, followed by the new rows; state is saved before the last new row
+    value = (np.asarray(high, dtype=float) + np.asarray(low, dtype=float)) / 2
+    n = len(value)
+    macd_line = ema(value, 12, 12, state.get('fast')) - ema(value, 26, 26, state.get('slow'))
+    signal_line = ema(macd_line, 9, 9, state.get('signal'))
+    obv_line = obv(value, volume, (prev['value'][-1], prev['obv'][-1]))
+    # Window based indicators are recalculated over the preceding rows
+    values = np.concatenate((prev['value'], value))
+    rsi_line = rsi(values)[-n:]
+    new = {
+        "value": value,
+        "lt_trend": sma(values, 180)[-n:],
+        "trend_wma": wma(values, 28)[-n:],
+        "trend_signal": ema(value, 14, 14, state.get('trend_signal')),
+        "macd": macd_line,
+        "signal": signal_line,
+        "rsi": rsi_line,
+        "obv": obv_line,
+        "obv_trend": wma(np.concatenate((prev['obv'], obv_line)), 28)[-n:],
+        "obv_signal": ema(obv_line, 14, 14, state.get('obv_signal')),
+    }
+    cols = {k: np.concatenate((prev[k][-LOOKBACK:], v)) for k,v in new.items()}
+    cols.update(buy_signal=buy_signal(cols['value'], cols['macd'], cols['signal'], cols['rsi']))
+    state = {
+        "fast": ema_state(value[:-1], 12, state.get('fast')),
+        "slow": ema_state(value[:-1], 26, state.get('slow')),
+        "signal": ema_state(macd_line[:-1], 9, state.get('signal')),
+        "trend_signal": ema_state(value[:-1], 14, state.get('trend_signal')),
+        "obv_signal": ema_state(obv_line[:-1], 14, state.get('obv_signal')),
+    }
+    return cols, state
@@ -0,0 +1,43 @@
+# module for converting provider responses to typed arrays
+# import third-party modules
+import itertools
+import operator
+import numpy as np
+
+# AlphaVantage daily bar fields, in the column order used by daily()
+DAILY_KEYS = ("1. open", "2. high", "3. low", "4. close", "5. adjusted close", "6. volume")
+
+def daily(series, **kwargs):
+    # <series> should be an AlphaVantage daily time series dict of {date: {field: str}}, newest first
+    # Accepts optional str keyword argument <since> (YYYY-MM-DD) to only convert bars on or after that date
+    # Returns a dict of chronological "date", "open", "high", "low", "close" and "volume" arrays,
+    # adjusted for splits and dividends by the ratio of adjusted close to close
+    items = series.items()
+    if kwargs.get('since'):
+        items = list(itertools.takewhile(lambda x: x[0] >= kwargs.get('since'), items))
+    dates = [x[0] for x in items]
+    bars = [x[1] for x in items]
+    keys = list(DAILY_KEYS)
+    # Unadjusted series have no adjusted close, so close is read in its place
+    if bars and keys[4] not in bars[0]:
+        keys[4] = keys[3]
+    values = np.empty((len(bars), len(keys)))
+    values.ravel()[:] = list(map(float, itertools.chain.from_iterable(map(operator.itemgetter(*keys), bars))))
+    # One copy makes each field a contiguous chronological row
+    values = np.ascontiguousarray(values[::-1].T)
+    opn, high, low, close, adj_close, vol = values
+    adj = np.ones(len(close))
+    np.divide(adj_close, close, out=adj, where=(adj_close != close) & (adj_close > 0) & (close != 0))
+    opn *= adj
+    high *= adj
+    low *= adj
+    close *= adj
+    vol /= adj
+    return {
+        "date": np.array(dates[::-1], dtype="datetime64[D]"),
+        "open": opn,
+        "high": high,
+        "low": low,
+        "close": close,
+        "volume": vol,
+    }
@@ -0,0 +1,390 @@
+# module for live intraday bars built from a feed of ticks
+# Ticks are aggregated into bars of a fixed number of seconds per symbol; the indicators of
+# netris.indicators are kept as running sums so each tick updates them in constant time,
+# without recalculating any preceding rows
+# Bars are keyed by the feed's times, so every process reading the same feed numbers them alike
+# import third-party modules
+import math
+import threading
+import time
+import traceback
+from collections import deque
+import numpy as np
+
+# Import internal modules
+from netris import fsops
+from netris import indicators
+from netris import metrics
+
+TICKS = metrics.REGISTRY.counter("netris_live_ticks_total", "Ticks received from the live feed")
+FEED_ERRORS = metrics.REGISTRY.counter("netris_live_feed_errors_total", "Failed reads of the live feed")
+FIELDS = ["symbol", "time", "price", "volume"]
+# Indicator columns of each live row, calculated as indicators.analyze() does
+COLUMNS = [
+    "value", "lt_trend", "trend_wma", "trend_signal", "macd", "signal",
+    "rsi", "obv", "obv_trend", "obv_signal",
+]
+NAN = float("nan")
+
+class Feed:
+    # Base class; subclasses implement ticks()
+    name = "feed"
+
+    def ticks(self):
+        # Returns a list of (symbol, time, price, volume) tuples received since the last call,
+        # in time order; times are in seconds since the epoch, volume is traded since the last tick
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class Replay(Feed):
+    name = "replay"
+
+    def __init__(self, file, **kwargs):
+        # Replays the ticks saved in CSV <file> (see write_replay) as if they arrived live,
+        # spaced as far apart as their times are, for offline use in place of a real feed
+        # Accepts optional keyword arguments <speed> to replay faster (default 1), <loop> to start
+        # over once every tick is replayed, shifting times so bars keep moving forward, and
+        # <clock>, a function returning seconds (default time.monotonic)
+        ticks = read_replay(file)
+        if ticks is None:
+            raise ValueError(f"No ticks in replay file: {file}")
+        order = np.argsort(ticks['time'], kind="stable")
+        self.symbols = ticks['symbol'][order].tolist()
+        self.times = ticks['time'][order].tolist()
+        self.prices = ticks['price'][order].tolist()
+        self.volumes = ticks['volume'][order].tolist()
+        self.offsets = (ticks['time'][order] - self.times[0]).tolist()
+        self.speed = kwargs.get('speed') if kwargs.get('speed') else 1
+        self.loop = kwargs.get('loop')
+        self.clock = kwargs.get('clock') if kwargs.get('clock') else time.monotonic
+        self.start = None
+        self.position = 0
+        self.cycle = 0
+        # Each cycle starts a second after the last tick of the previous one
+        self.period = self.offsets[-1] + 1
+
+    def ticks(self):
+        now = self.clock()
+        if self.start is None:
+            self.start = now
+        out = []
+        while True:
+            elapsed = (now - self.start) * self.speed
+            end = np.searchsorted(self.offsets, elapsed, side="right")
+            shift = self.cycle * self.period
+            out.extend(zip(
+                self.symbols[self.position:end],
+                [x + shift for x in self.times[self.position:end]] if shift else self.times[self.position:end],
+                self.prices[self.position:end],
+                self.volumes[self.position:end],
+            ))
+            self.position = end
+            if not self.loop or end < len(self.times):
+                return out
+            self.start += self.period / self.speed
+            self.position = 0
+            self.cycle += 1
+
+def read_replay(file):
+    # Returns the "symbol", "time", "price" and "volume" arrays saved in replay CSV <file>,
+    # or None if it cannot be read; times may be seconds since the epoch or ISO dates and times
+    rows = fsops.read_file(file, type="csv", silent=True)
+    if type(rows) is not list or len(rows) < 2:
+        return None
+    header, rows = rows[0], rows[1:]
+    column = {k: header.index(k) for k in FIELDS}
+    times = [x[column['time']] for x in rows]
+    try:
+        seconds = np.array(times, dtype=float)
+    except ValueError:
+        seconds = np.array(times, dtype="datetime64[ms]").astype(float) / 1000
+    return {
+        "symbol": np.array([x[column['symbol']].upper() for x in rows]),
+        "time": seconds,
+        "price": np.array([float(x[column['price']]) for x in rows]),
+        "volume": np.array([float(x[column['volume']]) for x in rows]),
+    }
+
+def write_replay(ticks, file):
+    # Saves <ticks>, a dict of "symbol", "time", "price" and "volume" arrays, as replay CSV <file>
+    # Returns True when successful
+    rows = [FIELDS] + [
+        [str(ticks['symbol'][i]), repr(float(ticks['time'][i])), repr(float(ticks['price'][i])), repr(float(ticks['volume'][i]))]
+        for i in range(len(ticks['symbol']))
+    ]
+    return fsops.write_file(rows, file, type="csv")
+
+def from_name(name, **kwargs):
+    # Returns the feed called <name>, "replay:<file>", or None when <name> is not set
+    # Any keyword arguments are passed to the feed
+    if name and name.startswith("replay:"):
+        return Replay(name.split(":", 1)[1], **kwargs)
+    if not name:
+        return None
+    raise ValueError(f"Unknown feed: {name}")
+
+class Ema:
+    def __init__(self, span, min_periods):
+        # Exponentially weighted mean matching indicators.ema(x, <span>, <min_periods>), one value at a time
+        self.beta = 1 - 2 / (span + 1)
+        self.min_periods = max(min_periods, 1)
+        self.state = (0., 0., 0)
+
+    def after(self, x):
+        # Returns the state once <x> is added, without adding it; NaN values only decay the sums
+        num, den, nobs = self.state
+        if x != x:
+            return (self.beta * num, self.beta * den, nobs)
+        return (self.beta * num + x, self.beta * den + 1., nobs + 1)
+
+    def value(self, state):
+        return state[0] / state[1] if state[2] >= self.min_periods else NAN
+
+class Window:
+    def __init__(self, n):
+        # Running sum and linearly weighted sum of the last <n> values, matching
+        # indicators.rolling_sum() and indicators.wma(); windows holding NaN values are NaN
+        self.n = n
+        self.values = deque(maxlen=n)
+        self.state = (0., 0., 0)
+        self.pushes = 0
+
+    def after(self, x):
+        # Returns the state (sum, weighted sum, NaN count) once <x> is added, without adding it;
+        # when the window is full each weight drops by one, which removes the oldest value
+        total, weighted, nans = self.state
+        nan = x != x
+        v = 0. if nan else x
+        if len(self.values) < self.n:
+            return (total + v, weighted + (len(self.values) + 1) * v, nans + nan)
+        old = self.values[0]
+        if old != old:
+            return (total + v, weighted - total + self.n * v, nans + nan - 1)
+        return (total + v - old, weighted - total + self.n * v, nans + nan)
+
+    def push(self, x, state):
+        self.values.append(x)
+        self.state = state
+        self.pushes += 1
+        # Running sums drift as values come and go, so they are recalculated now and then
+        if self.pushes % (self.n * 64) == 0:
+            values = [0. if v != v else v for v in self.values]
+            self.state = (math.fsum(values), math.fsum((k + 1) * v for k,v in enumerate(values)), sum(v != v for v in self.values))
+
+    def sum(self, state):
+        return state[0] if len(self.values) + 1 >= self.n and state[2] == 0 else NAN
+
+    def wma(self, state):
+        return state[1] / (self.n * (self.n + 1) / 2) if len(self.values) + 1 >= self.n and state[2] == 0 else NAN
+
+def cents(x):
+    # Returns <x> rounded to cents as np.round(x, 2) does
+    return round(x * 100) / 100
+
+class Stream:
+    def __init__(self):
+        # Indicators of one series of bars with the default parameters of indicators.analyze(),
+        # updated a bar at a time; update() gives the row for a bar in progress without keeping it
+        self.fast, self.slow, self.signal = Ema(12, 12), Ema(26, 26), Ema(9, 9)
+        self.trend_signal, self.obv_signal = Ema(14, 14), Ema(14, 14)
+        self.lt_trend, self.trend_wma, self.obv_trend = Window(180), Window(28), Window(28)
+        self.up, self.down = Window(14), Window(14)
+        self.prev = NAN
+        self.obv = 0.
+        # Rows whose buy signal still depends on the rows after them
+        self.recent = deque(maxlen=indicators.LOOKBACK + 1)
+
+    def update(self, high, low, volume, commit=False):
+        # Returns a dict of COLUMNS for a bar of <high>, <low> and <volume> following the kept bars;
+        # when <commit> is True the bar is kept along with the returned dict, which also holds
+        # "buy_signal", a tuple of (row, signal) for the row the buy rule could be decided for
+        # with this bar, or None
+        value = (high + low) / 2
+        delta = value - self.prev
+        states = {"fast": self.fast.after(value), "slow": self.slow.after(value), "trend_signal": self.trend_signal.after(value)}
+        macd = self.fast.value(states['fast']) - self.slow.value(states['slow'])
+        states.update(signal=self.signal.after(macd))
+        if delta == delta:
+            up, down = float(round(cents(max(delta, 0.)) * 100)), float(round(cents(abs(min(delta, 0.))) * 100))
+            flow = NAN if volume != volume else math.trunc(volume) * (cents(max(min(delta, .01), -.01)) * 100)
+        else:
+            up = down = flow = NAN
+        obv = NAN if flow != flow else self.obv + flow
+        states.update(
+            up=self.up.after(up), down=self.down.after(down), lt_trend=self.lt_trend.after(value),
+            trend_wma=self.trend_wma.after(value), obv_trend=self.obv_trend.after(obv), obv_signal=self.obv_signal.after(obv)
+        )
+        gains, losses = self.up.sum(states['up']), self.down.sum(states['down'])
+        if gains != gains or losses != losses or gains == losses == 0:
+            rsi = NAN
+        else:
+            rsi = 100 - 100 / (1 + gains / losses) if losses else 100.
+        row = {
+            "value": value,
+            "lt_trend": self.lt_trend.sum(states['lt_trend']) / self.lt_trend.n,
+            "trend_wma": self.trend_wma.wma(states['trend_wma']),
+            "trend_signal": self.trend_signal.value(states['trend_signal']),
+            "macd": macd,
+            "signal": self.signal.value(states['signal']),
+            "rsi": rsi,
+            "obv": obv,
+            "obv_trend": self.obv_trend.wma(states['obv_trend']),
+            "obv_signal": self.obv_signal.value(states['obv_signal']),
+        }
+        if commit:
+            for name in ("fast", "slow", "signal", "trend_signal", "obv_signal"):
+                getattr(self, name).state = states[name]
+            pushed = {"up": up, "down": down, "lt_trend": value, "trend_wma": value, "obv_trend": obv}
+            for name, x in pushed.items():
+                getattr(self, name).push(x, states[name])
+            self.prev = value
+            self.obv = self.obv if flow != flow else self.obv + flow
+            self.recent.append(row)
+            row.update(buy_signal=self.decide())
+        return row
+
+    def decide(self):
+        # Returns a tuple of (row, signal) for the oldest recent row once LOOKBACK rows follow it,
+        # as indicators.buy_signal() decides rows that are not among the newest, otherwise None
+        if len(self.recent) <= indicators.LOOKBACK:
+            return None
+        row = self.recent[0]
+        sums = 0.
+        for later in reversed(list(self.recent)[1:]):
+            sums += later['macd']
+        if sums / indicators.LOOKBACK < row['signal'] and abs(row['macd'] - row['signal']) < 1 and row['rsi'] < 50:
+            return row, row['value']
+        return row, NAN if row['value'] != row['value'] else -1.
+
+class Series:
+    def __init__(self, interval, history):
+        # Bars of <interval> seconds built from the ticks of one symbol, keeping the last <history> bars
+        # Every kept bar and decided buy signal carries the "time" its bar started, in seconds since
+        # the epoch of the feed's clock, so readers can ask for what is new
+        self.interval = interval
+        self.stream = Stream()
+        self.rows = deque(maxlen=history)
+        self.buys = deque(maxlen=history)
+        self.time = 0
+        self.bar = None
+        self.forming = None
+
+    def tick(self, when, price, volume):
+        # Adds a tick at time <when>; a tick in a later interval closes the bar in progress, and
+        # late ticks from an earlier interval are counted in the bar in progress
+        start = when - when % self.interval
+        bar = self.bar
+        if bar is not None and start > bar[0]:
+            self.close()
+            bar = None
+        if bar is None:
+            bar = self.bar = [start, price, price, volume]
+        else:
+            bar[1] = max(bar[1], price)
+            bar[2] = min(bar[2], price)
+            bar[3] += volume
+        self.forming = self.stream.update(bar[1], bar[2], bar[3])
+
+    def close(self):
+        # Keeps the bar in progress and its indicators
+        start, high, low, volume = self.bar
+        row = self.stream.update(high, low, volume, commit=True)
+        self.time = start
+        decided = row.pop('buy_signal')
+        row.update(date=timestamp(start), high=high, low=low, volume=volume, time=start)
+        self.rows.append(row)
+        if decided and decided[1] > 0:
+            # Rows are kept by reference, so the decided row already carries its date; the signal
+            # is new as of the bar deciding it
+            self.buys.append({"date": decided[0]['date'], "buy_signal": decided[1], "time": start})
+        self.bar = None
+        self.forming = None
+
+    def changes(self, since):
+        # Returns a dict of the kept "rows" and "buys" timed after <since>, the "forming" row
+        # of the bar in progress or None, and "time", the time of the latest kept row
+        return {
+            "rows": newer(self.rows, since),
+            "buys": newer(self.buys, since),
+            "forming": dict(self.forming, date=timestamp(self.bar[0]), high=self.bar[1], low=self.bar[2], volume=self.bar[3]) if self.bar else None,
+            "time": self.time,
+        }
+
+def newer(items, since):
+    # Returns the dicts at the end of deque <items> timed after <since>, oldest first
+    out = []
+    for item in reversed(items):
+        if item['time'] <= since:
+            break
+        out.append(item)
+    return out[::-1]
+
+def timestamp(seconds):
+    # Returns the ISO date and time of <seconds> since the epoch
+    return str(np.datetime64(int(seconds), 's'))
+
+class Engine:
+    def __init__(self, feed, **kwargs):
+        # Builds live bars for every symbol in the ticks of <feed>, a Feed, on a daemon thread
+        # Accepts optional keyword arguments <interval>, the bar length in seconds (default 60),
+        # <history>, the bars kept per symbol (default 300), and <poll>, the seconds between
+        # reads of the feed (default 0.1)
+        self.feed = feed
+        self.interval = kwargs.get('interval') if kwargs.get('interval') else 60
+        self.history = kwargs.get('history') if kwargs.get('history') else 300
+        self.poll = kwargs.get('poll') if kwargs.get('poll') else 0.1
+        self.series = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.last_error = None
+
+    def process(self, ticks):
+        # Adds <ticks>, a list of (symbol, time, price, volume) tuples in time order
+        with self.lock:
+            for symbol, when, price, volume in ticks:
+                series = self.series.get(symbol)
+                if series is None:
+                    series = self.series[symbol] = Series(self.interval, self.history)
+                series.tick(when, price, volume)
+        TICKS.inc(len(ticks))
+
+    def changes(self, symbol, since=0):
+        # Returns what is new for <symbol> after the row timed <since> as Series.changes() does,
+        # or None if no ticks were received for <symbol>
+        with self.lock:
+            series = self.series.get(symbol)
+            return series.changes(since) if series else None
+
+    def start(self):
+        # Starts reading the feed; returns False if already running
+        if self.thread and self.thread.is_alive():
+            return False
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.loop, name="live", daemon=True)
+        self.thread.start()
+        return True
+
+    def loop(self):
+        while not self.stopped.is_set():
+            try:
+                ticks = self.feed.ticks()
+                if ticks:
+                    self.process(ticks)
+                self.last_error = None
+            except Exception as e:
+                FEED_ERRORS.inc()
+                # Every failed read is counted, but a feed failing the same way on every poll
+                # is only logged once
+                if repr(e) != repr(self.last_error):
+                    traceback.print_exc()
+                self.last_error = e
+            self.stopped.wait(self.poll)
+
+    def stop(self, timeout=None):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout)
+        self.feed.close()
@@ -0,0 +1,73 @@
+# module for in-process caching
+# import third-party modules
+import sys
+import threading
+from collections import OrderedDict
+
+def sizeof(obj):
+    # Returns the approximate memory used by <obj> in bytes,
+    # including the contents of DataFrames, arrays, dicts, lists and tuples
+    if hasattr(obj, 'memory_usage'):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, 'sum') else usage)
+    if hasattr(obj, 'nbytes'):
+        return int(obj.nbytes)
+    if type(obj) is dict:
+        return sys.getsizeof(obj) + sum(sizeof(k) + sizeof(v) for k,v in obj.items())
+    if type(obj) in (list, tuple):
+        return sys.getsizeof(obj) + sum(sizeof(x) for x in obj)
+    return sys.getsizeof(obj)
+
+class LRUCache:
+    def __init__(self, max_bytes, **kwargs):
+        # Thread-safe least recently used cache holding up to <max_bytes> of values
+        # Accepts optional int keyword argument <max_items> to also limit the number of entries
+        self.max_bytes = max_bytes
+        self.max_items = kwargs.get('max_items')
+        self.items = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        # Returns the value cached for <key>, or <default> if not cached
+        with self.lock:
+            if key not in self.items:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.items.move_to_end(key)
+            return self.items[key][0]
+
+    def set(self, key, value):
+        # Caches <value> for <key>, evicting the least recently used entries to stay within limits
+        # Values larger than <max_bytes> are not cached; returns True when cached
+        size = sizeof(value)
+        with self.lock:
+            if key in self.items:
+                self.bytes -= self.items.pop(key)[1]
+            if size > self.max_bytes:
+                return False
+            self.items[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes or (self.max_items and len(self.items) > self.max_items):
+                self.bytes -= self.items.popitem(last=False)[1][1]
+            return True
+
+    def remove(self, key):
+        with self.lock:
+            if key in self.items:
+                self.bytes -= self.items.pop(key)[1]
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.bytes = 0
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.items
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,146 @@
+# module for memoizing indicator results
+# Results are keyed by symbol, timeframe, the version and last bar of the input data, indicator and
+# parameters, so they are reused until the data is stored again, new bars arrive or the last bar changes
+# import third-party modules
+import hashlib
+import os
+import threading
+import numpy as np
+
+# Import internal modules
+from netris import fsops
+from netris import indicators
+from netris import memcache
+
+def fingerprint(data):
+    # Returns a str identifying the bars in <data>: the row count, last date and last bar values
+    # The last bar's values are included because an unfinished day is replaced under the same date
+    rows = len(data['high'])
+    if rows < 1:
+        return "0"
+    date = str(data['date'][-1]) if 'date' in data else ""
+    last = [float(data[k][-1]) for k in ("high", "low", "volume") if k in data]
+    return f"{rows}:{date}:{':'.join(repr(x) for x in last)}"
+
+class Memo:
+    def __init__(self, max_bytes, **kwargs):
+        # Memoizes indicator results in a least recently used cache of up to <max_bytes>
+        # Accepts optional keyword arguments <directory> to also persist results as .npy files,
+        # and <max_disk_bytes> (default 4 times <max_bytes>) to bound that directory
+        self.cache = memcache.LRUCache(max_bytes)
+        self.directory = kwargs.get('directory')
+        self.max_disk_bytes = kwargs.get('max_disk_bytes') if kwargs.get('max_disk_bytes') else 4 * max_bytes
+        self.computed = 0
+        self.writes = 0
+        self.lock = threading.Lock()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, symbol, timeframe, data, name, params, version=None):
+        return f"{symbol}|{timeframe}|{version}|{fingerprint(data)}|{name}|{sorted(params.items())}"
+
+    def indicator(self, symbol, timeframe, data, name, version=None, **params):
+        # Returns indicator <name> (a key of indicators.PARAMS) calculated from the chronological
+        # "high", "low" and "volume" arrays in <data>, with any <params> overriding the defaults
+        # <version> should identify the stored data, such as the "version" saved in its meta, so
+        # results are recalculated when history before the last bar is rewritten
+        # Indicators built on others (obv_trend, obv_signal, buy_signal) reuse their memoized inputs
+        # The returned array is read-only since it is shared with later callers
+        params = dict(indicators.PARAMS[name], **{k: v for k,v in params.items() if k in indicators.PARAMS[name]})
+        key = self.key(symbol, timeframe, data, name, params, version)
+        result = self.load(key)
+        if result is None:
+            result = self.calculate(symbol, timeframe, data, name, params, version)
+            result.setflags(write=False)
+            self.save(key, result)
+        return result
+
+    def calculate(self, symbol, timeframe, data, name, params, version=None):
+        value = (np.asarray(data['high'], dtype=float) + np.asarray(data['low'], dtype=float)) / 2
+        with self.lock:
+            self.computed += 1
+        if name == "lt_trend":
+            return indicators.sma(value, params['n'])
+        if name == "trend_wma":
+            return indicators.wma(value, params['n'])
+        if name == "trend_signal":
+            return indicators.ema(value, params['span'], params['span'])
+        if name in ("macd", "signal"):
+            macd_line, signal_line = indicators.macd(value, params['fast'], params['slow'], params['sig'])
+            # Both lines come from one calculation, so the other is memoized as well
+            other = "signal" if name == "macd" else "macd"
+            kept = signal_line if name == "macd" else macd_line
+            kept.setflags(write=False)
+            self.save(self.key(symbol, timeframe, data, other, params, version), kept)
+            return macd_line if name == "macd" else signal_line
+        if name == "rsi":
+            return indicators.rsi(value, params['dur'])
+        if name == "obv":
+            return indicators.obv(value, data['volume'])
+        if name == "obv_trend":
+            return indicators.wma(self.indicator(symbol, timeframe, data, "obv", version), params['n'])
+        if name == "obv_signal":
+            return indicators.ema(self.indicator(symbol, timeframe, data, "obv", version), params['span'], params['span'])
+        if name == "buy_signal":
+            macd_params = {k: params[k] for k in ("fast", "slow", "sig")}
+            return indicators.buy_signal(
+                value,
+                self.indicator(symbol, timeframe, data, "macd", version, **macd_params),
+                self.indicator(symbol, timeframe, data, "signal", version, **macd_params),
+                self.indicator(symbol, timeframe, data, "rsi", version, dur=params['dur']),
+                params['lookback'],
+                params['rsi_below'],
+                params['gap']
+            )
+        raise KeyError(name)
+
+    def path(self, key):
+        return f"{self.directory}/{hashlib.sha1(key.encode('utf-8')).hexdigest()}.npy"
+
+    def load(self, key):
+        # Returns the result memoized for <key> from memory or disk, or None
+        result = self.cache.get(key)
+        if result is not None or not self.directory:
+            return result
+        try:
+            result = np.load(self.path(key))
+        except (OSError, ValueError):
+            return None
+        result.setflags(write=False)
+        self.cache.set(key, result)
+        return result
+
+    def save(self, key, result):
+        self.cache.set(key, result)
+        if not self.directory:
+            return
+        file = self.path(key)
+        try:
+            with fsops.replacing(file) as npy_file:
+                np.save(npy_file, result)
+        except OSError:
+            return
+        with self.lock:
+            self.writes += 1
+            prune = self.writes % 64 == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        # Removes the least recently written result files until the directory fits <max_disk_bytes>
+        try:
+            files = sorted(
+                (x for x in os.scandir(self.directory) if x.name.endswith(".npy")),
+                key=lambda x: x.stat().st_mtime
+            )
+            total = sum(x.stat().st_size for x in files)
+            for entry in files:
+                if total <= self.max_disk_bytes:
+                    break
+                total -= entry.stat().st_size
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+    def clear(self):
+        self.cache.clear()
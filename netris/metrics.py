@@ -0,0 +1,261 @@
+# module for collecting runtime metrics and exposing them in the Prometheus text format
+# import third-party modules
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+
+# Default histogram buckets in seconds
+BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+# Histogram buckets for payload sizes in bytes
+BYTE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def format_labels(labels):
+    # Returns the (name, value) pairs in <labels> formatted as a Prometheus label set
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k,v in labels) + "}"
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, doc, labels=(), func=None):
+        # <labels> should be the names of the labels every sample of this metric carries
+        # Accepts optional callable <func> returning the value when the metric is collected, for
+        # values kept elsewhere; with labels it should return a dict keyed by tuples of label values
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self.func = func
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple((k, str(labels.get(k, ""))) for k in self.labels)
+
+    def samples(self):
+        # Returns a list of (name, labels, value) tuples for the current values
+        if self.func is not None:
+            value = self.func()
+            if type(value) is dict:
+                return [(self.name, tuple(zip(self.labels, (str(x) for x in k))), v) for k,v in value.items()]
+            return [(self.name, (), value)]
+        with self.lock:
+            return [(self.name, k, v) for k,v in self.values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {escape(self.doc)}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {value:.17g}" if type(value) is float else f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = [[0] * len(self.buckets), 0, 0.]
+            entry = self.values[key]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    def time(self, **labels):
+        # Returns a context manager observing the seconds spent in its block
+        return Timer(self, labels)
+
+    def samples(self):
+        with self.lock:
+            items = [(k, list(v[0]), v[1], v[2]) for k,v in self.values.items()]
+        samples = []
+        for key, counts, count, total in items:
+            for bound, n in zip(self.buckets, counts):
+                samples.append((f"{self.name}_bucket", key + (("le", repr(float(bound))),), n))
+            samples.append((f"{self.name}_bucket", key + (("le", "+Inf"),), count))
+            samples.append((f"{self.name}_sum", key, float(total)))
+            samples.append((f"{self.name}_count", key, count))
+        return samples
+
+class Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        self.histogram.observe(self.seconds, **self.labels)
+        return False
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def add(self, metric):
+        # Registers <metric>, returning the metric already registered under its name if any
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, doc, labels=(), func=None):
+        return self.add(Counter(name, doc, labels, func))
+
+    def gauge(self, name, doc, labels=(), func=None):
+        return self.add(Gauge(name, doc, labels, func))
+
+    def histogram(self, name, doc, labels=(), buckets=BUCKETS):
+        return self.add(Histogram(name, doc, labels, buckets))
+
+    def render(self):
+        # Returns every registered metric in the Prometheus text exposition format
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(x.render() for x in metrics) + "\n"
+
+# Registry shared by the netris modules
+REGISTRY = Registry()
+
+CALLBACK_SECONDS = REGISTRY.histogram("netris_callback_seconds", "Time spent in Dash callbacks", ("callback",))
+CALLBACK_ERRORS = REGISTRY.counter("netris_callback_errors_total", "Dash callbacks that raised an exception", ("callback",))
+STAGE_SECONDS = REGISTRY.histogram("netris_stage_seconds", "Time spent in pipeline stages", ("stage",))
+
+def timed(callback):
+    # Decorator recording the run time of the wrapped function as Dash callback <callback>
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with CALLBACK_SECONDS.time(callback=callback):
+                try:
+                    return func(*args, **kwargs)
+                except Exception:
+                    CALLBACK_ERRORS.inc(callback=callback)
+                    raise
+        return wrapper
+    return decorator
+
+def stage(name):
+    # Returns a context manager recording the time spent in pipeline stage <name>
+    return STAGE_SECONDS.time(stage=name)
+
+class Profiler:
+    def __init__(self, directory, **kwargs):
+        # Captures cProfile output of individual requests into <directory>
+        # Accepts optional int keyword argument <keep> for the number of profiles kept (default 20)
+        self.directory = directory
+        self.keep = kwargs.get('keep') if kwargs.get('keep') else 20
+        self.armed = 0
+        self.last = None
+        self.lock = threading.Lock()
+
+    def arm(self, count=1):
+        # Profiles the next <count> requests
+        with self.lock:
+            self.armed = max(0, int(count))
+
+    def start(self, forced=False):
+        # Returns a running cProfile.Profile when this request should be profiled, otherwise None
+        with self.lock:
+            if not forced and self.armed < 1:
+                return None
+            if not forced:
+                self.armed -= 1
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active on this thread
+            return None
+        return profile
+
+    def stop(self, profile, name):
+        # Stops <profile>, saves it as a .prof file named after <name> and returns the file path
+        profile.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        slug = "".join(x if x.isalnum() else "_" for x in name).strip("_")[:60]
+        file = f"{self.directory}/{datetime.now().strftime('%Y%m%d%H%M%S%f')}-{slug}.prof"
+        profile.dump_stats(file)
+        text = io.StringIO()
+        pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(40)
+        with self.lock:
+            self.last = text.getvalue()
+        files = sorted(x for x in os.listdir(self.directory) if x.endswith(".prof"))
+        for old in files[:-self.keep]:
+            os.remove(f"{self.directory}/{old}")
+        return file
+
+def serve(server, **kwargs):
+    # Adds request metrics and a "/metrics" endpoint to Flask app <server>
+    # Accepts optional keyword arguments <registry> (default REGISTRY) and <profiler>, a Profiler
+    # enabling "/metrics/profile" (GET for the last summary, POST ?requests=N to arm) and
+    # the "X-Profile: 1" request header for profiling individual requests
+    from flask import Response, g, request
+    registry = kwargs.get('registry') if kwargs.get('registry') else REGISTRY
+    profiler = kwargs.get('profiler')
+    http_seconds = registry.histogram("netris_http_request_seconds", "Time spent serving HTTP requests", ("path",))
+    http_bytes = registry.histogram("netris_http_response_bytes", "Bytes serialized in HTTP responses", ("path",), BYTE_BUCKETS)
+
+    @server.before_request
+    def before():
+        g.metrics_start = time.perf_counter()
+        g.profile = profiler.start(request.headers.get("X-Profile") == "1") if profiler else None
+
+    @server.after_request
+    def after(response):
+        # Label by route rather than URL so asset paths do not create a series each
+        path = request.url_rule.rule if request.url_rule else "other"
+        if getattr(g, 'profile', None) is not None:
+            response.headers["X-Profile-File"] = os.path.basename(profiler.stop(g.profile, request.path))
+            g.profile = None
+        if hasattr(g, 'metrics_start'):
+            http_seconds.observe(time.perf_counter() - g.metrics_start, path=path)
+        if not response.direct_passthrough:
+            http_bytes.observe(response.calculate_content_length() or 0, path=path)
+        return response
+
+    @server.route("/metrics")
+    def metrics():
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+    if profiler:
+        @server.route("/metrics/profile", methods=["GET", "POST"])
+        def profile():
+            if request.method == "POST":
+                profiler.arm(request.args.get("requests", 1, type=int))
+                return Response(f"Profiling the next {profiler.armed} request(s)\n", mimetype="text/plain")
+            return Response(profiler.last or "No profile captured yet\n", mimetype="text/plain")
+    return server
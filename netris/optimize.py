@@ -0,0 +1,160 @@
+# module for searching the indicator settings under which the buy signal rule performs best
+# Settings are scored with netris.backtest, for all symbols together and for each symbol alone
+# Usage: python -m netris.optimize [--timeframe TF] [--metric METRIC] [--samples N] [--workers N] [SYMBOL ...]
+# import third-party modules
+import argparse
+import itertools
+import json
+import os
+import numpy as np
+
+# Import internal modules
+from netris import backtest
+from netris import batch
+from netris import fsops
+from netris import resample
+
+# Values searched for each setting; the analyzer uses MACD 12/26/9, RSI 14, a 28 bar trend WMA
+# against a 14 span EMA, and a 180 bar long-term trend
+SPACE = {
+    "fast": [8, 10, 12, 15],
+    "slow": [21, 26, 30, 35],
+    "sig": [7, 9, 11],
+    "dur": [10, 14, 20],
+    "trend_n": [None, 20, 28, 40],
+    "trend_span": [10, 14, 20],
+    "lt_n": [None, 100, 180, 250],
+}
+
+def grid(space=None):
+    # Returns every combination of the settings in <space> (default SPACE) as a list of dicts,
+    # leaving out MACD settings whose fast average is not faster than the slow one
+    combos = backtest.grid(**(space if space else SPACE))
+    return unique([x for x in combos if valid(x)])
+
+def sample(count, space=None, seed=0):
+    # Returns up to <count> distinct combinations of the settings in <space> (default SPACE)
+    # drawn at random; the same <seed> always draws the same combinations
+    space = space if space else SPACE
+    rng = np.random.default_rng(seed)
+    combos, seen = [], set()
+    # Small spaces run out of new combinations, so the attempts are bounded
+    for i in range(count * 20):
+        if len(combos) >= count:
+            break
+        combo = {k: v[rng.integers(len(v))] for k,v in space.items()}
+        key = identity(combo)
+        if valid(combo) and key not in seen:
+            seen.add(key)
+            combos.append(combo)
+    return combos
+
+def valid(combo):
+    return combo.get('fast', 12) < combo.get('slow', 26)
+
+def identity(combo):
+    # Returns a hashable key for <combo> that ignores settings it does not use:
+    # the trend EMA span is only used along with the trend WMA
+    combo = dict(combo, trend_span=combo.get('trend_span') if combo.get('trend_n') else None)
+    return tuple(sorted((k, v) for k,v in combo.items() if v is not None))
+
+def unique(combos):
+    seen = {}
+    for combo in combos:
+        seen.setdefault(identity(combo), combo)
+    return list(seen.values())
+
+def evaluate(data, combos, metric, min_trades):
+    # Backtests each of <combos> on panel <data>, sharing indicator lines between them
+    # Returns a tuple of (results, best, index): results is a list of (params, summary) tuples,
+    # best holds each symbol's best score of <metric> as an array, lower is better, among
+    # settings with at least <min_trades> trades, and index the position in <combos> scoring it
+    key, sign = metric.lstrip("-"), -1 if metric.startswith("-") else 1
+    lines = backtest.Lines(data)
+    count = len(data['symbols'])
+    best, index = np.full(count, np.inf), np.full(count, -1)
+    results = []
+    for i, params in enumerate(combos):
+        stats = backtest.statistics(data, backtest.simulate(data, lines, **params))
+        score = sign * stats[key].astype(float)
+        score[(stats['trades'] < min_trades) | np.isnan(score)] = np.inf
+        better = score < best
+        best[better], index[better] = score[better], i
+        results.append((params, backtest.overall(stats)))
+    return results, best, index
+
+def optimize(data, combos, **kwargs):
+    # Searches <combos>, a list of setting dicts such as grid() or sample() return, for the best
+    # settings on panel <data>; settings may also include backtest.EXITS
+    # Accepts optional keyword arguments <metric>, a backtest.METRICS field, maximized when
+    # prefixed with "-" and minimized otherwise (default "-mean_return"), <min_trades> a setting
+    # needs on a symbol to be chosen for it (default 3), <top> overall results to return
+    # (default 10), and <workers> or <executor> as backtest.sweep() accepts them
+    # Returns a dict of the "metric", the number of "settings" searched, the "best" overall as
+    # a list of dicts of "params" and "summary", and the best "params" and "score" per symbol
+    metric = kwargs.get('metric') if kwargs.get('metric') else "-mean_return"
+    if metric.lstrip("-") not in backtest.METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+    min_trades = kwargs.get('min_trades') if kwargs.get('min_trades') is not None else 3
+    top = kwargs.get('top') if kwargs.get('top') else 10
+    # Settings sharing MACD and RSI windows are kept together so they share those lines
+    order = ("fast", "slow", "sig", "dur", "trend_n", "trend_span", "lt_n")
+    combos = sorted(combos, key=lambda x: tuple(str(x.get(k)) for k in order))
+    executor = kwargs.get('executor')
+    workers = kwargs.get('workers') if kwargs.get('workers') else (os.cpu_count() or 1) if executor else 1
+    if executor is None and (workers < 2 or len(combos) < 2):
+        parts = [evaluate(data, combos, metric, min_trades)]
+        offsets = [0]
+    else:
+        pool = executor if executor else batch.process_pool(workers)
+        try:
+            chunks = batch.chunks(combos, workers)
+            offsets = [0] + list(itertools.accumulate(len(x) for x in chunks))[:-1]
+            n = len(chunks)
+            parts = list(pool.map(evaluate, [data] * n, chunks, [metric] * n, [min_trades] * n))
+        finally:
+            if executor is None:
+                pool.shutdown()
+    results = [x for part in parts for x in part[0]]
+    # Each symbol keeps the best score of any chunk
+    scores = np.stack([part[1] for part in parts])
+    indexes = np.stack([part[2] + offset for part, offset in zip(parts, offsets)])
+    winner = scores.argmin(axis=0)
+    columns = np.arange(len(data['symbols']))
+    best, index = scores[winner, columns], indexes[winner, columns]
+    sign = -1 if metric.startswith("-") else 1
+    key = metric.lstrip("-")
+    ranked = [x for x in batch.ordered(results, lambda x: x[1][key], sign < 0) if x[1][key] is not None]
+    return {
+        "metric": metric,
+        "settings": len(combos),
+        "best": [{"params": p, "summary": s} for p, s in ranked[:top]],
+        "symbols": {
+            symbol: {"params": combos[index[j]], "score": float(sign * best[j])} if np.isfinite(best[j]) else None
+            for j, symbol in enumerate(data['symbols'])
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Search indicator settings for the buy signal rule")
+    parser.add_argument("symbols", nargs="*", help="symbols to optimize (default every stored symbol)")
+    parser.add_argument("--data-dir", default=f"{os.getcwd()}/data")
+    parser.add_argument("--key-file", default=os.environ.get("NETRIS_KEY_FILE"), help="key file of encrypted stored data")
+    parser.add_argument("--timeframe", default="weekly", choices=resample.TIMEFRAMES)
+    parser.add_argument("--metric", default="-mean_return")
+    parser.add_argument("--samples", type=int, default=0, help="random settings to try (default the full grid)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-trades", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    key = fsops.get_key(args.key_file) if args.key_file else None
+    data = backtest.load(f"{args.data_dir}/{args.timeframe}", args.symbols, key)
+    if data is None:
+        parser.error(f"No stored {args.timeframe} bars found in {args.data_dir}")
+    combos = sample(args.samples, seed=args.seed) if args.samples else grid()
+    result = optimize(data, combos, metric=args.metric, min_trades=args.min_trades, workers=args.workers, top=args.top)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
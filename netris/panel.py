@@ -0,0 +1,50 @@
+# module for aligning many symbols into 2-D arrays (rows x symbols) for batched calculations
+# Panels built by stack() line symbols up by bar position, so each column holds only that
+# symbol's own bars and indicators run through no gaps
+# import third-party modules
+import numpy as np
+
+# Import internal modules
+from netris import indicators
+
+def stack(series):
+    # <series> should be a non-empty dict mapping each symbol to a dict of equal length
+    # chronological arrays, including a "date" array
+    # Returns a panel dict holding "symbols", a "present" mask, and a 2-D array for every column
+    # shared by all symbols, "date" included; each symbol's bars fill the last rows of its column,
+    # so the last row holds every symbol's latest bar and symbols with fewer bars are NaN (NaT
+    # for dates) before their first. Gaps in one symbol's calendar, such as a halt or a market
+    # open on other days, leave no missing rows inside its column
+    symbols = list(series)
+    lengths = [len(x['date']) for x in series.values()]
+    n = max(lengths)
+    rows = np.concatenate([np.arange(n - x, n) for x in lengths])
+    cols = np.repeat(np.arange(len(symbols)), lengths)
+    panel = {
+        "symbols": symbols,
+        "present": np.zeros((n, len(symbols)), dtype=bool),
+    }
+    panel['present'][rows, cols] = True
+    first = next(iter(series.values()))
+    for name in [k for k in first if all(k in x for x in series.values())]:
+        if name == "date":
+            arr = np.full((n, len(symbols)), np.datetime64("NaT"), dtype="datetime64[D]")
+            arr[rows, cols] = np.concatenate([x['date'].astype('datetime64[D]') for x in series.values()])
+        else:
+            arr = np.full((n, len(symbols)), np.nan)
+            arr[rows, cols] = np.concatenate([np.asarray(x[name], dtype=float) for x in series.values()])
+        panel.update({name: arr})
+    return panel
+
+def analyze(panel):
+    # Calculates every analyzer column for all symbols in <panel>, a stack() panel, in one pass
+    # Returns a dict of 2-D arrays keyed by column name
+    return indicators.analyze(panel['high'], panel['low'], panel['volume'])
+
+def split(panel, cols):
+    # Returns a dict mapping each symbol in <panel> to a dict of 1-D arrays taken from the
+    # 2-D arrays in <cols>, keeping only the rows the symbol has a bar
+    return {
+        symbol: {k: v[panel['present'][:, j], j] for k,v in cols.items()}
+        for j, symbol in enumerate(panel['symbols'])
+    }
@@ -0,0 +1,234 @@
+# module for market data providers
+# Every provider returns daily bars as dicts of chronological "date", "open", "high", "low",
+# "close" and "volume" arrays, adjusted for splits and dividends
+# import third-party modules
+import numpy as np
+
+# Import internal modules
+from netris import fsops
+from netris import ingest
+
+FIELDS = ["date", "open", "high", "low", "close", "volume"]
+
+class UnknownSymbol(Exception):
+    # Raised for, or returned as the error of, a symbol the provider does not recognise
+    pass
+
+class Provider:
+    # Base class; subclasses implement daily()
+    name = "provider"
+
+    def daily(self, symbols, **kwargs):
+        # Downloads daily bars for each symbol in <symbols>
+        # Accepts optional bool keyword argument <recent> to only request the latest bars,
+        # which is enough to extend recently stored data
+        # Returns a tuple of dicts (results, errors) keyed by symbol; a failed symbol
+        # does not prevent the others from returning results
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class AlphaVantage(Provider):
+    name = "alphavantage"
+
+    def __init__(self, **kwargs):
+        # Accepts optional keyword arguments <apikey>, bool <premium>, <url> of the query endpoint,
+        # and <workers>, <timeout>, <retries>, <backoff>, <rate> and <per> for the HTTP session,
+        # which is created on first use
+        # Daily adjusted bars need a premium key; without <premium> the free weekly adjusted series
+        # is downloaded instead and stored in place of daily bars, so the daily timeframe shows
+        # weekly bars. The default rate suits the key's tier: 5 requests per minute for free keys,
+        # 75 for premium ones
+        self.apikey = kwargs.get('apikey') if kwargs.get('apikey') else "9LVE9OGAKH31RPWM"
+        self.premium = bool(kwargs.get('premium'))
+        self.url = kwargs.get('url') if kwargs.get('url') else "https://www.alphavantage.co/query"
+        self.options = {
+            "workers": 8, "timeout": 15, "retries": 3, "backoff": 1, "rate": 75 if self.premium else 5, "per": 60
+        }
+        self.options.update({k: v for k,v in kwargs.items() if k in self.options})
+        self.fetcher = None
+
+    def query(self, symbol, size):
+        # Returns the request for adjusted bars of <symbol>, daily with <size> either "compact"
+        # (latest 100 bars) or "full" for premium keys, otherwise the full weekly series
+        params = {
+            "function": "TIME_SERIES_DAILY_ADJUSTED" if self.premium else "TIME_SERIES_WEEKLY_ADJUSTED",
+            "symbol": symbol,
+            "apikey": self.apikey,
+            "datatype": "json",
+        }
+        if self.premium:
+            params.update(outputsize=size)
+        return (self.url, params)
+
+    def daily(self, symbols, **kwargs):
+        if self.fetcher is None:
+            # The requests stack is slow to import, so it is only loaded when first needed
+            from netris import fetch
+            self.fetcher = fetch.Fetcher(**self.options)
+        size = "compact" if kwargs.get('recent') else "full"
+        results, errors = self.fetcher.get_many({x: self.query(x, size) for x in symbols})
+        daily_key = "Time Series (Daily)" if self.premium else "Weekly Adjusted Time Series"
+        for symbol, content in list(results.items()):
+            if "Error Message" in content:
+                errors.update({symbol: UnknownSymbol(content.get("Error Message"))})
+            elif content.get(daily_key) is None:
+                # Rate limit and other notices come back without a time series
+                errors.update({symbol: Exception(content.get("Note") or content.get("Information") or f"No data for {symbol}")})
+            else:
+                results.update({symbol: ingest.daily(content.get(daily_key))})
+                continue
+            results.pop(symbol)
+        return results, errors
+
+    def close(self):
+        if self.fetcher:
+            self.fetcher.close()
+
+class YFinance(Provider):
+    name = "yfinance"
+
+    def __init__(self, **kwargs):
+        # Accepts optional keyword arguments <period> for full downloads (default "max"),
+        # <recent_period> for recent ones (default "6mo") and <timeout> in seconds
+        self.period = kwargs.get('period') if kwargs.get('period') else "max"
+        self.recent_period = kwargs.get('recent_period') if kwargs.get('recent_period') else "6mo"
+        self.timeout = kwargs.get('timeout') if kwargs.get('timeout') else 30
+
+    def daily(self, symbols, **kwargs):
+        symbols = list(symbols)
+        if not symbols:
+            return {}, {}
+        import yfinance as yf
+        # One bulk request downloads every symbol
+        frame = yf.download(
+            symbols, period=self.recent_period if kwargs.get('recent') else self.period, interval="1d",
+            group_by="column", auto_adjust=False, actions=False, threads=True, progress=False,
+            timeout=self.timeout
+        )
+        failed = {}
+        try:
+            failed = dict(yf.shared._ERRORS)
+        except Exception:
+            pass
+        return split_frame(frame, symbols, failed)
+
+def split_frame(frame, symbols, failed=None):
+    # Splits a yfinance download <frame> of <symbols> with (field, symbol) columns into
+    # per-symbol arrays; every field is adjusted for all symbols at once in one 2-D block,
+    # laid out so each symbol's bars are a contiguous view that is not copied again
+    # <failed> may map symbols to the error messages yfinance reported for them
+    # Returns a tuple of dicts (results, errors) keyed by symbol
+    failed = failed if failed else {}
+    results, errors = {}, {}
+    if frame is None or len(frame) == 0:
+        for symbol in symbols:
+            errors.update({symbol: error(symbol, failed.get(symbol))})
+        return results, errors
+    names = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+    if frame.columns.nlevels == 1:
+        # Single symbol downloads may come without the symbol level
+        frame = frame.copy()
+        frame.columns = [(x, symbols[0]) for x in frame.columns]
+    columns = [(name, symbol) for name in names for symbol in symbols]
+    available = set(frame.columns.to_list())
+    if "Adj Close" not in {x[0] for x in available}:
+        # Adjusted downloads have no adjusted close; close is read in its place
+        columns = [("Close" if x[0] == "Adj Close" else x[0], x[1]) for x in columns]
+    missing = [x for x in columns if x not in available]
+    frame = frame.reindex(columns=columns) if missing else frame[columns]
+    # One float block, transposed so rows are (field, symbol) series in date order
+    block = np.ascontiguousarray(frame.to_numpy(dtype=float).T).reshape(len(names), len(symbols), len(frame))
+    opn, high, low, close, adj_close, vol = block
+    adj = np.ones(close.shape)
+    np.divide(adj_close, close, out=adj, where=(adj_close != close) & (adj_close > 0) & (close > 0))
+    opn *= adj
+    high *= adj
+    low *= adj
+    close *= adj
+    vol /= adj
+    dates = frame.index.to_numpy().astype("datetime64[D]")
+    for j, symbol in enumerate(symbols):
+        rows = np.flatnonzero(~np.isnan(close[j]) & ~np.isnan(high[j]) & ~np.isnan(low[j]))
+        if len(rows) < 1:
+            errors.update({symbol: error(symbol, failed.get(symbol))})
+            continue
+        # Bars normally run unbroken from the first to the last, so a slice keeps them as views
+        index = slice(rows[0], rows[-1] + 1) if rows[-1] - rows[0] + 1 == len(rows) else rows
+        results.update({symbol: {
+            "date": dates[index],
+            "open": opn[j][index],
+            "high": high[j][index],
+            "low": low[j][index],
+            "close": close[j][index],
+            "volume": np.nan_to_num(vol[j][index]),
+        }})
+    return results, errors
+
+def error(symbol, message=None):
+    # Returns the error for <symbol> given the message the provider reported
+    message = str(message) if message else f"No data returned for {symbol}"
+    if any(x in message.lower() for x in ("delisted", "not found", "no data found", "invalid")):
+        return UnknownSymbol(message)
+    return Exception(message)
+
+class Fixtures(Provider):
+    name = "fixtures"
+
+    def __init__(self, directory, **kwargs):
+        # Serves bars from <directory>, which holds one <SYMBOL>.csv file per symbol with
+        # date, open, high, low, close and volume columns (see write_fixture) for offline use
+        # Accepts optional int keyword argument <recent_bars> for recent requests (default 100)
+        self.directory = directory
+        self.recent_bars = kwargs.get('recent_bars') if kwargs.get('recent_bars') else 100
+        self.requests = []
+
+    def daily(self, symbols, **kwargs):
+        results, errors = {}, {}
+        for symbol in symbols:
+            self.requests.append((symbol, "recent" if kwargs.get('recent') else "full"))
+            data = read_fixture(f"{self.directory}/{symbol}.csv")
+            if data is None:
+                errors.update({symbol: UnknownSymbol(f"No fixture for {symbol}")})
+                continue
+            if kwargs.get('recent'):
+                data = {k: v[-self.recent_bars:] for k,v in data.items()}
+            results.update({symbol: data})
+        return results, errors
+
+def write_fixture(data, file):
+    # Saves the chronological bar arrays in <data> as a fixture CSV <file>
+    # Returns True when successful
+    rows = [FIELDS] + [
+        [str(data['date'][i])] + [repr(float(data[k][i])) for k in FIELDS[1:]]
+        for i in range(len(data['date']))
+    ]
+    return fsops.write_file(rows, file, type="csv")
+
+def read_fixture(file):
+    # Returns the chronological bar arrays saved in fixture CSV <file>, or None if it cannot be read
+    rows = fsops.read_file(file, type="csv", silent=True)
+    if type(rows) is not list or len(rows) < 1:
+        return None
+    header, rows = rows[0], rows[1:]
+    data = {"date": np.array([x[header.index("date")] for x in rows], dtype="datetime64[D]")}
+    for k in FIELDS[1:]:
+        data.update({k: np.array([float(x[header.index(k)]) for x in rows])})
+    return data
+
+def from_name(name, **kwargs):
+    # Returns the provider called <name>: "alphavantage" or "alphavantage:<apikey>" for free keys,
+    # "alphavantage-premium:<apikey>" for premium keys, "yfinance", or "fixtures:<directory>"
+    # Any keyword arguments are passed to the provider
+    if name and name.startswith("fixtures:"):
+        return Fixtures(name.split(":", 1)[1], **kwargs)
+    if name == "yfinance":
+        return YFinance(**kwargs)
+    if name in (None, "", "alphavantage"):
+        return AlphaVantage(**kwargs)
+    if name.startswith("alphavantage:"):
+        return AlphaVantage(**dict(kwargs, apikey=name.split(":", 1)[1]))
+    if name.startswith("alphavantage-premium:"):
+        return AlphaVantage(**dict(kwargs, apikey=name.split(":", 1)[1], premium=True))
+    raise ValueError(f"Unknown provider: {name}")
@@ -0,0 +1,32 @@
+# module for building longer bars from a base series of daily bars
+# import third-party modules
+import numpy as np
+
+TIMEFRAMES = ["daily", "weekly", "monthly"]
+
+def periods(dates, timeframe):
+    # Returns the number of the day, Monday-based week, or month containing each date in <dates>
+    # 1970-01-01 was a Thursday, so shifting by 3 days puts week boundaries on Mondays
+    days = np.asarray(dates).astype('datetime64[D]')
+    if timeframe == "weekly":
+        return (days.astype(np.int64) + 3) // 7
+    if timeframe == "monthly":
+        return days.astype('datetime64[M]').astype(np.int64)
+    return days.astype(np.int64)
+
+def resample(data, timeframe):
+    # <data> should be a dict of chronological "date", "open", "high", "low", "close" and "volume" arrays
+    # Returns a dict of the same arrays with one bar per <timeframe> period, dated by its last bar
+    keys = periods(data['date'], timeframe)
+    if timeframe == "daily" or len(keys) < 1:
+        return {k: data[k] for k in ["date", "open", "high", "low", "close", "volume"]}
+    starts = np.flatnonzero(np.diff(keys, prepend=keys[0] - 1))
+    ends = np.append(starts[1:], len(keys)) - 1
+    return {
+        "date": data['date'][ends],
+        "open": data['open'][starts],
+        "high": np.maximum.reduceat(data['high'], starts),
+        "low": np.minimum.reduceat(data['low'], starts),
+        "close": data['close'][ends],
+        "volume": np.add.reduceat(data['volume'], starts),
+    }
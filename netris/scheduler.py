@@ -0,0 +1,93 @@
+# module for running jobs in the background at set times of the trading day
+# import third-party modules
+import threading
+import traceback
+from datetime import datetime
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+# Import internal modules
+from netris import fsops
+
+class Scheduler:
+    def __init__(self, job, times, **kwargs):
+        # Runs callable <job> on a daemon thread at each "HH:MM" time in <times>
+        # Accepts optional keyword arguments <tz> (default "America/New_York") for the
+        # zone <times> are in, <weekdays> (default Monday to Friday, 0-4) to run on, and
+        # <lock>, the path of a lock file electing one scheduler to run the job when several
+        # processes share it; the others wait and take over if the holder exits
+        # Runs never overlap; a run that is still going when the next time passes
+        # delays that run until it finishes
+        self.job = job
+        self.times = sorted(tuple(int(x) for x in t.split(':')) for t in times)
+        self.tz = ZoneInfo(kwargs.get('tz') if kwargs.get('tz') else "America/New_York")
+        self.weekdays = kwargs.get('weekdays') if kwargs.get('weekdays') is not None else range(5)
+        self.lock = kwargs.get('lock')
+        self.handle = None
+        self.stopped = threading.Event()
+        self.thread = None
+        self.last_run = None
+        self.last_error = None
+
+    def next_run(self, now=None):
+        # Returns the next scheduled run after <now> as an aware datetime, or None if nothing is scheduled
+        now = now if now else datetime.now(self.tz)
+        for day in range(8):
+            date = (now + timedelta(days=day)).date()
+            if date.weekday() not in self.weekdays:
+                continue
+            for hour, minute in self.times:
+                run = datetime(date.year, date.month, date.day, hour, minute, tzinfo=self.tz)
+                if run > now:
+                    return run
+        return None
+
+    def run(self):
+        # Runs the job once, recording when it finished and any error it raised
+        # Returns True if the job completed
+        try:
+            self.job()
+            self.last_error = None
+            return True
+        except Exception as e:
+            self.last_error = e
+            traceback.print_exc()
+            return False
+        finally:
+            self.last_run = datetime.now(self.tz)
+
+    def start(self, run_now=False):
+        # Starts the scheduling thread, running the job immediately first when <run_now> is True
+        # Returns False if already running
+        if self.thread and self.thread.is_alive():
+            return False
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.loop, args=(run_now,), name="scheduler", daemon=True)
+        self.thread.start()
+        return True
+
+    def loop(self, run_now):
+        while self.lock and self.handle is None and not self.stopped.is_set():
+            self.handle = fsops.lock_file(self.lock, blocking=False)
+            if self.handle is None:
+                self.stopped.wait(60)
+        if run_now and not self.stopped.is_set():
+            self.run()
+        while not self.stopped.is_set():
+            run = self.next_run()
+            if run is None:
+                break
+            # Sleep in bounded steps so clock changes and stop requests are noticed
+            while not self.stopped.is_set() and datetime.now(self.tz) < run:
+                self.stopped.wait(min(60, max(0, (run - datetime.now(self.tz)).total_seconds())))
+            if not self.stopped.is_set():
+                self.run()
+        if self.handle:
+            fsops.unlock_file(self.handle)
+            self.handle = None
+
+    def stop(self, timeout=None):
+        # Stops the scheduling thread after any run in progress completes
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout)
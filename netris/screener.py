@@ -0,0 +1,111 @@
+# module for screening every stored symbol with the analyzer's buy signal rule
+# import third-party modules
+import math
+import os
+import threading
+from contextlib import nullcontext
+import numpy as np
+
+# Import internal modules
+from netris import batch
+from netris import fsops
+from netris import store
+
+COLUMNS = ["date", "value", "rsi", "macd", "signal", "buy_signal"]
+
+# Fields of each screened row that results can be sorted by
+SORT_KEYS = ["symbol", "date", "value", "buy", "bars_since_buy", "rsi", "macd", "signal", "macd_distance", "macd_distance_pct"]
+
+def scan(root, symbols, window, key=None, locks=None):
+    # Returns a list of screened rows for <symbols> stored under <root>, looking back
+    # <window> bars for the latest buy signal; symbols that cannot be read are skipped
+    # <key> is the Fernet key of an encrypted store
+    # <locks> is an optional directory of "<symbol>.lock" files shared while each symbol is read,
+    # for stores whose writers overwrite rows in place under those locks
+    db = store.Store(root, key)
+    rows = []
+    for symbol in symbols:
+        try:
+            with fsops.locked(f"{locks}/{symbol}.lock", shared=True) if locks else nullcontext():
+                data = db.tail(symbol, COLUMNS, window)
+        except (OSError, ValueError):
+            continue
+        if not data or len(data['date']) < 1:
+            continue
+        buys = np.flatnonzero(data['buy_signal'] > 0)
+        value, macd, signal, rsi = (batch.number(data[k][-1]) for k in ("value", "macd", "signal", "rsi"))
+        distance = macd - signal if macd is not None and signal is not None else None
+        rows.append({
+            "symbol": symbol,
+            "date": str(data['date'][-1]),
+            "value": value,
+            "buy": bool(data['buy_signal'][-1] > 0),
+            "bars_since_buy": int(len(data['date']) - 1 - buys[-1]) if len(buys) else None,
+            "rsi": rsi,
+            "macd": macd,
+            "signal": signal,
+            "macd_distance": distance,
+            "macd_distance_pct": distance / value * 100 if distance is not None and value else None,
+        })
+    return rows
+
+def rank(row):
+    # Sort key putting current buy signals first, then recent ones, then the widest
+    # MACD lead over its signal line as a share of price
+    return (
+        not row['buy'],
+        row['bars_since_buy'] if row['bars_since_buy'] is not None else math.inf,
+        -row['macd_distance_pct'] if row['macd_distance_pct'] is not None else math.inf,
+    )
+
+class Screener:
+    def __init__(self, **kwargs):
+        # Screens stores in parallel on a process pool shared by every screen
+        # Accepts optional int keyword arguments <workers> (default the number of CPUs),
+        # <window> bars searched for the latest buy signal (default 20), and <serial_below>,
+        # the universe size under which screening runs in this process (default 200), and optional
+        # keyword arguments <key>, the Fernet key of encrypted stores, and <locks>, the directory
+        # of lock files shared while reading each symbol (see scan)
+        self.workers = kwargs.get('workers') if kwargs.get('workers') else os.cpu_count() or 1
+        self.window = kwargs.get('window') if kwargs.get('window') else 20
+        self.serial_below = kwargs.get('serial_below') if kwargs.get('serial_below') is not None else 200
+        self.key = kwargs.get('key')
+        self.locks = kwargs.get('locks')
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def executor(self):
+        # Returns the process pool, started on first use
+        with self.lock:
+            if self.pool is None:
+                self.pool = batch.process_pool(self.workers)
+            return self.pool
+
+    def screen(self, root, **kwargs):
+        # Screens every symbol stored under <root>, a store.Store directory, or only
+        # the symbols in optional list keyword argument <symbols>
+        # Accepts optional keyword arguments <buy_only> (bool), <sort> (one of SORT_KEYS,
+        # descending when prefixed with "-"; default ranks by rank()), and <limit> (int)
+        # Returns a list of row dicts
+        symbols = kwargs.get('symbols') if kwargs.get('symbols') else fsops.list_dir(root) or []
+        if len(symbols) < max(self.serial_below, 1) or self.workers < 2:
+            rows = scan(root, symbols, self.window, self.key, self.locks)
+        else:
+            # Some symbols are slower to read than others, so each worker takes a few chunks
+            chunks = batch.chunks(symbols, self.workers)
+            parts = self.executor().map(scan, [root] * len(chunks), chunks, [self.window] * len(chunks), [self.key] * len(chunks), [self.locks] * len(chunks))
+            rows = [x for part in parts for x in part]
+        if kwargs.get('buy_only'):
+            rows = [x for x in rows if x['buy']]
+        sort = kwargs.get('sort')
+        if sort and sort.lstrip("-") in SORT_KEYS:
+            key = sort.lstrip("-")
+            rows = batch.ordered(rows, lambda x: x[key], sort.startswith("-"))
+        else:
+            rows = sorted(rows, key=rank)
+        return rows[:kwargs.get('limit')] if kwargs.get('limit') else rows
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
@@ -0,0 +1,228 @@
+# module for per-symbol columnar storage of time-series data
+# Each symbol is stored as a directory holding one NumPy .npy file per column
+# and a meta.json file recording the row count, column names and any extra fields
+# import third-party modules
+import os
+import io
+import numpy as np
+from numpy.lib import format as npformat
+
+# Import internal modules
+from netris import fsops
+from netris import metrics
+
+BYTES_WRITTEN = metrics.REGISTRY.counter("netris_store_bytes_written_total", "Bytes of column data written to stores", ("operation",))
+
+def locate(dates, start=None, end=None):
+    # Returns a tuple of (first, stop) positions of the rows of sorted datetime64 array <dates>
+    # dated from <start> to <end>, both inclusive and either open when None; the bounds may be
+    # dates, datetimes or strings of any precision and are compared without truncating them
+    first, stop = 0, len(dates)
+    if start is not None:
+        start = np.datetime64(start)
+        bound = start.astype(dates.dtype)
+        first = np.searchsorted(dates, bound + 1 if bound < start else bound, side="left")
+    if end is not None:
+        stop = np.searchsorted(dates, np.datetime64(end).astype(dates.dtype), side="right")
+    return first, stop
+
+class Store:
+    def __init__(self, root, key=None):
+        # Stores symbols under directory <root>
+        # <key> is an optional Fernet key (see fsops.get_key) to encrypt every file at rest;
+        # encrypted columns are decrypted into memory rather than memory-mapped, and appending
+        # to them rewrites the columns
+        self.root = root
+        self.key = key
+        fsops.create_dir(root)
+
+    def path(self, symbol, file=None):
+        # Returns the path to the directory for <symbol>, or to <file> within it
+        return f"{self.root}/{symbol}/{file}" if file else f"{self.root}/{symbol}"
+
+    def symbols(self):
+        # Returns a list of stored symbols
+        return [x for x in fsops.list_dir(self.root) or [] if self.meta(x) is not None]
+
+    def meta(self, symbol):
+        # Returns the meta dict for <symbol>, or None if <symbol> is not stored
+        meta = fsops.read_file(self.path(symbol, "meta.json"), type="json", key=self.key, silent=True)
+        return meta if type(meta) is dict else None
+
+    def read(self, symbol, columns=None):
+        # Returns a dict of read-only memory-mapped arrays for <columns> of <symbol>
+        # All columns are returned when <columns> is not set; returns None if <symbol> is not stored
+        meta = self.meta(symbol)
+        if meta is None:
+            return None
+        rows = meta.get('rows')
+        data = {}
+        for col in columns if columns else meta.get('columns'):
+            file = self.path(symbol, f"{col}.npy")
+            if self.key:
+                data.update({col: self.decrypt(file)[:rows]})
+                continue
+            # Empty files cannot be memory-mapped
+            arr = np.load(file, mmap_mode='r') if rows > 0 else np.load(file)
+            data.update({col: arr[:rows]})
+        return data
+
+    def query(self, symbol, columns=None, start=None, end=None, last=None):
+        # Returns a dict of arrays of <columns> of <symbol> for the rows dated from <start> to <end>,
+        # both inclusive and either open when not set, or None if <symbol> is not stored
+        # <last> is an optional np.timedelta64, such as np.timedelta64(26, 'W'), to return the rows
+        # dated within that long of the last stored date instead of from <start>; the bound is
+        # exclusive, so 26 weeks of weekly bars are 26 rows
+        # Rows are found by binary search of the sorted "date" column and the columns are sliced
+        # while memory-mapped, so only the pages holding those rows are read
+        data = self.read(symbol, list(dict.fromkeys(["date"] + list(columns))) if columns else None)
+        if data is None:
+            return None
+        dates = data['date']
+        if last is not None and len(dates) > 0:
+            # One unit of the dates after the bound, which leaves out a row dated exactly on it
+            start = dates[-1] - last + 1
+        first, stop = locate(dates, start, end)
+        return {k: v[first:stop] for k,v in data.items() if not columns or k in columns}
+
+    def tail(self, symbol, columns=None, rows=1):
+        # Returns a dict of arrays holding the last <rows> rows of <columns> of <symbol>,
+        # read directly from the end of each file, which is cheaper than mapping whole columns
+        # All columns are returned when <columns> is not set; returns None if <symbol> is not stored
+        meta = self.meta(symbol)
+        if meta is None:
+            return None
+        stored = meta.get('rows')
+        count = min(rows, stored)
+        data = {}
+        if self.key:
+            return {k: v[stored-count:] for k,v in self.read(symbol, columns).items()}
+        for col in columns if columns else meta.get('columns'):
+            with open(self.path(symbol, f"{col}.npy"), "rb") as npy_file:
+                version = npformat.read_magic(npy_file)
+                if version == (1, 0):
+                    shape, fortran, dtype = npformat.read_array_header_1_0(npy_file)
+                else:
+                    shape, fortran, dtype = npformat.read_array_header_2_0(npy_file)
+                npy_file.seek((stored - count) * dtype.itemsize, os.SEEK_CUR)
+                data.update({col: np.frombuffer(npy_file.read(count * dtype.itemsize), dtype=dtype)})
+        return data
+
+    def write(self, symbol, data, **kwargs):
+        # Replaces all stored data for <symbol> with <data>, a dict of equal length arrays
+        # Any keyword arguments are saved to the meta file
+        # Returns True when successful
+        fsops.create_dir(self.path(symbol))
+        with fsops.locked(self.lock(symbol)):
+            return self.replace(symbol, data, **kwargs)
+
+    def lock(self, symbol):
+        # Returns the path of the lock file writers of <symbol> take turns on
+        return self.path(symbol, "write.lock")
+
+    def replace(self, symbol, data, **kwargs):
+        # Does write() for a caller holding the lock of <symbol>
+        for col, arr in data.items():
+            if not self.save(self.path(symbol, f"{col}.npy"), arr):
+                return False
+        meta = dict(kwargs, rows=len(next(iter(data.values()))), columns=list(data.keys()))
+        return fsops.write_file(meta, self.path(symbol, "meta.json"), type="json", key=self.key)
+
+    def save(self, file, arr):
+        # Replaces column <file> with <arr> through a temporary file renamed into place, so readers
+        # see the old or the new column, never a partly written one; returns True when successful
+        if self.key:
+            content = io.BytesIO()
+            np.save(content, np.ascontiguousarray(arr))
+            if not fsops.write_file(content.getbuffer(), file, type="bytes", key=self.key):
+                return False
+        else:
+            with fsops.replacing(file) as npy_file:
+                np.save(npy_file, np.ascontiguousarray(arr))
+        BYTES_WRITTEN.inc(np.asarray(arr).nbytes, operation="write")
+        return True
+
+    def decrypt(self, file):
+        # Returns the read-only array saved in encrypted column <file>
+        arr = np.load(io.BytesIO(fsops.read_file(file, type="bytes", key=self.key)))
+        arr.setflags(write=False)
+        return arr
+
+    def append(self, symbol, data, start=None, **kwargs):
+        # Appends the rows in <data> to the stored columns of <symbol> in place;
+        # the .npy headers are rewritten with the new shape without rewriting existing rows
+        # When <start> is set, stored rows from that row onward are overwritten in place by <data>,
+        # so callers replacing rows should keep readers out meanwhile, as the analyzer does with
+        # its ticker locks
+        # Any keyword arguments are merged into the meta file
+        # Returns True when successful
+        fsops.create_dir(self.path(symbol))
+        with fsops.locked(self.lock(symbol)):
+            meta = self.meta(symbol)
+            if meta is None or set(data.keys()) != set(meta.get('columns')):
+                return self.replace(symbol, data, **kwargs)
+            rows = meta.get('rows') if start is None else min(start, meta.get('rows'))
+            if self.key:
+                # Encrypted columns cannot be written in place, so they are rewritten whole
+                stored = self.read(symbol)
+                meta.update(kwargs)
+                fields = {k: v for k,v in meta.items() if k not in ("rows", "columns")}
+                return self.replace(symbol, {k: np.concatenate((stored[k][:rows], np.asarray(v, dtype=stored[k].dtype))) for k,v in data.items()}, **fields)
+            return self.extend(symbol, meta, data, rows, **kwargs)
+
+    def extend(self, symbol, meta, data, rows, **kwargs):
+        # Does append() from row <rows> for a caller holding the lock of <symbol>; rows past
+        # those stored are only counted once <meta> is saved with them, so readers never see them
+        # half written
+        added = len(next(iter(data.values())))
+        for col, arr in data.items():
+            file = self.path(symbol, f"{col}.npy")
+            with open(file, "r+b") as npy_file:
+                version = npformat.read_magic(npy_file)
+                if version == (1, 0):
+                    shape, fortran, dtype = npformat.read_array_header_1_0(npy_file)
+                else:
+                    shape, fortran, dtype = npformat.read_array_header_2_0(npy_file)
+                offset = npy_file.tell()
+                header = io.BytesIO()
+                header_data = {
+                    "descr": npformat.dtype_to_descr(dtype),
+                    "fortran_order": False,
+                    "shape": (rows + added,),
+                }
+                if version == (1, 0):
+                    npformat.write_array_header_1_0(header, header_data)
+                else:
+                    npformat.write_array_header_2_0(header, header_data)
+                if len(header.getvalue()) != offset:
+                    # Header outgrew its padding, rewrite the whole column
+                    combined = np.concatenate((np.load(file)[:rows], np.asarray(arr, dtype=dtype)))
+                    npy_file.close()
+                    self.save(file, combined)
+                    continue
+                # Write from row <rows>, discarding any rows after the new ones, such as those
+                # left by an interrupted append
+                npy_file.seek(offset + rows * dtype.itemsize)
+                npy_file.write(np.ascontiguousarray(arr, dtype=dtype).tobytes())
+                BYTES_WRITTEN.inc(len(arr) * dtype.itemsize, operation="append")
+                npy_file.truncate()
+                npy_file.seek(0)
+                npy_file.write(header.getvalue())
+        meta.update(kwargs)
+        meta.update(rows=rows + added)
+        return fsops.write_file(meta, self.path(symbol, "meta.json"), type="json", key=self.key)
+
+    def remove(self, symbol):
+        # Removes all stored data for <symbol>
+        # Returns True when successful
+        files = fsops.list_dir(self.path(symbol))
+        if files is None:
+            return False
+        for file in files:
+            fsops.remove_file(self.path(symbol, file))
+        try:
+            os.rmdir(self.path(symbol))
+        except:
+            return False
+        else:
+            return True
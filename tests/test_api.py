@@ -0,0 +1,101 @@
+# Tests of the JSON batch analysis API at /api/analysis, served from bars refreshed from fixtures
+# import third-party modules
+import gzip
+import json
+import time
+from datetime import datetime
+import numpy as np
+import pytest
+
+# Import internal modules
+import analyzer
+from netris import fsops
+from netris import indicators
+from netris import providers
+from netris import store
+from tests.test_panel import bars
+
+def days(count):
+    # Returns the <count> weekdays ending yesterday, so refreshed fixtures count as recent bars
+    end = np.datetime64(datetime.now().date()) - 1
+    return np.busday_offset(end, -np.arange(count)[::-1], roll="backward")
+
+@pytest.fixture
+def app(tmp_path):
+    for i, symbol in enumerate(("AAA", "BBB")):
+        providers.write_fixture(bars(days(600), i), str(tmp_path / f"{symbol}.csv"))
+    app = analyzer.create_app(data_dir=str(tmp_path / "data"), provider=providers.Fixtures(str(tmp_path)))
+    app.fixtures = tmp_path
+    return app
+
+def get(app, headers=None, **args):
+    return app.server.test_client().get("/api/analysis", query_string=args, headers=headers or {})
+
+def test_results_beside_errors(app):
+    response = get(app, symbols="AAA,ZZZ,BBB", indicators="rsi", refresh=1)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert list(data['results']) == ["AAA", "BBB"]
+    assert list(data['results']['AAA']) == ["date", "rsi"]
+    assert "No fixture for ZZZ" in data['errors']['ZZZ']
+    # Tickers never stored are reported without refreshing them
+    data = get(app, symbols="AAA,CCC").get_json()
+    assert list(data['results']) == ["AAA"]
+    assert "refresh=1" in data['errors']['CCC']
+
+def test_not_modified(app):
+    first = get(app, symbols="AAA", refresh=1)
+    tag, modified = first.headers['ETag'], first.headers['Last-Modified']
+    assert get(app, {"If-None-Match": tag}, symbols="AAA").status_code == 304
+    assert get(app, {"If-Modified-Since": modified}, symbols="AAA").status_code == 304
+    # Other options are another resource
+    assert get(app, {"If-None-Match": tag}, symbols="AAA", latest=1).status_code == 200
+
+def test_same_day_refresh_is_modified(app, tmp_path):
+    first = get(app, symbols="AAA", refresh=1, latest=1)
+    # The last bar of the day is replaced under the same date later the same day
+    data = providers.read_fixture(str(app.fixtures / "AAA.csv"))
+    data['high'][-1] = data['high'][-1] * 1.1
+    providers.write_fixture(data, str(app.fixtures / "AAA.csv"))
+    db = store.Store(str(tmp_path / "data" / "daily"))
+    meta = dict(db.meta("AAA"), updated="")
+    fsops.write_file(meta, db.path("AAA", "meta.json"), type="json")
+    # Last-Modified has a resolution of one second
+    time.sleep(1.1)
+    second = get(app, {"If-Modified-Since": first.headers['Last-Modified']}, symbols="AAA", refresh=1, latest=1, timeframe="daily")
+    assert second.status_code == 200
+    assert second.get_json()['results']['AAA']['high'] == data['high'][-1]
+    assert second.last_modified > first.last_modified
+
+def test_gzip(app):
+    plain = get(app, symbols="AAA,BBB", refresh=1)
+    packed = get(app, {"Accept-Encoding": "gzip"}, symbols="AAA,BBB")
+    assert packed.headers['Content-Encoding'] == "gzip"
+    assert "Accept-Encoding" in packed.headers['Vary']
+    assert json.loads(gzip.decompress(packed.data)) == plain.get_json()
+
+def test_weeks(app):
+    get(app, symbols="AAA", refresh=1)
+    weekly = get(app, symbols="AAA", weeks=30, indicators="high").get_json()['results']['AAA']
+    assert len(weekly['date']) == 30
+    daily = get(app, symbols="AAA", weeks=1, timeframe="daily", indicators="high").get_json()['results']['AAA']
+    dates = np.array(daily['date'], dtype="datetime64[D]")
+    # Daily bars of the week of the last bar, from its Monday
+    assert 1 <= len(dates) <= 5
+    assert dates[0] == np.busday_offset(dates[-1], 0, roll="backward", weekmask="Mon")
+    assert get(app, symbols="AAA", weeks="many").status_code == 400
+
+@pytest.mark.parametrize("value", ["0", "1001", "2.5", "abc"])
+def test_parameter_validation(app, value):
+    response = get(app, **{"symbols": "AAA", "rsi.dur": value})
+    assert response.status_code == 400
+    assert "rsi.dur" in response.get_json()['error']
+
+def test_parameters(app):
+    get(app, symbols="AAA", refresh=1)
+    data = get(app, **{"symbols": "AAA", "timeframe": "daily", "indicators": "high,low,rsi", "rsi.dur": 7}).get_json()
+    assert data['params'] == {"rsi": {"dur": 7}}
+    cols = data['results']['AAA']
+    expected = indicators.rsi((np.array(cols['high']) + np.array(cols['low'])) / 2, 7)
+    np.testing.assert_allclose(np.array(cols['rsi'], dtype=float), expected, equal_nan=True)
+    assert get(app, **{"symbols": "AAA", "rsi.size": 7}).status_code == 400
@@ -0,0 +1,101 @@
+# Tests of netris.fetch against a local stub HTTP server
+# import third-party modules
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import pytest
+import requests
+
+# Import internal modules
+from netris import fetch
+
+class Handler(BaseHTTPRequestHandler):
+    # Answers /<status>/<failures>/<name>: <status> for the first <failures> requests of <name>,
+    # then 200 with a JSON body; /slow/<seconds>/<name> answers after <seconds>
+    def do_GET(self):
+        kind, count, name = self.path.strip("/").split("/")
+        with self.server.lock:
+            self.server.calls[name] = self.server.calls.get(name, 0) + 1
+            calls = self.server.calls[name]
+        if kind == "slow":
+            time.sleep(float(count))
+        elif calls <= int(count):
+            self.send_response(int(kind))
+            self.end_headers()
+            return
+        body = json.dumps({"name": name, "calls": calls}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve(handler):
+    # Returns a local server answering with <handler> on a background thread, counting calls by name
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    httpd.daemon_threads = True
+    httpd.calls = {}
+    httpd.lock = threading.Lock()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    return httpd
+
+@pytest.fixture
+def server():
+    httpd = serve(Handler)
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def fetcher(**kwargs):
+    return fetch.Fetcher(**dict({"retries": 2, "backoff": 0.01, "timeout": 1}, **kwargs))
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_get_retries_rate_limits_and_server_errors(server, status):
+    result = fetcher().get(f"{server.url}/{status}/2/a")
+    assert result == {"name": "a", "calls": 3}
+
+def test_get_raises_when_retries_are_exhausted(server):
+    with pytest.raises(requests.HTTPError) as e:
+        fetcher().get(f"{server.url}/503/5/a")
+    assert e.value.response.status_code == 503
+    assert server.calls["a"] == 3
+
+def test_get_does_not_retry_client_errors(server):
+    with pytest.raises(requests.HTTPError):
+        fetcher().get(f"{server.url}/404/5/a")
+    assert server.calls["a"] == 1
+
+def test_get_retries_timeouts(server):
+    with pytest.raises(requests.Timeout):
+        fetcher(timeout=0.2, retries=1).get(f"{server.url}/slow/1/a")
+    assert server.calls["a"] == 2
+
+def test_get_many_returns_results_beside_failures(server):
+    results, errors = fetcher(workers=4, timeout=0.3).get_many({
+        "ok": (f"{server.url}/200/0/ok", None),
+        "flaky": (f"{server.url}/500/1/flaky", None),
+        "missing": (f"{server.url}/404/9/missing", None),
+        "down": (f"{server.url}/503/9/down", None),
+        "slow": (f"{server.url}/slow/1/slow", None),
+    })
+    assert results == {"ok": {"name": "ok", "calls": 1}, "flaky": {"name": "flaky", "calls": 2}}
+    assert set(errors) == {"missing", "down", "slow"}
+    assert isinstance(errors["slow"], requests.Timeout)
+
+def test_get_many_of_nothing():
+    assert fetcher().get_many({}) == ({}, {})
+
+def test_rate_limiter_spaces_calls():
+    limiter = fetch.RateLimiter(5, per=0.5)
+    start = time.monotonic()
+    for i in range(10):
+        limiter.wait()
+    # The first 5 calls are allowed at once, the other 5 take about 0.5 seconds
+    assert time.monotonic() - start >= 0.4
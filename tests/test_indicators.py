@@ -0,0 +1,176 @@
+# Parity tests of netris.indicators against the pandas implementation it replaced
+# The reference functions below are the analyzer's original format_data calculations, which
+# worked on frames ordered newest first; results are reversed to compare them chronologically
+# import third-party modules
+import numpy as np
+import pandas as pd
+import pytest
+
+# Import internal modules
+from netris import indicators
+
+def bars(n, seed=0):
+    # Returns chronological <n> bar "high", "low" and "volume" arrays priced in cents, as providers return them
+    rng = np.random.default_rng(seed)
+    close = rng.uniform(10, 500) * np.exp(np.cumsum(rng.normal(0, .02, n)))
+    spread = np.abs(rng.normal(0, .01, n))
+    return {
+        "high": np.round(close * (1 + spread), 2),
+        "low": np.round(close * (1 - spread), 2),
+        "volume": rng.integers(1000, 5000000, n).astype(float),
+    }
+
+def get_wma(vals):
+    weights = [i+1 for i in range(len(vals))]
+    return sum(weights * vals) / sum(weights)
+
+def get_rsi(df, dur=14):
+    delta = df['value'][::-1].diff()
+    up = delta.clip(lower=0).round(2)
+    down = delta.clip(upper=0).abs().round(2)
+    ma_up = up.rolling(dur).mean()
+    ma_down = down.rolling(dur).mean()
+    rs = ma_up / ma_down
+    rsi = 100 - (100 / (1 + rs ))
+    df['rsi'] = df.index.map(rsi)
+
+def get_obv(df):
+    delta = df['value'][::-1].diff()
+    adj = delta.clip(lower=0.01, upper=-0.01).round(2) * 100
+    obv = df['volume'][::-1].astype(int) * adj
+    df['obv'] = df.index.map(obv.cumsum())
+
+def get_macd(df, fast=12, slow=26, sig=9):
+    fast_ema = df['value'][::-1].ewm(span=fast, min_periods=fast).mean()
+    slow_ema = df['value'][::-1].ewm(span=slow, min_periods=slow).mean()
+    macd = fast_ema - slow_ema
+    signal = macd.ewm(span=sig, min_periods=sig).mean()
+    df['macd'] = df.index.map(macd)
+    df['signal'] = df.index.map(signal)
+
+def get_buy_sig(df):
+    buy_sig = []
+    for i, row in df.iterrows():
+        if (
+            sum(df['macd'][i-7:i]) / 7 < row['signal'] and
+            abs(row['macd'] - row['signal']) < 1 and
+            row['rsi'] < 50
+        ):
+            buy_sig.append(row['value'])
+        else:
+            buy_sig.append(-1)
+    df['buy_signal'] = buy_sig
+
+def reference(data):
+    # Returns the original analyzer columns of the chronological bars in <data> as a dict of
+    # chronological arrays
+    df = pd.DataFrame({k: data[k][::-1] for k in ("high", "low", "volume")})
+    val = (df['high'] + df['low']) / 2
+    df['value'] = df.index.map(val)
+    lt_trend = df['value'][::-1].rolling(180).mean()
+    df['lt_trend'] = df.index.map(lt_trend)
+    trend_wma = df['value'][::-1].rolling(28).apply(get_wma)
+    df['trend_wma'] = df.index.map(trend_wma)
+    trend_signal = df['value'][::-1].ewm(span=14, min_periods=14).mean()
+    df['trend_signal'] = df.index.map(trend_signal)
+    get_macd(df)
+    get_rsi(df)
+    get_obv(df)
+    obv_trend = df['obv'][::-1].rolling(28).apply(get_wma)
+    df['obv_trend'] = df.index.map(obv_trend)
+    obv_signal = df['obv'][::-1].ewm(span=14, min_periods=14).mean()
+    df['obv_signal'] = df.index.map(obv_signal)
+    get_buy_sig(df)
+    return {k: df[k].to_numpy(dtype=float)[::-1] for k in df.columns}
+
+COLUMNS = [
+    "value", "lt_trend", "trend_wma", "trend_signal", "macd", "signal",
+    "rsi", "obv", "obv_trend", "obv_signal",
+]
+
+@pytest.mark.parametrize("n", [1, 2, 5, 6, 7, 8, 13, 27, 28, 40, 179, 180, 400])
+def test_analyze_matches_reference(n):
+    data = bars(n, seed=n)
+    expected = reference(data)
+    result = indicators.analyze(data['high'], data['low'], data['volume'])
+    for k in COLUMNS:
+        # NaN warm-up rows must fall on the same rows
+        np.testing.assert_allclose(result[k], expected[k], rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=k)
+
+@pytest.mark.parametrize("n", [1, 3, 6, 7, 8, 30, 60, 400])
+def test_buy_signal_matches_reference(n):
+    data = bars(n, seed=100 + n)
+    expected = reference(data)
+    result = indicators.analyze(data['high'], data['low'], data['volume'])
+    # Expected deviation: RSI is calculated from whole cents, so a window of equal gains and
+    # losses gives exactly 50 and no signal, where pandas' rolling means may land a rounding
+    # error either side of 50; those rows are left out
+    tie = np.abs(expected['rsi'] - 50) < 1e-6
+    np.testing.assert_array_equal(result['buy_signal'][~tie], expected['buy_signal'][~tie])
+
+def test_rsi_tie_is_exact():
+    # Gains and losses of one cent alternating give an RSI of exactly 50
+    value = np.tile([10.00, 10.01], 20)
+    rsi = indicators.rsi(value)
+    assert np.all(rsi[14:] == 50)
+    assert np.all(np.isnan(rsi[:14]))
+
+@pytest.mark.parametrize("n", [1, 5, 28, 100])
+def test_wma_matches_rolling_apply(n):
+    x = bars(n, seed=200 + n)['high']
+    for window in (1, 3, 28):
+        expected = pd.Series(x).rolling(window).apply(get_wma).to_numpy()
+        np.testing.assert_allclose(indicators.wma(x, window), expected, rtol=1e-12, equal_nan=True)
+
+@pytest.mark.parametrize("span,min_periods", [(9, 9), (12, 12), (14, 14), (26, 26), (180, 0)])
+def test_ema_matches_ewm(span, min_periods):
+    x = bars(3000, seed=span)['low']
+    # Missing values only decay the weights, as in pandas
+    x[[40, 41, 900]] = np.nan
+    expected = pd.Series(x).ewm(span=span, min_periods=min_periods).mean().to_numpy()
+    np.testing.assert_allclose(indicators.ema(x, span, min_periods), expected, rtol=1e-9, equal_nan=True)
+
+def test_ema_of_panel_matches_columns():
+    x = np.column_stack([bars(500, seed=i)['high'] for i in range(3)])
+    expected = np.column_stack([indicators.ema(x[:, j], 26, 26) for j in range(3)])
+    np.testing.assert_allclose(indicators.ema(x, 26, 26), expected, rtol=1e-12, equal_nan=True)
+
+def stored(data, rows):
+    # Returns the analyze() output of the first <rows> bars of <data> and its saved state,
+    # as the analyzer stores them
+    part = {k: v[:rows] for k,v in data.items()}
+    cols = indicators.analyze(part['high'], part['low'], part['volume'])
+    return cols, indicators.save_state(cols, rows - 1)
+
+@pytest.mark.parametrize("first,added", [(indicators.TAIL + 1, 1), (200, 2), (300, 40), (1000, 260)])
+def test_advance_matches_analyze(first, added):
+    data = bars(first + added, seed=first)
+    prev, state = stored(data, first)
+    # The last stored row is replaced along with the new ones
+    end = first - 1
+    cols, state = indicators.advance(
+        {k: v[end-indicators.TAIL:end] for k,v in prev.items()},
+        state, data['high'][end:], data['low'][end:], data['volume'][end:]
+    )
+    full = indicators.analyze(data['high'], data['low'], data['volume'])
+    for k in full:
+        np.testing.assert_allclose(cols[k], full[k][end-indicators.LOOKBACK:], rtol=1e-9, atol=1e-6, equal_nan=True, err_msg=k)
+
+def test_advance_state_continues():
+    # The state advance() returns continues the calculation like save_state() of a full analyze()
+    data = bars(700, seed=7)
+    prev, state = stored(data, 400)
+    end = 399
+    cols, state = indicators.advance(
+        {k: v[end-indicators.TAIL:end] for k,v in prev.items()},
+        state, data['high'][end:600], data['low'][end:600], data['volume'][end:600]
+    )
+    merged = {k: np.concatenate((prev[k][:end-indicators.LOOKBACK], v)) for k,v in cols.items()}
+    end = 599
+    cols, state = indicators.advance(
+        {k: v[end-indicators.TAIL:end] for k,v in merged.items()},
+        state, data['high'][end:], data['low'][end:], data['volume'][end:]
+    )
+    full = indicators.analyze(data['high'], data['low'], data['volume'])
+    for k in full:
+        np.testing.assert_allclose(cols[k], full[k][end-indicators.LOOKBACK:], rtol=1e-9, atol=1e-6, equal_nan=True, err_msg=k)
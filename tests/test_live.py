@@ -0,0 +1,122 @@
+# Tests of netris.live: running indicators against indicators.analyze(), bars built from ticks,
+# replayed feeds, and the engine reading a feed
+# import third-party modules
+import numpy as np
+
+# Import internal modules
+from netris import indicators
+from netris import live
+from tests.test_indicators import bars
+
+def test_stream_matches_analyze():
+    data = bars(600, 2)
+    expected = indicators.analyze(data['high'], data['low'], data['volume'])
+    stream = live.Stream()
+    rows, decided = [], []
+    for i in range(600):
+        # The row of a bar in progress is the one it is kept with
+        forming = stream.update(data['high'][i], data['low'][i], data['volume'][i])
+        rows.append(stream.update(data['high'][i], data['low'][i], data['volume'][i], commit=True))
+        np.testing.assert_array_equal([forming[k] for k in live.COLUMNS], [rows[-1][k] for k in live.COLUMNS])
+        if rows[-1]['buy_signal']:
+            decided.append(rows[-1]['buy_signal'][1])
+    for k in live.COLUMNS:
+        np.testing.assert_allclose([x[k] for x in rows], expected[k], rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=k)
+    # Buy signals are decided once LOOKBACK rows follow them
+    assert len(decided) == 600 - indicators.LOOKBACK
+    np.testing.assert_array_equal(decided, expected['buy_signal'][:len(decided)])
+
+def ticks(data, interval=60, start=1735799400):
+    # Returns (time, price, volume) ticks making up <data> as bars of <interval> seconds:
+    # for each bar a tick at its low, one at its high and one closing it between them
+    out = []
+    for i in range(len(data['high'])):
+        when = start + i * interval
+        out.append((when + 1, data['low'][i], data['volume'][i] / 2))
+        out.append((when + 20, data['high'][i], data['volume'][i] / 4))
+        out.append((when + 59, (data['high'][i] + data['low'][i]) / 2, data['volume'][i] / 4))
+    return out
+
+def test_series_matches_analyze_of_its_bars():
+    data = bars(600, 3)
+    series = live.Series(60, 1000)
+    for when, price, volume in ticks(data):
+        series.tick(when, price, volume)
+    changes = series.changes(0)
+    # The last bar is in progress until a tick of the next one arrives
+    assert len(changes['rows']) == 599
+    assert changes['forming']['high'] == data['high'][-1]
+    expected = indicators.analyze(data['high'][:599], data['low'][:599], data['volume'][:599])
+    for k in live.COLUMNS:
+        np.testing.assert_allclose([x[k] for x in changes['rows']], expected[k], rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=k)
+    np.testing.assert_allclose([x['volume'] for x in changes['rows']], data['volume'][:599])
+    buys = np.flatnonzero(expected['buy_signal'][:599 - indicators.LOOKBACK] > 0)
+    assert [x['date'] for x in changes['buys']] == [changes['rows'][i]['date'] for i in buys]
+
+def test_series_changes_are_keyed_by_feed_time():
+    data = bars(30, 4)
+    received = ticks(data)
+    first, second = live.Series(60, 100), live.Series(60, 100)
+    for tick in received:
+        first.tick(*tick)
+    # A series that has read fewer ticks has no rows after those the other returned,
+    # then returns the same rows once it catches up
+    for tick in received[:45]:
+        second.tick(*tick)
+    cursor = first.changes(0)['rows'][19]['time']
+    assert second.changes(cursor)['rows'] == []
+    for tick in received[45:]:
+        second.tick(*tick)
+    # NaN values compare unequal, their representations do not
+    assert repr(second.changes(cursor)) == repr(first.changes(cursor))
+    assert [x['time'] for x in first.changes(cursor)['rows']] == [1735799400 + i * 60 for i in range(20, 29)]
+
+def test_replay_loops_with_times_moving_forward(tmp_path):
+    file = str(tmp_path / "ticks.csv")
+    live.write_replay({
+        "symbol": np.array(["AAA", "BBB", "AAA"]),
+        "time": np.array([100., 101., 103.]),
+        "price": np.array([10., 20., 11.]),
+        "volume": np.array([1., 2., 3.]),
+    }, file)
+    now = [0.]
+    feed = live.Replay(file, loop=True, clock=lambda: now[0])
+    assert feed.ticks() == [("AAA", 100., 10., 1.)]
+    now[0] = 3.5
+    assert feed.ticks() == [("BBB", 101., 20., 2.), ("AAA", 103., 11., 3.)]
+    # Each cycle starts a second after the last tick of the one before
+    now[0] = 9
+    assert feed.ticks() == [("AAA", 104., 10., 1.), ("BBB", 105., 20., 2.), ("AAA", 107., 11., 3.), ("AAA", 108., 10., 1.), ("BBB", 109., 20., 2.)]
+    # Without looping the replay ends
+    once = live.Replay(file, clock=lambda: now[0])
+    assert len(once.ticks()) == 1
+    now[0] = 100
+    assert len(once.ticks()) == 2 and once.ticks() == []
+
+class Failing(live.Feed):
+    def __init__(self, failures):
+        self.failures = failures
+
+    def ticks(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Feed disconnected")
+        return [("AAA", 1735799400., 10., 1.)]
+
+def errors():
+    return sum(x[2] for x in live.FEED_ERRORS.samples())
+
+def test_engine_counts_feed_errors_and_recovers():
+    before = errors()
+    engine = live.Engine(Failing(3), poll=0.01)
+    engine.start()
+    try:
+        for i in range(500):
+            if engine.changes("AAA") is not None:
+                break
+            engine.stopped.wait(0.01)
+    finally:
+        engine.stop(1)
+    assert errors() - before == 3
+    assert engine.last_error is None
+    assert engine.changes("AAA")['forming']['high'] == 10.
@@ -0,0 +1,27 @@
+# Tests of netris.memo
+# import third-party modules
+import numpy as np
+
+# Import internal modules
+from netris import indicators
+from netris import memo
+from tests.test_indicators import bars
+
+def test_indicator_matches_indicators_and_is_reused():
+    data = bars(300, 1)
+    memoized = memo.Memo(1024 ** 2)
+    value = (data['high'] + data['low']) / 2
+    np.testing.assert_allclose(memoized.indicator("A", "daily", data, "rsi", "v1", dur=7), indicators.rsi(value, 7))
+    memoized.indicator("A", "daily", data, "rsi", "v1", dur=7)
+    assert memoized.computed == 1
+
+def test_new_version_of_the_same_bars_is_recalculated(tmp_path):
+    data = bars(300, 1)
+    memoized = memo.Memo(1024 ** 2, directory=str(tmp_path))
+    memoized.indicator("A", "daily", data, "rsi", "v1", dur=7)
+    # History rewritten before the last bar, such as by a split adjustment, keeps the row count
+    # and last bar but is stored under a new version
+    changed = dict(data, high=np.concatenate((data['high'][:-1] * 2, data['high'][-1:])))
+    result = memoized.indicator("A", "daily", changed, "rsi", "v2", dur=7)
+    assert memoized.computed == 2
+    np.testing.assert_allclose(result, indicators.rsi((changed['high'] + changed['low']) / 2, 7))
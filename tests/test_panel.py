@@ -0,0 +1,66 @@
+# Tests of netris.panel and the panels netris.backtest loads, with symbols on different calendars
+# import third-party modules
+import numpy as np
+import pytest
+
+# Import internal modules
+from netris import backtest
+from netris import fsops
+from netris import indicators
+from netris import panel
+from netris import store
+
+def bars(days, seed=0):
+    # Returns chronological bar arrays for every date in <days>
+    rng = np.random.default_rng(seed)
+    n = len(days)
+    close = rng.uniform(10, 500) * np.exp(np.cumsum(rng.normal(0, .02, n)))
+    spread = np.abs(rng.normal(0, .01, n))
+    return {
+        "date": days,
+        "open": close,
+        "high": np.round(close * (1 + spread), 2),
+        "low": np.round(close * (1 - spread), 2),
+        "close": close,
+        "volume": rng.integers(1000, 5000000, n).astype(float),
+    }
+
+def calendars():
+    # Returns symbols on mismatched calendars: a stock, the same stock's calendar missing a
+    # day from a halt, a shorter listing, and a market trading every day of the week
+    weekdays = np.busday_offset(np.datetime64("2020-01-02"), np.arange(1200), roll="forward")
+    return {
+        "STOCK": bars(weekdays, 1),
+        "HALTED": bars(np.delete(weekdays, [500, 501, 900]), 2),
+        "LISTED": bars(weekdays[700:], 3),
+        "BTC-USD": bars(np.arange(np.datetime64("2020-06-01"), np.datetime64("2024-09-01")), 4),
+    }
+
+def test_stack_matches_each_symbol():
+    series = calendars()
+    data = panel.stack(series)
+    results = panel.split(data, panel.analyze(data))
+    for symbol, cols in series.items():
+        expected = indicators.analyze(cols['high'], cols['low'], cols['volume'])
+        for k,v in expected.items():
+            np.testing.assert_allclose(results[symbol][k], v, rtol=1e-9, atol=1e-6, equal_nan=True, err_msg=f"{symbol} {k}")
+        np.testing.assert_array_equal(panel.split(data, {"date": data['date']})[symbol]['date'], cols['date'])
+
+def test_stack_ends_every_symbol_on_the_last_row():
+    data = panel.stack(calendars())
+    assert data['present'][-1].all()
+    assert np.isnat(data['date'][0, data['symbols'].index("LISTED")])
+
+@pytest.mark.parametrize("encrypted", [False, True])
+def test_backtest_load_signals_match_each_symbol(tmp_path, encrypted):
+    key = fsops.get_key(str(tmp_path / "key")) if encrypted else None
+    db = store.Store(str(tmp_path / "daily"), key)
+    series = calendars()
+    for symbol, cols in series.items():
+        db.write(symbol, cols)
+    data = backtest.load(str(tmp_path / "daily"), key=key)
+    buy = backtest.signals(data)
+    for j, symbol in enumerate(data['symbols']):
+        cols = series[symbol]
+        expected = indicators.analyze(cols['high'], cols['low'], cols['volume'])['buy_signal'] > 0
+        np.testing.assert_array_equal(buy[data['present'][:, j], j], expected, err_msg=symbol)
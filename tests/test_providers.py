@@ -0,0 +1,184 @@
+# Tests of netris.providers: yfinance download frames split into per-symbol bars, and AlphaVantage
+# responses mapped to bars and errors, served by a local stub server
+# import third-party modules
+import json
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import pandas as pd
+import pytest
+
+# Import internal modules
+from netris import providers
+from tests.test_fetch import serve
+
+FIELDS = ["Adj Close", "Close", "High", "Low", "Open", "Volume"]
+
+def bars(dates, base):
+    # Returns bar arrays for <dates> whose values tell the field and symbol apart: every field
+    # of the symbol numbered <base> is offset by a different amount
+    n = len(dates)
+    close = base * 100 + np.arange(n, dtype=float)
+    return {
+        "date": np.array(dates, dtype="datetime64[D]"),
+        "Open": close + .25,
+        "High": close + .5,
+        "Low": close - .5,
+        "Close": close,
+        # Older half adjusted for a 2 for 1 split
+        "Adj Close": np.where(np.arange(n) < n // 2, close / 2, close),
+        "Volume": base * 1000 + np.arange(n, dtype=float),
+    }
+
+def download(series, fields=FIELDS):
+    # Returns a frame shaped as yf.download(group_by="column") returns it for the bars in dict
+    # <series>: a row for every date any symbol has, (field, symbol) columns sorted by field then
+    # symbol, and NaN where a symbol has no bar
+    index = np.unique(np.concatenate([x['date'] for x in series.values()]))
+    columns = {}
+    for field in fields:
+        for symbol in sorted(series):
+            data = series[symbol]
+            column = np.full(len(index), np.nan)
+            column[np.searchsorted(index, data['date'])] = data[field]
+            columns.update({(field, symbol): column})
+    frame = pd.DataFrame(columns, index=pd.DatetimeIndex(index.astype("datetime64[ns]"), name="Date"))
+    frame.columns = pd.MultiIndex.from_tuples(frame.columns, names=["Price", "Ticker"])
+    return frame
+
+def days(start, count):
+    return np.busday_offset(np.datetime64(start), np.arange(count), roll="forward")
+
+def assert_bars(result, expected):
+    ratio = np.where(expected['Adj Close'] != expected['Close'], expected['Adj Close'] / expected['Close'], 1)
+    np.testing.assert_array_equal(result['date'], expected['date'])
+    for name, field in (("open", "Open"), ("high", "High"), ("low", "Low"), ("close", "Close")):
+        np.testing.assert_allclose(result[name], expected[field] * ratio, err_msg=name)
+    np.testing.assert_allclose(result['volume'], expected['Volume'] / ratio)
+
+def test_split_frame_lays_out_fields_by_symbol():
+    series = {"AAA": bars(days("2024-01-01", 40), 1), "BBB": bars(days("2024-01-15", 30), 2)}
+    # Symbols are requested in another order than the frame's columns
+    results, errors = providers.split_frame(download(series), ["BBB", "AAA"])
+    assert not errors
+    assert list(results) == ["BBB", "AAA"]
+    for symbol, expected in series.items():
+        assert_bars(results[symbol], expected)
+        # Each symbol's unbroken bars are views of the one adjusted block
+        assert all(not x.flags.owndata for k,x in results[symbol].items() if k != "volume")
+
+def test_split_frame_single_level_columns():
+    expected = bars(days("2024-01-01", 20), 3)
+    frame = download({"AAA": expected}).droplevel("Ticker", axis=1)
+    results, errors = providers.split_frame(frame, ["AAA"])
+    assert not errors
+    assert_bars(results['AAA'], expected)
+
+def test_split_frame_without_adjusted_close():
+    # Downloads adjusted by yfinance have no "Adj Close"; their close is taken as adjusted
+    expected = bars(days("2024-01-01", 20), 4)
+    frame = download({"AAA": expected}, [x for x in FIELDS if x != "Adj Close"])
+    results, errors = providers.split_frame(frame, ["AAA"])
+    assert not errors
+    np.testing.assert_array_equal(results['AAA']['close'], expected['Close'])
+    np.testing.assert_array_equal(results['AAA']['volume'], expected['Volume'])
+
+def test_split_frame_gaps_and_missing_symbols():
+    dates = days("2024-01-01", 30)
+    halted = bars(np.delete(dates, [10, 11]), 5)
+    frame = download({"AAA": bars(dates, 1), "HALT": halted, "GONE": bars(dates, 6)})
+    frame.loc[:, ("Close", "GONE")] = np.nan
+    failed = {"GONE": "GONE: possibly delisted; no price data found", "LOST": "Timed out"}
+    results, errors = providers.split_frame(frame, ["AAA", "HALT", "GONE", "LOST", "NONE"], failed)
+    assert set(results) == {"AAA", "HALT"}
+    # Rows the halted symbol has no bar for are left out of its bars
+    assert_bars(results['HALT'], halted)
+    assert isinstance(errors['GONE'], providers.UnknownSymbol)
+    assert type(errors['LOST']) is Exception and str(errors['LOST']) == "Timed out"
+    assert str(errors['NONE']) == "No data returned for NONE"
+
+def test_split_frame_of_nothing():
+    results, errors = providers.split_frame(pd.DataFrame(), ["AAA"], {"AAA": "No data found, symbol may be delisted"})
+    assert results == {}
+    assert isinstance(errors['AAA'], providers.UnknownSymbol)
+
+@pytest.mark.parametrize("message, unknown", [
+    ("Invalid ticker", True),
+    ("$ZZZ: possibly delisted; no timezone found", True),
+    ("Quote not found for symbol: ZZZ", True),
+    ("Too Many Requests. Rate limited.", False),
+    (None, False),
+])
+def test_error_classification(message, unknown):
+    assert isinstance(providers.error("ZZZ", message), providers.UnknownSymbol) == unknown
+
+def series(key, count=10):
+    # Returns an AlphaVantage response of <count> bars under time series <key>, newest first
+    dates = days("2024-01-01", count)[::-1]
+    return {"Meta Data": {}, key: {
+        str(x): {
+            "1. open": "10.0", "2. high": "11.0", "3. low": "9.0", "4. close": "10.5",
+            "5. adjusted close": "5.25" if i >= count // 2 else "10.5", "6. volume": "1000",
+        }
+        for i, x in enumerate(dates)
+    }}
+
+class Canned(BaseHTTPRequestHandler):
+    # Answers AlphaVantage queries with the response the server holds for the "symbol" asked for,
+    # recording the query of each request
+    def do_GET(self):
+        query = {k: v[0] for k,v in parse_qs(urlparse(self.path).query).items()}
+        with self.server.lock:
+            self.server.queries.append(query)
+        body = json.dumps(self.server.responses.get(query.get("symbol"), {})).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def alphavantage():
+    httpd = serve(Canned)
+    httpd.queries = []
+    httpd.responses = {
+        "WEEK": series("Weekly Adjusted Time Series"),
+        "DAY": series("Time Series (Daily)"),
+        "ZZZ": {"Error Message": "Invalid API call. Please retry or visit the documentation for TIME_SERIES_WEEKLY_ADJUSTED."},
+        "NOTE": {"Note": "Thank you for using Alpha Vantage! Our standard API call frequency is 5 calls per minute."},
+        "INFO": {"Information": "This is a premium endpoint."},
+    }
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def provider(server, **kwargs):
+    return providers.AlphaVantage(**dict({"url": f"{server.url}/query", "rate": 100, "retries": 0, "timeout": 2}, **kwargs))
+
+def test_alphavantage_free_key_weekly_bars_and_errors(alphavantage):
+    results, errors = provider(alphavantage).daily(["WEEK", "ZZZ", "NOTE", "INFO", "DAY"])
+    assert list(results) == ["WEEK"]
+    assert {x['function'] for x in alphavantage.queries} == {"TIME_SERIES_WEEKLY_ADJUSTED"}
+    assert not any("outputsize" in x for x in alphavantage.queries)
+    data = results['WEEK']
+    assert len(data['date']) == 10 and data['date'][0] < data['date'][-1]
+    # The older half is adjusted by its adjusted close
+    np.testing.assert_allclose(data['close'], [5.25] * 5 + [10.5] * 5)
+    np.testing.assert_allclose(data['volume'], [2000.] * 5 + [1000.] * 5)
+    assert isinstance(errors['ZZZ'], providers.UnknownSymbol)
+    assert type(errors['NOTE']) is Exception and "5 calls per minute" in str(errors['NOTE'])
+    assert type(errors['INFO']) is Exception and "premium" in str(errors['INFO'])
+    # A daily series is not what a free key asks for
+    assert str(errors['DAY']) == "No data for DAY"
+
+def test_alphavantage_premium_daily_bars(alphavantage):
+    av = provider(alphavantage, premium=True)
+    results, errors = av.daily(["DAY", "WEEK"], recent=True)
+    assert list(results) == ["DAY"] and list(errors) == ["WEEK"]
+    assert {(x['function'], x['outputsize']) for x in alphavantage.queries} == {("TIME_SERIES_DAILY_ADJUSTED", "compact")}
+    av.daily(["DAY"])
+    assert alphavantage.queries[-1]['outputsize'] == "full"
+    av.close()
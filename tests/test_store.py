@@ -0,0 +1,105 @@
+# Tests of netris.store
+# import third-party modules
+import os
+import threading
+import numpy as np
+import pytest
+
+# Import internal modules
+from netris import fsops
+from netris import store
+
+def columns(n, start=0, fill=None):
+    # Returns <n> rows of "date" and "value" columns, dated from day <start>, valued <fill> or the row number
+    return {
+        "date": np.datetime64("2020-01-01") + np.arange(start, start + n).astype("timedelta64[D]"),
+        "value": np.full(n, float(fill)) if fill is not None else np.arange(start, start + n, dtype=float),
+    }
+
+@pytest.fixture(params=[False, True], ids=["plain", "encrypted"])
+def db(request, tmp_path):
+    key = fsops.get_key(str(tmp_path / "key")) if request.param else None
+    return store.Store(str(tmp_path / "store"), key)
+
+def test_write_and_read(db):
+    assert db.write("A", columns(10), version="v1")
+    data = db.read("A")
+    np.testing.assert_array_equal(data['value'], np.arange(10.))
+    assert db.meta("A")['version'] == "v1"
+    assert db.symbols() == ["A"]
+
+def test_append_past_the_end_and_replacing_rows(db):
+    db.write("A", columns(10), version="v1")
+    assert db.append("A", columns(5, 10), version="v2")
+    np.testing.assert_array_equal(db.read("A")['value'], np.arange(15.))
+    # Rows from 12 onward are replaced
+    assert db.append("A", columns(3, 12, fill=-1), start=12)
+    data = db.read("A")
+    np.testing.assert_array_equal(data['value'], np.concatenate((np.arange(12.), [-1., -1., -1.])))
+    assert db.meta("A")['version'] == "v2"
+    np.testing.assert_array_equal(db.tail("A", ["value"], 4)['value'], [11., -1., -1., -1.])
+
+def test_append_outgrowing_the_header(tmp_path):
+    db = store.Store(str(tmp_path))
+    db.write("A", columns(1))
+    # A shape needing more digits than the header was padded for rewrites the column
+    big = columns(10 ** 6, 1)
+    assert db.append("A", big)
+    np.testing.assert_array_equal(db.read("A")['value'], np.arange(10 ** 6 + 1, dtype=float))
+
+def written(operation):
+    # Returns the bytes store.BYTES_WRITTEN has counted for <operation>
+    return dict(((dict(labels)['operation'], value) for name, labels, value in store.BYTES_WRITTEN.samples())).get(operation, 0)
+
+def test_replaced_rows_are_written_in_place(tmp_path):
+    db = store.Store(str(tmp_path))
+    db.write("A", columns(1000))
+    rewritten, appended = written("write"), written("append")
+    # Two rows are replaced and one added without rewriting the other 998
+    assert db.append("A", columns(3, 998, fill=-1), start=998)
+    assert written("write") == rewritten
+    assert written("append") - appended == 3 * (8 + 8)
+    np.testing.assert_array_equal(db.read("A")['value'][996:], [996., 997., -1., -1., -1.])
+    assert db.meta("A")['rows'] == 1001
+
+def test_concurrent_writers_of_one_symbol(db):
+    db.write("A", columns(100, fill=0))
+    errors = []
+    def writer(n):
+        try:
+            for i in range(20):
+                if i % 2:
+                    db.append("A", columns(10, 90, fill=n), start=90, writer=n)
+                else:
+                    db.write("A", columns(100, fill=n), writer=n)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(1, 5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    data = db.read("A")
+    assert len(data['value']) == 100
+    # The last write was whole and from a single writer
+    writer = db.meta("A")['writer']
+    assert data['value'][-1] == writer
+    assert not [x for x in os.listdir(db.path("A")) if x.endswith(".tmp")]
+
+def test_query_by_dates(db):
+    db.write("A", columns(30))
+    data = db.query("A", ["value"], start="2020-01-05", end="2020-01-07")
+    assert list(data) == ["value"]
+    np.testing.assert_array_equal(data['value'], [4., 5., 6.])
+    assert db.query("B") is None
+
+def test_query_last_weeks(db):
+    weekly = {"date": np.datetime64("2024-01-05") + 7 * np.arange(52).astype("timedelta64[D]"), "value": np.arange(52.)}
+    db.write("A", weekly)
+    for weeks in (1, 4, 26):
+        data = db.query("A", ["date", "value"], last=np.timedelta64(weeks, 'W'))
+        np.testing.assert_array_equal(data['value'], np.arange(52. - weeks, 52.))
+    # Daily bars within the last week
+    db.write("B", columns(30))
+    np.testing.assert_array_equal(db.query("B", ["value"], last=np.timedelta64(1, 'W'))['value'], np.arange(23., 30.))
@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+#
+# Description: WSGI entry point for serving the analyzer with multiple worker processes,
+# e.g. gunicorn -c gunicorn.conf.py wsgi:server
+# Each worker builds its own app; stored data and locks under the data directory are shared
+
+# Import modules
+import analyzer
+
+app = analyzer.create_app()
+server = app.server
+# Every worker serves requests; the scheduler's lock elects one of them to prefetch
+app.prefetcher.start(run_now=True)
+# Every worker reads the live feed, since live charts may poll any of them
+if app.engine:
+    app.engine.start()